@@ -0,0 +1,167 @@
+import atexit
+import logging
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import F
+from .models import LikeCount
+
+logger = logging.getLogger(__name__)
+
+# Like Counters Here...
+"""
+- Liking or unliking doesn't touch the LikeCount table. The +1/-1 goes into a per-process counter split into shards, each with its own lock, so concurrent requests on different objects don't queue on one lock.
+
+- A background thread flushes the pending deltas every LIKES_FLUSH_INTERVAL seconds (5 by default), and once more when the process exits. One flush is a single INSERT ... IGNORE for the missing rows plus one UPDATE ... SET count = count + n per distinct delta, however many objects were liked. A viral object liked a thousand times between flushes costs one UPDATE, not a thousand.
+
+- Reads (like_counts) return the stored count plus whatever this process hasn't flushed yet. Other processes' pending likes show up after their next flush, so counts can lag by at most one interval.
+
+- Settings:
+
+    LIKES_FLUSH_INTERVAL = 5      # seconds between flushes
+    LIKES_COUNTER_SHARDS = 16
+
+- The reconcile_like_counts command rebuilds LikeCount from LikedItem. Deltas that are still pending in a running process when it runs get added on top of the rebuilt counts, so run it during a quiet period or twice.
+"""
+
+
+class ShardedCounter:
+    def __init__(self, shards=16, interval=5.0):
+        self._shards = [(threading.Lock(), defaultdict(int)) for _ in range(max(1, shards))]
+        self.interval = interval
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def _shard(self, key):
+        return self._shards[hash(key) % len(self._shards)]
+
+    def add(self, content_type_id, object_id, delta):
+        key = (content_type_id, object_id)
+        lock, deltas = self._shard(key)
+        with lock:
+            deltas[key] += delta
+        self._ensure_started()
+
+    def pending(self, content_type_id, object_ids):
+        result = {}
+        for object_id in object_ids:
+            key = (content_type_id, object_id)
+            lock, deltas = self._shard(key)
+            with lock:
+                delta = deltas.get(key, 0)
+            if delta:
+                result[object_id] = delta
+        return result
+
+    def drain(self):
+        # Each shard is only locked while it is copied and emptied - adds that come in during a flush wait for the next one
+        drained = {}
+        for lock, deltas in self._shards:
+            with lock:
+                drained.update((key, delta) for key, delta in deltas.items() if delta)
+                deltas.clear()
+        return drained
+
+    def flush(self):
+        """
+        - Writes the pending deltas to LikeCount and returns how many objects were written. If the write fails the deltas go back into the counters for the next flush.
+        """
+        with self._flush_lock:
+            drained = self.drain()
+            if not drained:
+                return 0
+            try:
+                apply_deltas(drained)
+            except Exception:
+                for key, delta in drained.items():
+                    lock, deltas = self._shard(key)
+                    with lock:
+                        deltas[key] += delta
+                raise
+            return len(drained)
+
+    def _ensure_started(self):
+        if self._thread is not None or self.interval <= 0:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='like-counter-flush', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                # flush() put the deltas back - they go out with the next round
+                logger.exception('Flushing the like counters failed')
+            finally:
+                connection.close()
+
+    def stop(self):
+        self._stopped.set()
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+
+def apply_deltas(deltas):
+    """
+    - deltas is {(content_type_id, object_id): delta}. Rows are created first (ignoring the ones that exist), then updated with F() - one UPDATE per (content type, delta) pair.
+
+    - Deltas of objects that were deleted since they were counted are dropped: the delete took the object's LikeCount row with it (store/signals.py), and a flush must not bring it back.
+    """
+    with transaction.atomic():
+        deltas = _of_existing_objects(deltas)
+        if not deltas:
+            return
+        LikeCount.objects.bulk_create(
+            [LikeCount(content_type_id=content_type_id, object_id=object_id) for content_type_id, object_id in deltas],
+            ignore_conflicts=True, batch_size=1000,
+        )
+        grouped = defaultdict(list)
+        for (content_type_id, object_id), delta in deltas.items():
+            grouped[(content_type_id, delta)].append(object_id)
+        for (content_type_id, delta), object_ids in grouped.items():
+            LikeCount.objects.filter(content_type_id=content_type_id, object_id__in=object_ids).update(count=F('count') + delta)
+
+
+def _of_existing_objects(deltas):
+    # One query per content type in the batch
+    object_ids = defaultdict(list)
+    for content_type_id, object_id in deltas:
+        object_ids[content_type_id].append(object_id)
+    existing = set()
+    for content_type_id, ids in object_ids.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        if model is not None:
+            existing.update((content_type_id, pk) for pk in model._default_manager.filter(pk__in=ids).values_list('pk', flat=True))
+    return {key: delta for key, delta in deltas.items() if key in existing}
+
+
+counters = ShardedCounter(
+    shards=getattr(settings, 'LIKES_COUNTER_SHARDS', 16),
+    interval=getattr(settings, 'LIKES_FLUSH_INTERVAL', 5),
+)
+
+
+def like_counts(model, object_ids):
+    """
+    - {object_id: likes} for many objects of one model: one query for the stored counts, plus this process's pending deltas.
+    """
+    object_ids = list(object_ids)
+    if not object_ids:
+        return {}
+    content_type_id = ContentType.objects.get_for_model(model).id
+    counts = dict(
+        LikeCount.objects.filter(content_type_id=content_type_id, object_id__in=object_ids).values_list('object_id', 'count')
+    )
+    for object_id, delta in counters.pending(content_type_id, object_ids).items():
+        counts[object_id] = counts.get(object_id, 0) + delta
+    return {object_id: max(0, counts.get(object_id, 0)) for object_id in object_ids}
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from likes.counters import counters
+from likes.models import LikeCount, LikedItem
+
+
+class Command(BaseCommand):
+    help = 'Rebuild LikeCount from the LikedItem table and fix every count that has drifted. Deltas still pending in running processes are added on top by their next flush.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report drift, do not write.')
+
+    def handle(self, *args, **options):
+        if not options['dry_run']:
+            counters.flush()
+
+        with transaction.atomic():
+            stored = {
+                (content_type_id, object_id): (id, count)
+                for id, content_type_id, object_id, count in LikeCount.objects.select_for_update().values_list('id', 'content_type_id', 'object_id', 'count')
+            }
+            actual = {
+                (content_type_id, object_id): count
+                for content_type_id, object_id, count in LikedItem.objects.order_by().values('content_type', 'object_id')
+                .annotate(count=Count('id')).values_list('content_type', 'object_id', 'count')
+            }
+
+            drifted, missing, orphans = [], [], []
+            for key, (id, count) in stored.items():
+                expected = actual.get(key, 0)
+                if key not in actual:
+                    orphans.append(id)
+                    self.stdout.write(f'{key}: stored {count}, no likes')
+                elif count != expected:
+                    drifted.append(LikeCount(id=id, count=expected))
+                    self.stdout.write(f'{key}: stored {count}, actual {expected}')
+            for (content_type_id, object_id), count in actual.items():
+                if (content_type_id, object_id) not in stored:
+                    missing.append(LikeCount(content_type_id=content_type_id, object_id=object_id, count=count))
+                    self.stdout.write(f'{(content_type_id, object_id)}: missing, actual {count}')
+
+            if not options['dry_run']:
+                LikeCount.objects.bulk_update(drifted, ['count'], batch_size=1000)
+                LikeCount.objects.bulk_create(missing, batch_size=1000)
+                LikeCount.objects.filter(id__in=orphans).delete()
+
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {len(drifted)} drifted, {len(missing)} missing and {len(orphans)} orphaned like counts out of {len(actual)} liked objects.'
+        ))
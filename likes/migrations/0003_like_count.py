@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:40
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+import django.db.models.deletion
+
+
+def remove_duplicate_likes(apps, schema_editor):
+    # Before the unique constraint: keep the first like of each (user, object), drop the repeats
+    LikedItem = apps.get_model('likes', 'LikedItem')
+    duplicates = LikedItem.objects.order_by().values('user_id', 'content_type_id', 'object_id').annotate(first=Min('id'), count=Count('id')).filter(count__gt=1)
+    for row in duplicates.iterator():
+        LikedItem.objects.filter(
+            user_id=row['user_id'], content_type_id=row['content_type_id'], object_id=row['object_id']
+        ).exclude(id=row['first']).delete()
+
+
+def populate_like_counts(apps, schema_editor):
+    LikedItem = apps.get_model('likes', 'LikedItem')
+    LikeCount = apps.get_model('likes', 'LikeCount')
+    counts = LikedItem.objects.order_by().values('content_type_id', 'object_id').annotate(count=Count('id'))
+    LikeCount.objects.bulk_create(
+        [LikeCount(content_type_id=row['content_type_id'], object_id=row['object_id'], count=row['count']) for row in counts.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('likes', '0002_content_type_object_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_likes, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='likeditem',
+            unique_together={('user', 'content_type', 'object_id')},
+        ),
+        migrations.CreateModel(
+            name='LikeCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'unique_together': {('content_type', 'object_id')},
+            },
+        ),
+        migrations.RunPython(populate_like_counts, migrations.RunPython.noop),
+    ]
@@ -2,10 +2,30 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
+from trikha_store.querysets import GenericObjectQuerySet
 
 # Liked Item Here...
 class LikedItem(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
-    content_object = GenericForeignKey()
\ No newline at end of file
+    content_object = GenericForeignKey()
+
+    # for_objects() for the likes of many objects at once
+    objects = GenericObjectQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['content_type', 'object_id'])]
+        unique_together = [['user', 'content_type', 'object_id']]
+
+# Like Count Model Here...
+class LikeCount(models.Model):
+    """
+    - Denormalized number of likes per object, written in batches by likes.counters - read it through likes.counters.like_counts(), which adds the deltas not flushed yet.
+    """
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [['content_type', 'object_id']]
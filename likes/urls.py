@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    # Like Urls
+    path('<str:app_label>/<str:model>/<int:object_id>/', views.like, name='like'),
+]
@@ -1,3 +1,56 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from rest_framework.response import Response
+from rest_framework.decorators import api_view
+from rest_framework.exceptions import NotAuthenticated, NotFound
+from rest_framework import status
+from .counters import counters, like_counts
+from .models import LikedItem
 
-# Create your views here.
+# Models that can be liked, as 'app_label.model'
+LIKEABLE_MODELS = getattr(settings, 'LIKES_MODELS', ['store.product'])
+
+# Resolves the liked object's ContentType and checks that the object exists
+def _content_type(app_label, model, object_id):
+    if f'{app_label}.{model}' not in LIKEABLE_MODELS:
+        raise NotFound('This kind of object cannot be liked.')
+    content_type = ContentType.objects.get_by_natural_key(app_label, model)
+    if not content_type.model_class()._default_manager.filter(pk=object_id).exists():
+        raise NotFound()
+    return content_type
+
+# Like View
+@api_view(['GET', 'POST', 'DELETE'])
+def like(request, app_label, model, object_id):
+    """
+    - GET returns the number of likes (and whether the current user likes the object). POST likes, DELETE unlikes - both need a logged-in user and are idempotent: liking twice or unliking something that isn't liked changes nothing.
+
+    - The count comes from likes.counters - a new like is counted in memory and written to LikeCount by the next flush.
+    """
+    content_type = _content_type(app_label, model, object_id)
+    mine = LikedItem.objects.filter(content_type=content_type, object_id=object_id)
+    code = status.HTTP_200_OK
+
+    if request.method == "POST":
+        if not request.user.is_authenticated:
+            raise NotAuthenticated()
+        # unique_together (user, content_type, object_id) makes a racing duplicate fall back to the existing row
+        liked_item, created = LikedItem.objects.get_or_create(user=request.user, content_type=content_type, object_id=object_id)
+        if created:
+            transaction.on_commit(lambda: counters.add(content_type.id, object_id, 1))
+            code = status.HTTP_201_CREATED
+
+    elif request.method == "DELETE":
+        if not request.user.is_authenticated:
+            raise NotAuthenticated()
+        deleted, _ = mine.filter(user=request.user).delete()
+        if deleted:
+            transaction.on_commit(lambda: counters.add(content_type.id, object_id, -deleted))
+
+    liked = request.user.is_authenticated and mine.filter(user=request.user).exists()
+    return Response({
+        'object_id': object_id,
+        'liked': liked,
+        'likes_count': like_counts(content_type.model_class(), [object_id])[object_id],
+    }, status=code)
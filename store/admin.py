@@ -1,10 +1,12 @@
 from typing import Any
-from django.contrib import admin, messages
+from django import forms
+from django.contrib import admin
 from django.contrib.contenttypes.admin import GenericTabularInline
 from django.db.models import Count
 from django.urls import reverse
 from django.utils.html import format_html, urlencode
-from .models import Product, Collection, Customer, Order, OrderItem, Review, Cart, CartItem
+from .admin_mixins import BackgroundActionMixin, ExportActionMixin, FastChangelistMixin
+from .models import AdminJob, Product, Collection, Customer, Order, OrderItem, Review, Cart, CartItem
 from tags.models import Tag, TaggedItem
 
 # Custom Inventory Filter...
@@ -21,9 +23,23 @@ class InventoryFilter(admin.SimpleListFilter):
         if self.value() == '<10':
             return queryset.filter(inventory__lt=10)
 
+# Bulk Action Forms...
+class AdjustPricesForm(forms.Form):
+    percent = forms.DecimalField(max_digits=6, decimal_places=2, min_value=-90, max_value=1000, help_text='e.g. 10 raises every price by 10%, -10 lowers it by 10%.')
+
+    def job_params(self):
+        return {'percent': str(self.cleaned_data['percent'])}
+
+class ReassignCollectionForm(forms.Form):
+    collection = forms.ModelChoiceField(queryset=Collection.objects.all())
+
+    def job_params(self):
+        return {'collection_id': self.cleaned_data['collection'].id}
+
 # Registering Product Model...
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(BackgroundActionMixin, ExportActionMixin, FastChangelistMixin, admin.ModelAdmin):
+    export_name = 'products'
     # fields = ['title']
     # readonly_fields = ['title']
     # exclude = ['promotions']
@@ -33,7 +49,7 @@ class ProductAdmin(admin.ModelAdmin):
     # inlines = [TagInline]
     autocomplete_fields = ['collection']
     search_fields = ['title']
-    actions = ['clear_inventory']
+    actions = ['clear_inventory', 'adjust_prices', 'reassign_collection']
     list_display = ['title', 'unit_price', 'inventory_status', 'collection_title']
     list_editable = ['unit_price']
     list_filter = ['last_update', 'collection', InventoryFilter]
@@ -49,21 +65,33 @@ class ProductAdmin(admin.ModelAdmin):
             return 'Low'
         return 'Ok'
     
+    # The bulk actions run as chunked background jobs (store/jobs.py, handlers in store/bulk.py) - the request only queues them
     @admin.action(description='Clear Inventory')
     def clear_inventory(self, request, queryset):
-        updated_count = queryset.update(inventory=0)
-        self.message_user(request, f"{updated_count} products were successfully updated...", messages.ERROR)
+        self.start_job(request, queryset, 'store.bulk.clear_inventory', 'Clear inventory')
+
+    @admin.action(description='Adjust prices')
+    def adjust_prices(self, request, queryset):
+        return self.run_with_form(request, queryset, AdjustPricesForm, 'store.bulk.adjust_prices', 'Adjust prices')
+
+    @admin.action(description='Move to another collection')
+    def reassign_collection(self, request, queryset):
+        return self.run_with_form(request, queryset, ReassignCollectionForm, 'store.bulk.reassign_collection', 'Move to another collection')
 
 # Registering Customer Model...
 @admin.register(Customer)
-class CustomerAdmin(admin.ModelAdmin):
+class CustomerAdmin(ExportActionMixin, FastChangelistMixin, admin.ModelAdmin):
+    export_name = 'customers'
     list_display = ['first_name', 'last_name', 'membership', 'orders_count']
     list_editable = ['membership']
     list_per_page = 10
     ordering = ['first_name', 'last_name']
     search_fields = ['first_name', 'last_name']
 
-    @admin.display(ordering='order')
+    # Counted for the customers of the current page only - see store/admin_mixins.py
+    page_annotations = {'orders_count': Count('order')}
+
+    @admin.display(description='orders count')
     def orders_count(self, customer):
         url = (
             reverse('admin:store_order_changelist')
@@ -73,13 +101,11 @@ class CustomerAdmin(admin.ModelAdmin):
             }))
         return format_html('<a href="{}">{}</a>', url, customer.orders_count)
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(orders_count=Count('order'))
-
 # Registering Collection Model...
 @admin.register(Collection)
-class CollectionAdmin(admin.ModelAdmin):
+class CollectionAdmin(FastChangelistMixin, admin.ModelAdmin):
     list_display = ['id', 'title', 'products_count']
+    readonly_fields = ['products_count']
     search_fields = ['title']
     
     @admin.display(ordering='products_count')
@@ -91,37 +117,61 @@ class CollectionAdmin(admin.ModelAdmin):
                 'collection__id': str(collection.id)
             }))
         return format_html('<a href="{}">{}</a>', url, collection.products_count)
-
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(products_count=Count('products'))
     
 # class OrderItemInline(admin.StackedInline):
 class OrderItemInline(admin.TabularInline):
     autocomplete_fields = ['product']
     model = OrderItem
+    # Taken from the product when the item is saved
+    exclude = ['collection']
     min_num = 1
     max_num = 10
     extra = 0
 
 # Registering Order Model...
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
-    list_display = ['id', 'placed_at', 'customer']
+class OrderAdmin(ExportActionMixin, FastChangelistMixin, admin.ModelAdmin):
+    export_name = 'orders'
+    list_display = ['id', 'placed_at', 'customer', 'items_count', 'total']
     autocomplete_fields = ['customer']
     inlines = [OrderItemInline]
+    # Worked out from the items by the OrderItem signals, inline edits included
+    readonly_fields = ['items_count', 'total']
     list_per_page = 10
 
 # Registering Review Model...
 @admin.register(Review)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(FastChangelistMixin, admin.ModelAdmin):
     list_display = ['id', 'name', 'date', 'product']
 
 # Registering Cart Model...
 @admin.register(Cart)
-class CartAdmin(admin.ModelAdmin):
+class CartAdmin(FastChangelistMixin, admin.ModelAdmin):
     list_display = ['id', 'created_at']
     
 # Registering Cart Item Model...
 @admin.register(CartItem)
-class CartItemAdmin(admin.ModelAdmin):
-    list_display = ['id', 'cart', 'product', 'quantity']
\ No newline at end of file
+class CartItemAdmin(FastChangelistMixin, admin.ModelAdmin):
+    list_display = ['id', 'cart', 'product', 'quantity']
+    list_select_related = ['cart', 'product']
+    raw_id_fields = ['cart']
+    autocomplete_fields = ['product']
+
+# Registering Admin Job Model...
+@admin.register(AdminJob)
+class AdminJobAdmin(FastChangelistMixin, admin.ModelAdmin):
+    list_display = ['id', 'description', 'status', 'progress', 'created_by', 'created_at', 'finished_at']
+    list_filter = ['status']
+    readonly_fields = ['description', 'handler', 'params', 'status', 'progress', 'total', 'processed', 'error', 'created_by', 'created_at', 'started_at', 'heartbeat_at', 'finished_at']
+
+    @admin.display(description='progress')
+    def progress(self, job):
+        if not job.total:
+            return f'{job.processed}'
+        return f'{job.processed} / {job.total} ({job.processed * 100 // job.total}%)'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
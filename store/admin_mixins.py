@@ -0,0 +1,149 @@
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.admin import helpers, widgets
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+from . import jobs
+from .exports import EXPORTS, export_response
+
+# Admin Changelist Helpers Here...
+"""
+- FastChangelistMixin keeps the changelists of big tables cheap. It does three things:
+
+    1. Counting: an unfiltered changelist is counted from the planner's row estimate (MySQL information_schema.TABLES, PostgreSQL pg_class, SQLite sqlite_stat1 after ANALYZE) instead of a COUNT(*) over the whole table. Small tables (estimate below STORE_ADMIN_EXACT_COUNT_BELOW, 10000 by default), filtered or searched lists, and databases without statistics still get an exact count. The second "N total" count is switched off.
+
+    2. Annotations: page_annotations = {'orders_count': Count('order')} are computed for the ids of the current page only, with one extra query, and set on the page's objects - instead of annotating (JOIN + GROUP BY) the queryset the whole table is paginated over. The values can't be sorted on.
+
+    3. Foreign keys: any ForeignKey not listed in autocomplete_fields or raw_id_fields gets an autocomplete widget when the related model's admin has search_fields, and a raw id input otherwise - never a <select> with one <option> per row of the related table.
+"""
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if getattr(queryset, 'query', None) is not None and not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= getattr(settings, 'STORE_ADMIN_EXACT_COUNT_BELOW', 10000):
+                return estimate
+        return super().count
+
+
+def estimated_row_count(model, using='default'):
+    """
+    - The planner's estimate of the number of rows in the model's table, or None when the database keeps no such statistics.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'mysql':
+        sql = 'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s'
+    elif connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)'
+    elif connection.vendor == 'sqlite':
+        # The first number of a table's stat row is its row count - the table only exists once ANALYZE has run
+        sql = "SELECT CAST(substr(stat, 1, instr(stat || ' ', ' ') - 1) AS INTEGER) FROM sqlite_stat1 WHERE tbl = %s LIMIT 1"
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class PageAnnotatedChangeList(ChangeList):
+    def get_results(self, request):
+        super().get_results(request)
+        annotations = self.model_admin.page_annotations
+        if not annotations:
+            return
+        # Iterating fills the queryset's result cache, so the template and the list_editable formset see these same objects
+        page = list(self.result_list)
+        if not page:
+            return
+        values = {
+            row['pk']: row
+            for row in self.model._default_manager.filter(pk__in=[obj.pk for obj in page]).order_by().annotate(**annotations).values('pk', *annotations)
+        }
+        for obj in page:
+            for name in annotations:
+                setattr(obj, name, values.get(obj.pk, {}).get(name))
+
+
+class FastChangelistMixin:
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    page_annotations = {}
+
+    def get_changelist(self, request, **kwargs):
+        return PageAnnotatedChangeList
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if 'widget' not in kwargs and db_field.name not in self.get_autocomplete_fields(request) and db_field.name not in self.raw_id_fields:
+            db = kwargs.get('using')
+            related_admin = self.admin_site._registry.get(db_field.remote_field.model)
+            if related_admin is not None and related_admin.search_fields:
+                kwargs['widget'] = widgets.AutocompleteSelect(db_field, self.admin_site, using=db)
+            else:
+                kwargs['widget'] = widgets.ForeignKeyRawIdWidget(db_field.remote_field, self.admin_site, using=db)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+class BackgroundActionMixin:
+    """
+    - For admin actions that hand the selection to a background job (store/jobs.py) instead of writing inside the request. start_job() queues it; run_with_form() first asks for the action's parameters on an intermediate page.
+    """
+    bulk_action_template = 'admin/store/bulk_action_form.html'
+
+    def start_job(self, request, queryset, handler, description, **params):
+        job = jobs.enqueue(handler, queryset, description, params=params, user=request.user)
+        url = reverse('admin:store_adminjob_change', args=[job.id])
+        self.message_user(request, format_html('{} was started in the background - <a href="{}">follow its progress</a>.', description, url), messages.INFO)
+        return job
+
+    def run_with_form(self, request, queryset, form_class, handler, description):
+        # The form posts back to the changelist with the same action and selection; 'apply' marks the second round
+        form = form_class(request.POST if 'apply' in request.POST else None)
+        if form.is_valid():
+            self.start_job(request, queryset, handler, description, **form.job_params())
+            return None
+        return TemplateResponse(request, self.bulk_action_template, {
+            **self.admin_site.each_context(request),
+            'title': description,
+            'opts': self.model._meta,
+            'form': form,
+            'count': queryset.count(),
+            'action': request.POST.get('action'),
+            'select_across': request.POST.get('select_across', '0'),
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
+
+
+class ExportActionMixin:
+    """
+    - Adds 'Export as CSV' / 'Export as NDJSON' actions that stream the selection (every row of the filtered changelist with "select all") as a download - see store/exports.py. export_name picks the export, e.g. 'orders'.
+    """
+    export_name = None
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        for file_type, description in (('csv', 'Export as CSV'), ('ndjson', 'Export as NDJSON')):
+            name = f'export_{file_type}'
+            actions[name] = (self._export_action(file_type), name, description)
+        return actions
+
+    def _export_action(self, file_type):
+        def action(modeladmin, request, queryset):
+            accepts_gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+            return export_response(EXPORTS[self.export_name], queryset, file_type=file_type, accepts_gzip=accepts_gzip)
+        return action
@@ -0,0 +1,274 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO
+from itertools import islice
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import DailyCollectionSales, DailyProductSales, Order, OrderItem
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional - without it the columnar export is JSON only
+    np = None
+
+# Sales Analytics Here...
+"""
+- Revenue and top-product reports read two rollup tables instead of grouping OrderItem joined to Order: DailyProductSales and DailyCollectionSales hold quantity, revenue and order count per day and product / collection, for PAYMENT_STATUS_COMPLETE orders only. A year of daily rows per product is a short index range scan, however many orders there were.
+
+- The rollups are maintained incrementally, in the transaction of the write:
+
+    * an order whose payment status becomes (or stops being) complete adds (or takes back) what its items contribute - the Order post_save signal compares against the values the order was loaded with,
+    * an item saved or deleted on a complete order (e.g. through the admin's OrderItemInline) applies the difference between the order's contribution before and after the write.
+
+  A change is turned into +/- deltas per (day, product) and (day, collection) row and applied with F() updates, never read-modify-write.
+
+- Writes that skip signals (queryset.update(payment_status=...), bulk_create()) must call add_orders()/remove_orders() themselves, or rebuild the affected days: manage.py rebuild_sales_rollups --start ... --end ...
+
+- Days are the local date (TIME_ZONE) of Order.placed_at. A product's sales count towards the collection it was in when it was ordered - OrderItem.collection, set at checkout - so moving a product to another collection leaves its past sales where they were.
+"""
+
+ROLLUPS = {
+    'product': (DailyProductSales, 'product_id', 'product_id'),
+    'collection': (DailyCollectionSales, 'collection_id', 'collection_id'),
+}
+BATCH_SIZE = 1000
+_MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def contribution(order_ids, complete_only=True, day=None):
+    """
+    - What the orders add to the rollups: {(rollup, day, object_id): (quantity, revenue, orders_count)}, with one query. day replaces the orders' own date (for taking back an order from the day it was on before its placed_at changed).
+    """
+    items = OrderItem.objects.filter(order_id__in=list(order_ids))
+    if complete_only:
+        items = items.filter(order__payment_status=Order.PAYMENT_STATUS_COMPLETE)
+    cells = defaultdict(lambda: [0, Decimal(0), set()])
+    rows = items.values_list('order_id', 'order__placed_at', 'product_id', 'collection_id', 'quantity', 'unit_price')
+    for order_id, placed_at, product_id, collection_id, quantity, unit_price in rows:
+        date = day or timezone.localdate(placed_at)
+        keys = [('product', date, product_id)]
+        if collection_id is not None:
+            # Its collection has been deleted since, and its rollup rows with it
+            keys.append(('collection', date, collection_id))
+        for key in keys:
+            cell = cells[key]
+            cell[0] += quantity
+            cell[1] += quantity * unit_price
+            cell[2].add(order_id)
+    return {key: (quantity, revenue, len(orders)) for key, (quantity, revenue, orders) in cells.items()}
+
+
+def difference(before, after):
+    changes = {}
+    for key in before.keys() | after.keys():
+        old, new = before.get(key, (0, 0, 0)), after.get(key, (0, 0, 0))
+        delta = tuple(b - a for a, b in zip(old, new))
+        if any(delta):
+            changes[key] = delta
+    return changes
+
+
+def apply(changes):
+    """
+    - Adds {(rollup, day, object_id): (quantity, revenue, orders_count)} deltas to the rollup rows. Missing rows are created first with one INSERT that skips the existing ones, then every row gets one UPDATE with F(); rows left without orders are deleted.
+    """
+    if not changes:
+        return
+    with transaction.atomic():
+        for name, (model, field, source) in ROLLUPS.items():
+            rows = {(day, object_id): delta for (rollup, day, object_id), delta in changes.items() if rollup == name}
+            if not rows:
+                continue
+            model.objects.bulk_create([model(day=day, **{field: object_id}) for day, object_id in rows], ignore_conflicts=True)
+            for (day, object_id), (quantity, revenue, orders_count) in rows.items():
+                model.objects.filter(day=day, **{field: object_id}).update(
+                    quantity=F('quantity') + quantity,
+                    revenue=F('revenue') + revenue,
+                    orders_count=F('orders_count') + orders_count,
+                )
+            emptied = [(day, object_id) for (day, object_id), delta in rows.items() if delta[2] < 0]
+            if emptied:
+                model.objects.filter(
+                    day__in={day for day, object_id in emptied}, **{field + '__in': {object_id for day, object_id in emptied}}, orders_count__lte=0,
+                ).delete()
+
+
+def add_orders(order_ids):
+    # For orders that became complete without the Order signal
+    apply(contribution(order_ids, complete_only=False))
+
+
+def remove_orders(order_ids):
+    # For orders that stopped being complete without the Order signal - call it before their items change
+    apply(difference(contribution(order_ids, complete_only=False), {}))
+
+
+def order_saved(order, created):
+    loaded = {} if created else getattr(order, '_loaded_values', None)
+    if loaded is None:
+        # Not loaded from the database (or with the fields deferred) - nothing to compare against
+        return
+    was_complete = loaded.get('payment_status') == Order.PAYMENT_STATUS_COMPLETE
+    is_complete = order.payment_status == Order.PAYMENT_STATUS_COMPLETE
+    old_day = timezone.localdate(loaded['placed_at']) if loaded.get('placed_at') else None
+    new_day = timezone.localdate(order.placed_at)
+    if (was_complete, old_day) == (is_complete, new_day) or not (was_complete or is_complete):
+        return
+    before = contribution([order.id], complete_only=False, day=old_day) if was_complete else {}
+    after = contribution([order.id], complete_only=False, day=new_day) if is_complete else {}
+    apply(difference(before, after))
+
+
+def item_changing(item):
+    # pre_save / pre_delete: the contribution of the complete orders the item is (and was) in, before the write
+    order_ids = {item.order_id, getattr(item, '_loaded_order_id', None)} - {None}
+    complete = list(Order.objects.filter(id__in=order_ids, payment_status=Order.PAYMENT_STATUS_COMPLETE).values_list('id', flat=True))
+    item._rollup_orders = complete
+    item._rollup_before = contribution(complete) if complete else {}
+
+
+def item_changed(item):
+    complete = getattr(item, '_rollup_orders', None)
+    if complete:
+        apply(difference(item._rollup_before, contribution(complete)))
+    item._rollup_orders = item._rollup_before = None
+
+
+def _day_bounds(start, end):
+    # Local midnight of start up to local midnight after end - placed_at is filtered on its own column, without a function around it
+    tz = timezone.get_current_timezone()
+    lower = timezone.make_aware(datetime.combine(start, time.min), tz) if start else None
+    upper = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz) if end else None
+    return lower, upper
+
+
+def rebuild(start=None, end=None):
+    """
+    - Recomputes the rollup rows of the days from start to end (inclusive, all days when None) from the orders - the backfill, and the fix for writes that bypassed the signals.
+    """
+    lower, upper = _day_bounds(start, end)
+    items = OrderItem.objects.filter(order__payment_status=Order.PAYMENT_STATUS_COMPLETE)
+    if lower:
+        items = items.filter(order__placed_at__gte=lower)
+    if upper:
+        items = items.filter(order__placed_at__lt=upper)
+
+    written = {}
+    with transaction.atomic():
+        for name, (model, field, source) in ROLLUPS.items():
+            rows = model.objects.all()
+            if start:
+                rows = rows.filter(day__gte=start)
+            if end:
+                rows = rows.filter(day__lte=end)
+            rows.delete()
+
+            if field == 'collection_id':
+                # Items whose collection has been deleted since
+                items = items.exclude(collection_id=None)
+            grouped = (
+                items.annotate(day=TruncDate('order__placed_at'))
+                .values('day', source).order_by()
+                .annotate(
+                    # Aliased - an annotation named 'quantity' would shadow the column inside the revenue expression
+                    sold=Sum('quantity'),
+                    sales=Sum(F('quantity') * F('unit_price'), output_field=_MONEY),
+                    orders=Count('order_id', distinct=True),
+                )
+                .iterator(chunk_size=BATCH_SIZE)
+            )
+            written[name] = 0
+            while True:
+                batch = [
+                    model(day=row['day'], quantity=row['sold'], revenue=row['sales'], orders_count=row['orders'], **{field: row[source]})
+                    for row in islice(grouped, BATCH_SIZE)
+                ]
+                if not batch:
+                    break
+                model.objects.bulk_create(batch)
+                written[name] += len(batch)
+    return written
+
+
+# Reports Here...
+GROUPS = ('product', 'collection', 'day')
+ORDERINGS = ('revenue', 'quantity', 'orders_count')
+
+
+def report(start, end, group='product', product_ids=None, collection_ids=None, order_by='revenue', limit=50):
+    """
+    - Sales between start and end (inclusive) from the rollups, with two queries:
+
+        group='product' / 'collection' - one entry per product / collection, best first by order_by ('revenue', 'quantity' or 'orders_count'), at most limit of them
+        group='day' - one entry per day with sales, oldest first (order counts don't add up across products, so days have none)
+
+    - product_ids / collection_ids narrow it down; with product_ids the product rollup is read, otherwise the collection one.
+    """
+    model = DailyProductSales if group == 'product' or product_ids else DailyCollectionSales
+    rows = model.objects.filter(day__gte=start, day__lte=end)
+    if product_ids:
+        rows = rows.filter(product_id__in=product_ids)
+    if collection_ids:
+        rows = rows.filter(product__collection_id__in=collection_ids) if model is DailyProductSales else rows.filter(collection_id__in=collection_ids)
+
+    if group == 'day':
+        results = list(rows.values('day').order_by('day').annotate(quantity=Sum('quantity'), revenue=Sum('revenue')))
+    else:
+        if group == 'product':
+            key, label = 'product_id', 'product__title'
+        elif model is DailyProductSales:
+            key, label = 'product__collection_id', 'product__collection__title'
+        else:
+            key, label = 'collection_id', 'collection__title'
+        results = [
+            {'id': row[key], 'title': row[label], 'quantity': row['quantity'], 'revenue': row['revenue'], 'orders_count': row['orders_count']}
+            for row in rows.values(key, label).order_by()
+            .annotate(quantity=Sum('quantity'), revenue=Sum('revenue'), orders_count=Sum('orders_count'))
+            .order_by('-' + order_by, key)[:limit]
+        ]
+
+    totals = rows.aggregate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+    return {
+        'start': start,
+        'end': end,
+        'group': group,
+        'totals': {'quantity': totals['quantity'] or 0, 'revenue': totals['revenue'] or Decimal(0)},
+        'results': results,
+    }
+
+
+def columns(start, end, group='product'):
+    """
+    - The raw rollup rows of the range as columns - day, id, quantity, revenue_cents, orders_count - for bulk analysis. With NumPy these are arrays (datetime64[D] and int64; revenue in whole cents, so it stays exact), without it plain lists.
+    """
+    model, field, source = ROLLUPS[group]
+    rows = (
+        model.objects.filter(day__gte=start, day__lte=end).order_by('day', field)
+        .values_list('day', field, 'quantity', 'revenue', 'orders_count')
+    )
+    day, ids, quantity, revenue, orders_count = [], [], [], [], []
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        day.append(row[0])
+        ids.append(row[1])
+        quantity.append(row[2])
+        revenue.append(int(round(row[3] * 100)))
+        orders_count.append(row[4])
+    if np is None:
+        return {'day': day, 'id': ids, 'quantity': quantity, 'revenue_cents': revenue, 'orders_count': orders_count}
+    return {
+        'day': np.array(day, dtype='datetime64[D]'),
+        'id': np.array(ids, dtype=np.int64),
+        'quantity': np.array(quantity, dtype=np.int64),
+        'revenue_cents': np.array(revenue, dtype=np.int64),
+        'orders_count': np.array(orders_count, dtype=np.int64),
+    }
+
+
+def to_npz(data):
+    # numpy.load() on the bytes gives the columns back by name
+    buffer = BytesIO()
+    np.savez_compressed(buffer, **data)
+    return buffer.getvalue()
@@ -0,0 +1,97 @@
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotAllowed, JsonResponse
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+from .models import Product, Collection
+from .serializers import ProductSerializer, CompiledProductSerializer, CompiledCollectionSerializer
+from .filters import ProductFilter
+from .streaming import DEFAULT_CHUNK_SIZE, astream_json_array
+
+# Async Read Views Here...
+"""
+- Read-only twins of the product and collection list/detail views, written against Django's async ORM (aget, async for). Served under ASGI (trikha_store/asgi.py, e.g. uvicorn trikha_store.asgi:application) a request waiting on the database holds no worker thread, so one process keeps thousands of slow clients open at once. Under WSGI they still work, but Django runs each one in an event loop of its own and reads a streamed body completely before sending it.
+
+- The JSON is the same as the sync views' (the compiled serializers, see store/serializers.py). The lists are always streamed as one JSON array, chunk_size rows at a time (?chunk_size=, 500 by default); product lists take the same filters as /store/products/, and product responses the same ?fields= and ?expand= (collection, tags, likes_count).
+
+- Writes, keyset pages, facets and the response cache stay on the sync views.
+"""
+
+
+def _json(data, status=200):
+    # Rendered like DRF's JSONRenderer renders the sync views
+    return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder, json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')})
+
+
+def _not_found(model):
+    return _json({'detail': f'No {model._meta.object_name} matches the given query.'}, status=404)
+
+
+def _chunk_size(request):
+    try:
+        return max(1, int(request.GET['chunk_size']))
+    except (KeyError, ValueError):
+        return DEFAULT_CHUNK_SIZE
+
+
+# django.views.decorators.http.require_GET only learns about async views in Django 5.0
+def require_get(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def _filtered_products(params):
+    # Some filters look things up while the queryset is built (e.g. the Product content type for ?tag=) - build it in a thread
+    filterset = ProductFilter(params, queryset=Product.objects.all())
+    if not filterset.is_valid():
+        return None, filterset.errors
+    return filterset.qs, None
+
+
+# Async Product List View
+@require_get
+async def product_list(request):
+    try:
+        selection = ProductSerializer.fieldset(request.GET)
+    except ValidationError as error:
+        return _json(error.detail, status=400)
+    serializer = CompiledProductSerializer.select(**selection)
+    queryset, errors = await sync_to_async(_filtered_products)(request.GET)
+    if errors is not None:
+        return _json(errors, status=400)
+    queryset = ProductSerializer.prefetch(queryset, selection['expand']).values(*serializer.columns('title', 'id'))
+    return astream_json_array(queryset, serializer.aserialize, _chunk_size(request), ordering=('title', 'id'))
+
+# Async Product Detail View
+@require_get
+async def product_detail(request, id):
+    try:
+        selection = ProductSerializer.fieldset(request.GET)
+    except ValidationError as error:
+        return _json(error.detail, status=400)
+    serializer = CompiledProductSerializer.select(**selection)
+    try:
+        row = await ProductSerializer.prefetch(Product.objects.all(), selection['expand']).values(*serializer.columns()).aget(id=id)
+    except Product.DoesNotExist:
+        return _not_found(Product)
+    data = await serializer.aserialize([row])
+    return _json(data[0])
+
+# Async Collection List View
+@require_get
+async def collection_list(request):
+    queryset = Collection.objects.values(*CompiledCollectionSerializer.columns('title', 'id'))
+    return astream_json_array(queryset, CompiledCollectionSerializer.aserialize, _chunk_size(request), ordering=('title', 'id'))
+
+# Async Collection Detail View
+@require_get
+async def collection_detail(request, pk):
+    try:
+        row = await Collection.objects.values(*CompiledCollectionSerializer.columns()).aget(id=pk)
+    except Collection.DoesNotExist:
+        return _not_found(Collection)
+    return _json(CompiledCollectionSerializer.to_representation(row))
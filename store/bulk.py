@@ -0,0 +1,163 @@
+from decimal import ROUND_HALF_UP, Decimal
+from django.db import transaction
+from django.utils import timezone
+from . import facets
+from .cache import bump_version
+from .models import Collection, OrderItem, Product
+from .search import reindex_on_commit
+from .serializers import BulkProductSerializer
+
+# Bulk Product Writes Here...
+"""
+- A whole batch is handled with a fixed number of queries, however many items it holds:
+
+    1. every item is validated by BulkProductSerializer - the same field rules as ProductSerializer, but the collection stays a plain id, so validation itself never touches the database,
+    2. all referenced collections, all products to update, all products to delete and the ones of those with order items are each looked up with one IN query,
+    3. the valid items are written with bulk_create / bulk_update / one DELETE, inside a single transaction.
+
+- Invalid items don't stop the batch - they are reported back with their position in the request, and deletes that can't happen (no such product, or one that is part of an order) with their id.
+"""
+
+BATCH_SIZE = 1000
+UPDATE_FIELDS = ['title', 'slug', 'description', 'unit_price', 'inventory', 'collection', 'last_update']
+CENT = Decimal('0.01')
+MIN_PRICE = Decimal('1.00')      # Product.unit_price validator
+MAX_PRICE = Decimal('9999.99')   # max_digits=6, decimal_places=2
+
+
+def apply_product_batch(upserts, deletes):
+    errors = []
+    creates, updates = [], []
+
+    # 1. Validate
+    for index, item in enumerate(upserts):
+        serializer = BulkProductSerializer(data=item)
+        if serializer.is_valid():
+            (updates if 'id' in serializer.validated_data else creates).append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+
+    # 2-3 run in one transaction, with the products being updated locked until their counters are adjusted
+    with transaction.atomic():
+        # 2. Resolve references in bulk
+        collection_ids = {data['collection_id'] for index, data in creates + updates}
+        known_collections = set(Collection.objects.filter(id__in=collection_ids).values_list('id', flat=True))
+        existing = Product.objects.select_for_update().in_bulk([data['id'] for index, data in updates])
+
+        new_products, changed_products, deltas, facet_deltas = [], [], {}, []
+        for index, data in creates + updates:
+            if data['collection_id'] not in known_collections:
+                errors.append({'index': index, 'errors': {'collection': [f"Invalid pk \"{data['collection_id']}\" - object does not exist."]}})
+                continue
+            if 'id' not in data:
+                new_products.append(Product(**data))
+                facet_deltas.append(facets.facet_changes([], facets.product_facets(**{name: data[name] for name in Product.TRACKED_FIELDS})))
+                deltas[data['collection_id']] = deltas.get(data['collection_id'], 0) + 1
+                continue
+            product = existing.get(data['id'])
+            if product is None:
+                errors.append({'index': index, 'errors': {'id': [f"Product {data['id']} does not exist."]}})
+                continue
+            before = facets.product_facets(**{name: getattr(product, name) for name in Product.TRACKED_FIELDS})
+            if product.collection_id != data['collection_id']:
+                deltas[product.collection_id] = deltas.get(product.collection_id, 0) - 1
+                deltas[data['collection_id']] = deltas.get(data['collection_id'], 0) + 1
+            for field, value in data.items():
+                setattr(product, field, value)
+            after = facets.product_facets(**{name: getattr(product, name) for name in Product.TRACKED_FIELDS})
+            facet_deltas.append(facets.facet_changes(before, after))
+            changed_products.append(product)
+
+        # Products that are part of an order can't be deleted (same rule as product_detail), and ids that match no product are reported back too
+        found = set(Product.objects.filter(id__in=deletes).values_list('id', flat=True))
+        ordered = set(OrderItem.objects.filter(product_id__in=deletes).values_list('product_id', flat=True).distinct())
+        deletable = [product_id for product_id in deletes if product_id in found and product_id not in ordered]
+        for product_id in deletes:
+            if product_id not in found:
+                errors.append({'delete': product_id, 'errors': [f'Product {product_id} does not exist.']})
+            elif product_id in ordered:
+                errors.append({'delete': product_id, 'errors': ['Product is associated with an order item.']})
+
+        # 3. Write
+        now = timezone.now()
+        for product in changed_products:
+            # bulk_update() skips auto_now, so last_update is stamped by hand
+            product.last_update = now
+        Product.objects.bulk_create(new_products, batch_size=BATCH_SIZE)
+        Product.objects.bulk_update(changed_products, UPDATE_FIELDS, batch_size=BATCH_SIZE)
+        Collection.adjust_products_count(deltas)
+        facets.adjust(_merge(facet_deltas))
+        # queryset.delete() still sends post_delete per row, which keeps products_count right
+        deleted = Product.objects.filter(id__in=deletable).delete()[1].get(Product._meta.label, 0)
+    if new_products or changed_products:
+        # bulk_create() and bulk_update() send no signals
+        transaction.on_commit(lambda: bump_version('product'))
+    reindexed = [product.id for product in changed_products if product.search_fields_changed()]
+    if new_products:
+        # bulk_create() doesn't hand back ids on every backend (MySQL), so the index is rebuilt on the next search
+        reindex_on_commit()
+    elif reindexed:
+        reindex_on_commit(reindexed)
+
+    return {
+        'created': len(new_products),
+        'updated': len(changed_products),
+        'deleted': deleted,
+        'errors': sorted(errors, key=lambda error: error.get('index', len(upserts))),
+    }
+
+
+def _merge(deltas_list):
+    merged = {}
+    for deltas in deltas_list:
+        for key, delta in deltas.items():
+            merged[key] = merged.get(key, 0) + delta
+    return merged
+
+
+# Bulk Admin Actions Here...
+"""
+- Chunk handlers for the background admin actions (see store/jobs.py). Each one gets up to a chunk of product ids, inside the transaction run_job opens, and goes through _update_products: the rows are locked and changed in Python, written back with one bulk_update, and the counters that queryset.update() would leave behind (facets, products_count, cached responses, search index) are adjusted in the same go.
+"""
+
+def clear_inventory(ids):
+    _update_products(ids, ['inventory'], lambda product: setattr(product, 'inventory', 0))
+
+
+def adjust_prices(ids, percent):
+    """
+    - Raises (or with a negative percent, lowers) every unit price by percent, rounded half up to the cent and kept within the field's limits.
+    """
+    factor = 1 + Decimal(str(percent)) / 100
+
+    def adjust(product):
+        price = (product.unit_price * factor).quantize(CENT, rounding=ROUND_HALF_UP)
+        product.unit_price = min(max(price, MIN_PRICE), MAX_PRICE)
+    _update_products(ids, ['unit_price'], adjust)
+
+
+def reassign_collection(ids, collection_id):
+    _update_products(ids, ['collection'], lambda product: setattr(product, 'collection_id', collection_id))
+
+
+def _update_products(ids, fields, change):
+    products = list(Product.objects.select_for_update().filter(id__in=ids).order_by('id'))
+    deltas, facet_deltas = {}, []
+    now = timezone.now()
+    for product in products:
+        before = {name: getattr(product, name) for name in Product.TRACKED_FIELDS}
+        change(product)
+        after = {name: getattr(product, name) for name in Product.TRACKED_FIELDS}
+        facet_deltas.append(facets.facet_changes(facets.product_facets(**before), facets.product_facets(**after)))
+        if before['collection_id'] != after['collection_id']:
+            deltas[before['collection_id']] = deltas.get(before['collection_id'], 0) - 1
+            deltas[after['collection_id']] = deltas.get(after['collection_id'], 0) + 1
+        product.last_update = now
+    Product.objects.bulk_update(products, fields + ['last_update'], batch_size=BATCH_SIZE)
+    Collection.adjust_products_count(deltas)
+    facets.adjust(_merge(facet_deltas))
+    transaction.on_commit(lambda: bump_version('product'))
+    if 'collection' in fields:
+        # The collection title is part of every product's search document
+        transaction.on_commit(lambda: bump_version('collection'))
+        reindex_on_commit([product.id for product in products])
@@ -0,0 +1,220 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.utils.module_loading import import_string
+from .db.replicas import pinned_to_primary, replica_may_lag
+from .middleware import add_serialize_time
+
+# Response Cache Here...
+"""
+- Cached GET responses are keyed on the request (path, query string, Accept header) plus the current version counter of every model the response depends on. A save or delete bumps the counter of its model (see store/signals.py), so every key built from the old version simply stops matching - nothing has to be found and deleted, old entries just age out of the LRU.
+
+- The backend is pluggable through settings:
+
+    STORE_RESPONSE_CACHE = {
+        'BACKEND': 'store.cache.LRUBackend',
+        'OPTIONS': {'timeout': 300, 'max_bytes': 64 * 1024 * 1024},
+    }
+
+    Use 'store.cache.DjangoCacheBackend' (OPTIONS: {'alias': 'default', 'timeout': 300}) to share entries and versions between processes through any Django cache (Redis, Memcached, ...).
+"""
+
+
+# LRU Backend Here...
+class LRUBackend:
+    """
+    - In-process least-recently-used cache. Every entry has a TTL, and the total size of the stored bodies is capped at max_bytes - the least recently used entries are evicted first once the cap is reached.
+
+    - Versions live in the same process, so with several worker processes a write is only seen by the worker that made it; the others catch up when their entries expire. Use DjangoCacheBackend when that isn't acceptable.
+    """
+    def __init__(self, timeout=300, max_bytes=64 * 1024 * 1024):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, nbytes, value = item
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, nbytes, timeout=None):
+        if nbytes > self.max_bytes:
+            return
+        expires_at = time.monotonic() + (self.timeout if timeout is None else timeout)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, nbytes, value)
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        expires_at, nbytes, value = self._entries.pop(key)
+        self.size -= nbytes
+
+    def get_versions(self, names):
+        with self._lock:
+            return [self._versions.get(name, (0, 0.0)) for name in names]
+
+    def bump_version(self, name):
+        with self._lock:
+            version, changed_at = self._versions.get(name, (0, 0.0))
+            self._versions[name] = (version + 1, time.time())
+
+
+# Django Cache Backend Here...
+class DjangoCacheBackend:
+    """
+    - Stores entries and version counters in one of the CACHES aliases, so every worker process sees the same versions.
+    """
+    def __init__(self, alias='default', timeout=300):
+        from django.core.cache import caches
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def get(self, key):
+        return self.cache.get(self._hashed(key))
+
+    def set(self, key, value, nbytes, timeout=None):
+        self.cache.set(self._hashed(key), value, self.timeout if timeout is None else timeout)
+
+    def _hashed(self, key):
+        # Memcached rejects long keys and whitespace, and request keys carry both
+        return 'store:response:' + hashlib.md5(key.encode('utf-8')).hexdigest()
+
+    def clear(self):
+        self.cache.clear()
+
+    def get_versions(self, names):
+        keys = [f'version:{name}' for name in names]
+        found = self.cache.get_many(keys)
+        return [found.get(key, (0, 0.0)) for key in keys]
+
+    def bump_version(self, name):
+        key = f'version:{name}'
+        version, changed_at = self.cache.get(key, (0, 0.0))
+        self.cache.set(key, (version + 1, time.time()), None)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                config = getattr(settings, 'STORE_RESPONSE_CACHE', {})
+                backend_class = import_string(config.get('BACKEND', 'store.cache.LRUBackend'))
+                _backend = backend_class(**config.get('OPTIONS', {}))
+    return _backend
+
+
+def bump_version(*names):
+    backend = get_backend()
+    for name in names:
+        backend.bump_version(name)
+
+
+# Cached Response Decorator Here...
+def cached_response(depends_on, last_modified=None):
+    """
+    - depends_on: names of the models whose changes must invalidate the response, e.g. ('collection', 'product').
+
+    - last_modified: optional function (request, **kwargs) -> datetime or None, used for the Last-Modified header. It only runs when the response is built, never on a cache hit.
+
+    - Only successful GET responses are cached, and only on requests the read replicas allow it for (see store/db/replicas.py). Conditional requests (If-None-Match / If-Modified-Since) that match a cached entry get a 304 straight away, without touching the view, the database or the serializer.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or pinned_to_primary():
+                return view(request, *args, **kwargs)
+
+            backend = get_backend()
+            versions = backend.get_versions(depends_on)
+            key = _cache_key(request, versions)
+
+            entry = backend.get(key)
+            response = None
+            if entry is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200 or response.streaming:
+                    return response
+                if hasattr(response, 'render'):
+                    start = time.perf_counter()
+                    response.render()
+                    add_serialize_time(request, time.perf_counter() - start)
+
+                modified = last_modified(request, *args, **kwargs) if last_modified else None
+                # Deletes don't show up in last_update, so the latest version bump counts as a modification too
+                timestamps = [changed_at for version, changed_at in versions if changed_at]
+                if modified is not None:
+                    timestamps.append(modified.timestamp())
+
+                entry = {
+                    'content': response.content,
+                    'content_type': response['Content-Type'],
+                    'etag': quote_etag(hashlib.md5(key.encode('utf-8') + response.content).hexdigest()),
+                    'last_modified': http_date(max(timestamps)) if timestamps else None,
+                }
+                # Built from a replica that may not have the latest write yet - served, but not kept under the new versions
+                if not replica_may_lag(max((changed_at for version, changed_at in versions), default=0.0)):
+                    backend.set(key, entry, len(key) + len(entry['content']))
+
+            if _not_modified(request, entry):
+                return _with_validators(HttpResponseNotModified(), entry)
+            if response is None:
+                response = HttpResponse(entry['content'], content_type=entry['content_type'])
+            return _with_validators(response, entry)
+        return wrapper
+    return decorator
+
+
+def _cache_key(request, versions):
+    query = '&'.join(sorted(request.META.get('QUERY_STRING', '').split('&')))
+    accept = request.META.get('HTTP_ACCEPT', '')
+    counters = '.'.join(str(version) for version, changed_at in versions)
+    return f'store:response:{request.path}?{query}:{accept}:{counters}'
+
+
+def _with_validators(response, entry):
+    response['ETag'] = entry['etag']
+    if entry['last_modified']:
+        response['Last-Modified'] = entry['last_modified']
+    return response
+
+
+def _not_modified(request, entry):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        return entry['etag'] in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+
+    if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+    if if_modified_since and entry['last_modified']:
+        since = parse_http_date_safe(if_modified_since)
+        return since is not None and parse_http_date_safe(entry['last_modified']) <= since
+    return False
@@ -0,0 +1,287 @@
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Least
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from . import pricing
+from .models import Cart, CartItem, Product
+
+# Cart Stores Here...
+"""
+- Cart contents go through a cart store, so the storage can be swapped without touching the views:
+
+    DatabaseCartStore - every change goes straight to the CartItem table (the default).
+    HotCartStore      - active carts live in a Redis-compatible key-value store; the table is only written when the cart is flushed (flush_carts command, or right before checkout).
+
+- Settings:
+
+    STORE_CART_STORE = {
+        'BACKEND': 'store.carts.HotCartStore',
+        'OPTIONS': {'url': 'redis://localhost:6379/0'},   # or {'client': 'store.carts.InMemoryKV'} for tests
+    }
+"""
+
+MAX_QUANTITY = 32767  # CartItem.quantity is a PositiveSmallIntegerField
+
+
+# Database Cart Store Here...
+class DatabaseCartStore:
+    def get_items(self, cart_id):
+        return dict(CartItem.objects.filter(cart_id=cart_id).values_list('product_id', 'quantity'))
+
+    def add_item(self, cart_id, product_id, quantity):
+        """
+        - Adding a product that is already in the cart raises its quantity with a single UPDATE ... SET quantity = LEAST(quantity + n, MAX_QUANTITY); the row is only inserted when that UPDATE finds nothing. Two concurrent adds can't lose an increment, because neither reads the old quantity. A line never goes above MAX_QUANTITY - more of a product is capped there, not rejected.
+        """
+        updated = CartItem.objects.filter(cart_id=cart_id, product_id=product_id).update(quantity=_added(quantity))
+        if updated:
+            return
+        try:
+            with transaction.atomic():
+                CartItem.objects.create(cart_id=cart_id, product_id=product_id, quantity=quantity)
+        except IntegrityError:
+            # Someone inserted the same (cart, product) between our UPDATE and INSERT - unique_together caught it, so add on top of theirs
+            CartItem.objects.filter(cart_id=cart_id, product_id=product_id).update(quantity=_added(quantity))
+
+    def set_item(self, cart_id, product_id, quantity):
+        return CartItem.objects.filter(cart_id=cart_id, product_id=product_id).update(quantity=quantity) > 0
+
+    def remove_item(self, cart_id, product_id):
+        return CartItem.objects.filter(cart_id=cart_id, product_id=product_id).delete()[0] > 0
+
+    def discard(self, cart_id):
+        pass
+
+    def flush(self, cart_id=None):
+        return 0
+
+
+def _added(quantity):
+    return Least(F('quantity') + quantity, Value(MAX_QUANTITY))
+
+
+# In-Memory Key-Value Store Here...
+class InMemoryKV:
+    """
+    - A stand-in for redis.Redis with just the hash/set commands HotCartStore uses. Single process only - meant for tests and local development.
+    """
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def hincrby(self, key, field, amount=1):
+        with self._lock:
+            hash_ = self._data.setdefault(key, {})
+            hash_[field] = int(hash_.get(field, 0)) + amount
+            return hash_[field]
+
+    def hset(self, key, field, value):
+        with self._lock:
+            self._data.setdefault(key, {})[field] = value
+
+    def hsetnx(self, key, field, value):
+        with self._lock:
+            hash_ = self._data.setdefault(key, {})
+            if field in hash_:
+                return 0
+            hash_[field] = value
+            return 1
+
+    def hdel(self, key, *fields):
+        with self._lock:
+            hash_ = self._data.get(key, {})
+            return sum(1 for field in fields if hash_.pop(field, None) is not None)
+
+    def hgetall(self, key):
+        with self._lock:
+            return dict(self._data.get(key, {}))
+
+    def exists(self, key):
+        with self._lock:
+            return int(key in self._data)
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    def sadd(self, key, *members):
+        with self._lock:
+            self._data.setdefault(key, set()).update(members)
+
+    def srem(self, key, *members):
+        with self._lock:
+            self._data.get(key, set()).difference_update(members)
+
+    def smembers(self, key):
+        with self._lock:
+            return set(self._data.get(key, set()))
+
+
+# Hot Cart Store Here...
+class HotCartStore:
+    """
+    - Each cart is a hash cart:<id> of {product_id: quantity} plus a '_loaded' marker, so an empty cart is still known to the store. Adds are HINCRBY - atomic on the server, no read-modify-write.
+
+    - A cart that isn't in the store yet is loaded from the table on first use. Every change marks the cart dirty; flush() writes dirty carts back with one upsert and one delete each.
+    """
+    LOADED = '_loaded'
+    DIRTY_SET = 'carts:dirty'
+
+    def __init__(self, client=None, url=None):
+        if url is not None:
+            import redis
+            self.kv = redis.Redis.from_url(url, decode_responses=True)
+        else:
+            self.kv = import_string(client or 'store.carts.InMemoryKV')()
+
+    def _key(self, cart_id):
+        return f'cart:{cart_id}'
+
+    def _load(self, cart_id):
+        key = self._key(cart_id)
+        if not self.kv.exists(key):
+            items = dict(CartItem.objects.filter(cart_id=cart_id).values_list('product_id', 'quantity'))
+            # HSETNX, so a concurrent request that loaded and changed the cart first is never overwritten
+            for product_id, quantity in items.items():
+                self.kv.hsetnx(key, str(product_id), quantity)
+            self.kv.hsetnx(key, self.LOADED, 1)
+        return key
+
+    def get_items(self, cart_id):
+        stored = self.kv.hgetall(self._load(cart_id))
+        return {int(field): int(quantity) for field, quantity in stored.items() if field != self.LOADED}
+
+    def add_item(self, cart_id, product_id, quantity):
+        key = self._load(cart_id)
+        if self.kv.hincrby(key, str(product_id), quantity) > MAX_QUANTITY:
+            # Capped like DatabaseCartStore, so a flush never writes more than the column holds
+            self.kv.hset(key, str(product_id), MAX_QUANTITY)
+        self.kv.sadd(self.DIRTY_SET, str(cart_id))
+
+    def set_item(self, cart_id, product_id, quantity):
+        key = self._load(cart_id)
+        if str(product_id) not in self.kv.hgetall(key):
+            return False
+        self.kv.hset(key, str(product_id), quantity)
+        self.kv.sadd(self.DIRTY_SET, str(cart_id))
+        return True
+
+    def remove_item(self, cart_id, product_id):
+        removed = self.kv.hdel(self._load(cart_id), str(product_id)) > 0
+        if removed:
+            self.kv.sadd(self.DIRTY_SET, str(cart_id))
+        return removed
+
+    def discard(self, cart_id):
+        self.kv.delete(self._key(cart_id))
+        self.kv.srem(self.DIRTY_SET, str(cart_id))
+
+    def flush(self, cart_id=None):
+        """
+        - Writes dirty carts (or just cart_id) back to CartItem and returns how many were written.
+        """
+        cart_ids = [str(cart_id)] if cart_id is not None else list(self.kv.smembers(self.DIRTY_SET))
+        flushed = 0
+        for dirty_id in cart_ids:
+            self.kv.srem(self.DIRTY_SET, dirty_id)
+            if not Cart.objects.filter(id=dirty_id).exists():
+                # The cart was deleted (or swept) meanwhile - nothing to write back
+                self.kv.delete(self._key(dirty_id))
+                continue
+            items = self.get_items(dirty_id)
+            with transaction.atomic():
+                CartItem.objects.filter(cart_id=dirty_id).exclude(product_id__in=list(items)).delete()
+                CartItem.objects.bulk_create(
+                    [CartItem(cart_id=dirty_id, product_id=product_id, quantity=quantity) for product_id, quantity in items.items()],
+                    update_conflicts=True,
+                    update_fields=['quantity'],
+                    **self._conflict_target(),
+                )
+            flushed += 1
+        return flushed
+
+    def _conflict_target(self):
+        # PostgreSQL and SQLite need the conflict target (ON CONFLICT (cart_id, product_id)); MySQL's ON DUPLICATE KEY UPDATE takes none and rejects one - the (cart, product) unique constraint is the only one an insert can hit there
+        return {'unique_fields': ['cart', 'product']} if connection.features.supports_update_conflicts_with_target else {}
+
+
+def describe_cart(cart_id, items):
+    """
+    - The GET representation of a cart: every line with its product and line total, plus the cart total. All products are read with one query, their promotions with another; lines are charged at the promotion-aware effective price.
+    """
+    products = {row['id']: row for row in Product.objects.filter(id__in=list(items)).values('id', 'title', 'unit_price')}
+    prices = pricing.quote(products.values())
+    lines = []
+    for product_id, quantity in items.items():
+        product = products.get(product_id)
+        if product is None:
+            continue
+        product['effective_price'] = prices[product_id].effective_price
+        lines.append({
+            'product': product,
+            'quantity': quantity,
+            'total_price': prices[product_id].effective_price * quantity,
+        })
+    lines.sort(key=lambda line: line['product']['title'])
+    return {
+        'id': str(cart_id),
+        'items': lines,
+        'total_price': sum((line['total_price'] for line in lines), 0),
+    }
+
+
+# Expired Cart Sweeper Here...
+def sweep_expired_carts(max_age=None, chunk_size=1000, pause=0.1, dry_run=False):
+    """
+    - Deletes carts created more than max_age ago (default: settings.STORE_CART_MAX_AGE, 30 days), walking them in (created_at, id) order one chunk at a time - each chunk starts right after the last cart of the previous one on the created_at index, so no chunk rescans the carts already swept. Each chunk is its own short transaction - its items with one DELETE, then its carts with another - so locks are held briefly and no delete cascades over the whole table. pause seconds are slept between chunks to leave room for regular traffic.
+
+    - Yields one report per chunk: {'chunk', 'carts', 'items', 'seconds'}.
+    """
+    max_age = max_age or getattr(settings, 'STORE_CART_MAX_AGE', timedelta(days=30))
+    cutoff = timezone.now() - max_age
+    store = get_cart_store()
+    expired = Cart.objects.filter(created_at__lt=cutoff).order_by('created_at', 'id')
+
+    last = None
+    chunk = 0
+    while True:
+        queryset = expired if last is None else expired.filter(Q(created_at__gt=last[0]) | Q(created_at=last[0], id__gt=last[1]))
+        rows = list(queryset.values_list('created_at', 'id')[:chunk_size])
+        if not rows:
+            return
+        last = rows[-1]
+        ids = [cart_id for created_at, cart_id in rows]
+        chunk += 1
+
+        start = time.monotonic()
+        if dry_run:
+            items = CartItem.objects.filter(cart_id__in=ids).count()
+            carts = len(ids)
+        else:
+            with transaction.atomic():
+                items = CartItem.objects.filter(cart_id__in=ids).delete()[0]
+                carts = Cart.objects.filter(id__in=ids, created_at__lt=cutoff).delete()[0]
+            for cart_id in ids:
+                store.discard(cart_id)
+        yield {'chunk': chunk, 'carts': carts, 'items': items, 'seconds': time.monotonic() - start}
+
+        if pause:
+            time.sleep(pause)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_cart_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = getattr(settings, 'STORE_CART_STORE', {})
+                _store = import_string(config.get('BACKEND', 'store.carts.DatabaseCartStore'))(**config.get('OPTIONS', {}))
+    return _store
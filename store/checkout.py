@@ -0,0 +1,83 @@
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+from functools import reduce
+from operator import or_
+from . import facets, pricing
+from .cache import bump_version
+from .carts import get_cart_store
+from .models import Cart, CartItem, Order, OrderItem, Product
+
+# Checkout Here...
+"""
+- Turns a cart into an Order in one transaction:
+
+    1. the cart's lines are read (after flushing it from the hot cart store, if one is used),
+    2. all of its products are locked with one SELECT ... FOR UPDATE, in ascending id order - every checkout takes its locks in the same order, so two checkouts sharing products queue up instead of deadlocking,
+    3. stock is checked against the locked rows,
+    4. the Order row (with its total and item count) and all OrderItems (with the promotion-aware price from store/pricing.py and the product's collection snapshotted) are inserted - the items with one bulk_create,
+    5. inventory is decremented with one conditional UPDATE whose WHERE repeats the stock check; if it doesn't touch every product the whole transaction is rolled back, so stock can never go below zero,
+    6. the cart is deleted.
+"""
+
+
+class CheckoutError(Exception):
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.message = message
+        self.details = details or {}
+
+
+def checkout(cart_id, customer_id):
+    store = get_cart_store()
+    store.flush(cart_id)
+
+    with transaction.atomic():
+        items = dict(CartItem.objects.filter(cart_id=cart_id).values_list('product_id', 'quantity'))
+        if not items:
+            raise CheckoutError('The cart is empty.')
+
+        products = list(
+            Product.objects.select_for_update()
+            .filter(id__in=list(items))
+            .order_by('id')
+            .values_list('id', 'unit_price', 'inventory', 'collection_id')
+        )
+        short = {
+            product_id: {'requested': items[product_id], 'available': inventory}
+            for product_id, unit_price, inventory, collection_id in products
+            if inventory < items[product_id]
+        }
+        if short:
+            raise CheckoutError('Not enough stock for some products.', short)
+
+        # Each line is charged the promotion-aware effective price at the moment of checkout
+        prices = pricing.quote((product_id, unit_price) for product_id, unit_price, inventory, collection_id in products)
+        # bulk_create skips the OrderItem signals - the order is created with its totals instead
+        order = Order.objects.create(
+            customer_id=customer_id,
+            total=sum(prices[product_id].effective_price * items[product_id] for product_id, unit_price, inventory, collection_id in products),
+            items_count=sum(items[product_id] for product_id, unit_price, inventory, collection_id in products),
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=product_id, collection_id=collection_id, quantity=items[product_id], unit_price=prices[product_id].effective_price)
+            for product_id, unit_price, inventory, collection_id in products
+        ])
+
+        enough_stock = reduce(or_, [Q(id=product_id, inventory__gte=items[product_id]) for product_id, unit_price, inventory, collection_id in products])
+        updated = Product.objects.filter(enough_stock).update(
+            inventory=Case(*[When(id=product_id, then=F('inventory') - items[product_id]) for product_id, unit_price, inventory, collection_id in products])
+        )
+        if updated != len(products):
+            # Can only happen when the rows weren't really locked - roll everything back rather than oversell
+            raise CheckoutError('Not enough stock for some products.')
+
+        # queryset.update() sends no signals - keep the inventory facets and cached product responses in step
+        facets.adjust(facets.facet_changes(
+            [('inventory', facets.band_for(inventory, facets.INVENTORY_BANDS)) for product_id, unit_price, inventory, collection_id in products],
+            [('inventory', facets.band_for(inventory - items[product_id], facets.INVENTORY_BANDS)) for product_id, unit_price, inventory, collection_id in products],
+        ))
+        Cart.objects.filter(id=cart_id).delete()
+        transaction.on_commit(lambda: bump_version('product'))
+
+    store.discard(cart_id)
+    return order
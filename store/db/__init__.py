@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+from collections import deque
+
+# Database Connection Pool Here...
+"""
+- Django opens a new database connection for every thread that runs a query and, with CONN_MAX_AGE = 0, closes it again at the end of the request. Under ASGI every request gets a thread of its own (the async ORM calls of a request all run in one worker thread that lives as long as the request), so without a pool each request pays for a fresh connect, login and session setup.
+
+- The backends in store.db.mysql and store.db.sqlite3 are the stock Django backends plus a process-wide pool: closing a connection hands the open DB-API connection back to the pool, and the next connect - from any thread, sync or async request alike - takes it from there. Connections are only pooled in a clean state (autocommit on, no atomic block open, no errors since the last check); anything else is really closed.
+
+    DATABASES = {
+        'default': {
+            'ENGINE': 'store.db.mysql',
+            ...
+            'CONN_MAX_AGE': 0,          # give connections back at the end of every request
+            'CONN_HEALTH_CHECKS': True, # ping a pooled connection before handing it out again
+            'POOL': {'MAX_SIZE': 20, 'MAX_IDLE': 300},
+        }
+    }
+
+- MAX_SIZE caps the idle connections kept per database (more can be open at once, the extras are closed when they are given back); connections idle for longer than MAX_IDLE seconds are closed instead of reused. The pool belongs to the process that created it, so forked workers never share a socket.
+"""
+
+DEFAULT_POOL_SIZE = 20
+DEFAULT_POOL_MAX_IDLE = 300
+
+
+class ConnectionPool:
+    def __init__(self, max_size=DEFAULT_POOL_SIZE, max_idle=DEFAULT_POOL_MAX_IDLE):
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.pid = os.getpid()
+        self._idle = deque()
+        self._lock = threading.Lock()
+
+    def get(self):
+        # Most recently returned first - those are the least likely to have been dropped by the server
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection, returned_at = self._idle.pop()
+            if time.monotonic() - returned_at <= self.max_idle:
+                return connection
+            _close_quietly(connection)
+
+    def put(self, connection):
+        with self._lock:
+            if len(self._idle) < self.max_size:
+                self._idle.append((connection, time.monotonic()))
+                return
+        _close_quietly(connection)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for connection, returned_at in idle:
+            _close_quietly(connection)
+
+    def __len__(self):
+        return len(self._idle)
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict):
+    pool = _pools.get(alias)
+    if pool is None or pool.pid != os.getpid():
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None or pool.pid != os.getpid():
+                options = settings_dict.get('POOL') or {}
+                pool = _pools[alias] = ConnectionPool(
+                    max_size=options.get('MAX_SIZE', DEFAULT_POOL_SIZE),
+                    max_idle=options.get('MAX_IDLE', DEFAULT_POOL_MAX_IDLE),
+                )
+    return pool
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    - Mixed into a backend's DatabaseWrapper: get_new_connection() takes from the pool before opening a new connection, _close() gives clean connections back.
+    """
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        while True:
+            connection = pool.get()
+            if connection is None:
+                return super().get_new_connection(conn_params)
+            if not self.settings_dict['CONN_HEALTH_CHECKS'] or self._pooled_connection_usable(connection):
+                return connection
+            _close_quietly(connection)
+
+    def _pooled_connection_usable(self, connection):
+        # is_usable() checks self.connection - point it at the pooled connection for the check
+        previous, self.connection = self.connection, connection
+        try:
+            return self.is_usable()
+        finally:
+            self.connection = previous
+
+    def _close(self):
+        if self.connection is None:
+            return
+        if self.in_atomic_block or not self.autocommit or self.errors_occurred:
+            return super()._close()
+        self.pool.put(self.connection)
@@ -0,0 +1,7 @@
+from django.db.backends.mysql import base
+from .. import PooledDatabaseWrapperMixin
+
+
+# MySQL Backend Here - the stock backend with a connection pool, see store/db/__init__.py
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    pass
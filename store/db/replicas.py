@@ -0,0 +1,267 @@
+import threading
+import time
+from contextvars import ContextVar
+from itertools import count
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Read Replicas Here...
+"""
+- Catalog reads - products, collections, promotions, reviews, tags and the facet counts - can be served by read replicas, so browsing doesn't compete with checkouts for the primary. Everything else, and every write, stays on the primary (DEFAULT_DB_ALIAS).
+
+    DATABASES = {'default': {...}, 'replica1': {...}, 'replica2': {...}}
+    DATABASE_ROUTERS = ['store.db.replicas.ReplicaRouter']
+    MIDDLEWARE = ['store.middleware.RequestMetricsMiddleware', 'store.db.replicas.ReplicaMiddleware', ...]
+    STORE_READ_REPLICAS = {
+        'DATABASES': ['replica1', 'replica2'],
+        'STRATEGY': 'round_robin',   # or 'least_latency' - the replica with the lowest recent query time
+        'STICKY_SECONDS': 5,
+    }
+
+- A replica only serves reads of GET and HEAD requests, and only outside transactions on the primary. Management commands, background jobs and anything else outside a request read from the primary.
+
+- Read-your-writes: a request that writes is answered from the primary from then on, and its response sets a cookie that keeps the client's next requests on the primary for STICKY_SECONDS - long enough for the replicas to catch up, so a client never reads its own change back as missing.
+
+- The response cache (store/cache.py) follows the same rules: requests pinned to the primary skip it, and responses a replica served within STICKY_SECONDS of a write to a model they depend on aren't stored.
+
+- Lag-aware fallback: every CHECK_SECONDS (5 by default) each replica's replication lag is read (MySQL SHOW REPLICA STATUS, PostgreSQL pg_last_xact_replay_timestamp(); SQLite replicas count as current). A replica that is further behind than MAX_LAG seconds (STICKY_SECONDS by default), has replication stopped, or can't be reached is skipped until the next check; with no replica left, the primary answers.
+
+- MODELS (app_label.model_name) lists the models that are read from replicas; the many-to-many tables of those models go with them. Replica databases need the same schema - they are never migrated on their own (migrate only touches the primary), the schema comes through replication.
+"""
+
+DEFAULT_MODELS = [
+    'store.product', 'store.collection', 'store.promotion', 'store.review', 'store.reviewsummary', 'store.facetcount',
+    'tags.tag', 'tags.taggeditem',
+]
+STICKY_COOKIE = 'store_primary_until'
+
+
+def get_config():
+    config = getattr(settings, 'STORE_READ_REPLICAS', {})
+    sticky = config.get('STICKY_SECONDS', 5)
+    return {
+        'DATABASES': list(config.get('DATABASES', [])),
+        'STRATEGY': config.get('STRATEGY', 'round_robin'),
+        'STICKY_SECONDS': sticky,
+        'MAX_LAG': config.get('MAX_LAG', sticky),
+        'CHECK_SECONDS': config.get('CHECK_SECONDS', 5),
+        'MODELS': set(config.get('MODELS', DEFAULT_MODELS)),
+    }
+
+
+class _RequestState:
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.wrote = False
+
+
+# The routing state of the request being served - asgiref copies it into the threads that run an async view's queries
+_request_state = ContextVar('replica_request_state', default=None)
+
+
+def pinned_to_primary():
+    """
+    - True when replicas are configured but the current request reads from the primary: it wrote, or its client is still within STICKY_SECONDS of an earlier write. The response cache answers such requests from the database - a cached entry could predate the client's own write (with a per-process cache, a write made in another worker hasn't moved this worker's versions).
+    """
+    state = _request_state.get()
+    return state is not None and (not state.use_replicas or state.wrote) and bool(get_config()['DATABASES'])
+
+
+def replica_may_lag(changed_at):
+    """
+    - True when the current request may be reading from a replica that hasn't caught up with a write made at changed_at (a time.time() timestamp) yet - less than STICKY_SECONDS ago. The response cache doesn't store such responses: they would be kept under the new versions, stale, until the entry expires.
+    """
+    state = _request_state.get()
+    if state is None or not state.use_replicas or state.wrote:
+        return False
+    config = get_config()
+    return bool(config['DATABASES']) and time.time() - changed_at < config['STICKY_SECONDS']
+
+
+# Replica Health Here...
+class ReplicaMonitor:
+    """
+    - Per process: the recent query time of every replica (an exponential moving average, measured on each query) and the result of its last lag check.
+    """
+    SMOOTHING = 0.2
+    # least_latency still sends every EXPLORE_EVERY-th read round robin - a replica that was slow once would otherwise never be measured again
+    EXPLORE_EVERY = 20
+
+    def __init__(self):
+        self.latency = {}
+        self._checked = {}
+        self._lock = threading.Lock()
+        self._turn = count()
+
+    def record(self, alias, seconds):
+        previous = self.latency.get(alias)
+        self.latency[alias] = seconds if previous is None else previous + self.SMOOTHING * (seconds - previous)
+
+    def usable(self, alias, config):
+        with self._lock:
+            checked_at, lag = self._checked.get(alias, (None, None))
+            due = checked_at is None or time.monotonic() - checked_at >= config['CHECK_SECONDS']
+            if due:
+                # Claimed before the check runs, so concurrent requests don't all check at once - they use the last result meanwhile
+                self._checked[alias] = (time.monotonic(), lag)
+        if due:
+            lag = replication_lag(alias)
+            with self._lock:
+                self._checked[alias] = (time.monotonic(), lag)
+        return lag is not None and lag <= config['MAX_LAG']
+
+    def choose(self, aliases, strategy):
+        turn = next(self._turn)
+        if strategy == 'least_latency' and turn % self.EXPLORE_EVERY:
+            # Replicas without a measurement yet go first, so every one gets measured
+            return min(aliases, key=lambda alias: self.latency.get(alias, 0.0))
+        return aliases[turn % len(aliases)]
+
+    def reset(self):
+        with self._lock:
+            self.latency.clear()
+            self._checked.clear()
+
+
+monitor = ReplicaMonitor()
+
+
+def replication_lag(alias):
+    """
+    - Seconds the replica is behind the primary, or None when replication is stopped or the replica can't be reached.
+    """
+    connection = connections[alias]
+    try:
+        if connection.vendor == 'mysql':
+            with connection.cursor() as cursor:
+                try:
+                    cursor.execute('SHOW REPLICA STATUS')
+                    column = 'Seconds_Behind_Source'
+                except DatabaseError:
+                    # MySQL before 8.0.22
+                    cursor.execute('SHOW SLAVE STATUS')
+                    column = 'Seconds_Behind_Master'
+                row = cursor.fetchone()
+                if row is None:
+                    # Not set up as a replica at all - nothing to lag behind
+                    return 0
+                lag = dict(zip([description[0] for description in cursor.description], row)).get(column)
+                return None if lag is None else float(lag)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END')
+                lag = cursor.fetchone()[0]
+                return 0 if lag is None else float(lag)
+    except DatabaseError:
+        connection.close()
+        return None
+    return 0
+
+
+@receiver(connection_created)
+def install_latency_timer(sender, connection, **kwargs):
+    if connection.alias in get_config()['DATABASES'] and _time_replica_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_replica_query)
+
+
+def _time_replica_query(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        monitor.record(context['connection'].alias, time.perf_counter() - start)
+
+
+# Replica Router Here...
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is None or not state.use_replicas or state.wrote:
+            return DEFAULT_DB_ALIAS
+        config = get_config()
+        if not config['DATABASES'] or not _routed(model, config['MODELS']):
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Reads inside a transaction belong with it
+            return DEFAULT_DB_ALIAS
+        usable = [alias for alias in config['DATABASES'] if monitor.usable(alias, config)]
+        if not usable:
+            return DEFAULT_DB_ALIAS
+        return monitor.choose(usable, config['STRATEGY'])
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the primary's data - an object read from one may point at an object read from another
+        databases = {DEFAULT_DB_ALIAS, *get_config()['DATABASES']}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+def _routed(model, labels):
+    opts = model._meta
+    if opts.auto_created:
+        # The table of a many-to-many field goes with the model that declares it
+        opts = opts.auto_created._meta
+    return opts.label_lower in labels
+
+
+# Read Replica Middleware Here...
+class ReplicaMiddleware:
+    """
+    - Decides per request whether its reads may go to a replica, and after a write pins the client to the primary with the sticky cookie.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.state_for(request)
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        state = self.state_for(request)
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.finish(state, response)
+
+    def state_for(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return _RequestState(use_replicas=False)
+        try:
+            pinned = float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        return _RequestState(use_replicas=not pinned)
+
+    def finish(self, state, response):
+        # Streamed bodies are produced after this point, outside the request's state - they read from the primary
+        sticky = get_config()['STICKY_SECONDS']
+        if state.wrote and sticky > 0:
+            response.set_cookie(STICKY_COOKIE, f'{time.time() + sticky:.3f}', max_age=sticky, httponly=True, samesite='Lax')
+        return response
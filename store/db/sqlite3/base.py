@@ -0,0 +1,7 @@
+from django.db.backends.sqlite3 import base
+from .. import PooledDatabaseWrapperMixin
+
+
+# SQLite Backend Here - the stock backend with a connection pool, see store/db/__init__.py. In-memory databases are never closed, so they never reach the pool.
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,122 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count, F
+from .models import FacetCount, Product
+from tags.models import TaggedItem
+
+# Product Facets Here...
+"""
+- The storefront sidebar shows, for every filter dimension, how many products carry each value. Instead of one COUNT ... GROUP BY per dimension on every request, the numbers live in the FacetCount table and are adjusted by +1/-1 whenever a product, its promotions or its tags change (see store/signals.py). Reading all facets is a single query on a small table.
+
+- Dimensions and their values:
+    collection - collection id
+    price      - price band ('0-10', '10-50', '50-100', '100+')
+    inventory  - inventory band ('out', 'low', 'ok')
+    promotion  - promotion id
+    tag        - tag id
+
+- Counts are catalog-wide; they don't narrow down with the filters of the current request. rebuild_facets recomputes the whole table if it ever drifts.
+"""
+
+PRICE_BANDS = [
+    (0, 10, '0-10'),
+    (10, 50, '10-50'),
+    (50, 100, '50-100'),
+    (100, None, '100+'),
+]
+INVENTORY_BANDS = [
+    (None, 1, 'out'),
+    (1, 10, 'low'),
+    (10, None, 'ok'),
+]
+DIMENSIONS = ['collection', 'price', 'inventory', 'promotion', 'tag']
+
+
+def band_for(value, bands):
+    for low, high, name in bands:
+        if (low is None or value >= low) and (high is None or value < high):
+            return name
+
+
+def band_range(name, bands):
+    for low, high, band in bands:
+        if band == name:
+            return low, high
+
+
+def product_facets(collection_id, unit_price, inventory):
+    """
+    - The facet values that come from the product row itself (promotions and tags are counted from their own signals).
+    """
+    facets = []
+    if collection_id is not None:
+        facets.append(('collection', str(collection_id)))
+    if unit_price is not None:
+        facets.append(('price', band_for(unit_price, PRICE_BANDS)))
+    if inventory is not None:
+        facets.append(('inventory', band_for(inventory, INVENTORY_BANDS)))
+    return facets
+
+
+def facet_changes(before, after):
+    deltas = {}
+    for facet in before:
+        deltas[facet] = deltas.get(facet, 0) - 1
+    for facet in after:
+        deltas[facet] = deltas.get(facet, 0) + 1
+    return {facet: delta for facet, delta in deltas.items() if delta}
+
+
+def adjust(deltas):
+    """
+    - deltas: {(dimension, value): change}. Each row is changed with an UPDATE ... SET count = count + n; rows are created on first use.
+    """
+    with transaction.atomic():
+        for (dimension, value), delta in deltas.items():
+            if not delta:
+                continue
+            updated = FacetCount.objects.filter(dimension=dimension, value=value).update(count=F('count') + delta)
+            if not updated:
+                FacetCount.objects.get_or_create(dimension=dimension, value=value)
+                FacetCount.objects.filter(dimension=dimension, value=value).update(count=F('count') + delta)
+
+
+def drop(dimension, value):
+    FacetCount.objects.filter(dimension=dimension, value=str(value)).delete()
+
+
+def get_facets():
+    facets = {dimension: [] for dimension in DIMENSIONS}
+    for dimension, value, count in FacetCount.objects.filter(count__gt=0).order_by('dimension', 'value').values_list('dimension', 'value', 'count'):
+        facets.setdefault(dimension, []).append({'value': value, 'count': count})
+    return facets
+
+
+def rebuild():
+    """
+    - Recomputes every facet from scratch. Used by the rebuild_facets command.
+    """
+    deltas = {}
+    for collection_id, unit_price, inventory in Product.objects.values_list('collection_id', 'unit_price', 'inventory').iterator(chunk_size=2000):
+        for facet in product_facets(collection_id, unit_price, inventory):
+            deltas[facet] = deltas.get(facet, 0) + 1
+
+    promotions = Product.promotions.through.objects.values('promotion_id').annotate(count=Count('id')).values_list('promotion_id', 'count')
+    for promotion_id, count in promotions:
+        deltas[('promotion', str(promotion_id))] = count
+
+    content_type = ContentType.objects.get_for_model(Product)
+    tags = (
+        TaggedItem.objects.filter(content_type=content_type, object_id__in=Product.objects.values('id'))
+        .values('tag_id').annotate(count=Count('id')).values_list('tag_id', 'count')
+    )
+    for tag_id, count in tags:
+        deltas[('tag', str(tag_id))] = count
+
+    with transaction.atomic():
+        FacetCount.objects.all().delete()
+        FacetCount.objects.bulk_create(
+            [FacetCount(dimension=dimension, value=value, count=count) for (dimension, value), count in deltas.items()],
+            batch_size=1000,
+        )
+    return len(deltas)
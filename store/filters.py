@@ -0,0 +1,62 @@
+from django.contrib.contenttypes.models import ContentType
+from django_filters import rest_framework as filters
+from .facets import INVENTORY_BANDS, PRICE_BANDS, band_range
+from .models import Customer, Order, Product
+from tags.models import TaggedItem
+
+# Product Filter Here...
+class ProductFilter(filters.FilterSet):
+    """
+    - ?collection=<id>&price_min=&price_max=&price=<band>&inventory=<band>&promotion=<id>&tag=<id>
+
+    - price and inventory take the same band names as the facet counts, so a sidebar entry can be turned into a filter as it is.
+    """
+    collection = filters.NumberFilter(field_name='collection_id')
+    price_min = filters.NumberFilter(field_name='unit_price', lookup_expr='gte')
+    price_max = filters.NumberFilter(field_name='unit_price', lookup_expr='lte')
+    price = filters.ChoiceFilter(choices=[(name, name) for low, high, name in PRICE_BANDS], method='filter_band')
+    inventory = filters.ChoiceFilter(choices=[(name, name) for low, high, name in INVENTORY_BANDS], method='filter_band')
+    promotion = filters.NumberFilter(field_name='promotions')
+    tag = filters.NumberFilter(method='filter_tag')
+
+    class Meta:
+        model = Product
+        fields = []
+
+    def filter_band(self, queryset, name, value):
+        bands, field = (PRICE_BANDS, 'unit_price') if name == 'price' else (INVENTORY_BANDS, 'inventory')
+        low, high = band_range(value, bands)
+        if low is not None:
+            queryset = queryset.filter(**{field + '__gte': low})
+        if high is not None:
+            queryset = queryset.filter(**{field + '__lt': high})
+        return queryset
+
+    def filter_tag(self, queryset, name, value):
+        tagged = TaggedItem.objects.filter(
+            content_type=ContentType.objects.get_for_model(Product), tag_id=value
+        ).values('object_id')
+        return queryset.filter(id__in=tagged)
+
+# Customer Filter Here...
+class CustomerFilter(filters.FilterSet):
+    # ?membership=B|S|G
+    membership = filters.ChoiceFilter(choices=Customer.MEMBERSHIP_CHOICES)
+
+    class Meta:
+        model = Customer
+        fields = []
+
+# Order Filter Here...
+class OrderFilter(filters.FilterSet):
+    """
+    - ?customer=<id>&payment_status=P|C|F&placed_after=&placed_before= (YYYY-MM-DD or a full timestamp; placed_before is exclusive)
+    """
+    customer = filters.NumberFilter(field_name='customer_id')
+    payment_status = filters.ChoiceFilter(choices=Order.PAYMENT_STATUS_CHOICES)
+    placed_after = filters.DateTimeFilter(field_name='placed_at', lookup_expr='gte')
+    placed_before = filters.DateTimeFilter(field_name='placed_at', lookup_expr='lt')
+
+    class Meta:
+        model = Order
+        fields = []
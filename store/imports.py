@@ -0,0 +1,206 @@
+import csv
+import json
+import os
+from collections import Counter
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Max
+from rest_framework.exceptions import ValidationError
+from . import facets
+from .cache import bump_version
+from .models import Collection, Product, Promotion
+from .search import reindex_on_commit
+from .serializers import ImportProductSerializer
+
+# Catalog Imports Here...
+"""
+- The pieces of manage.py import_catalog: reading a CSV / JSON / NDJSON file row by row, validating rows (validate_rows - plain data in and out, so it can run in worker processes), and loading the valid ones (load_batch).
+
+- A batch is loaded with a fixed number of queries, however many rows it holds:
+
+    1. the collections (by title) and promotions (by description) the rows name are looked up with one IN query each; the missing ones are created with one bulk_create and read back,
+    2. the products are written with bulk_create, their promotion links with one more,
+    3. products_count and the facet counts - which bulk_create's missing signals would leave behind - are adjusted once for the batch.
+
+- Each batch is one transaction. If the database rejects it (a value the serializer let through but the column doesn't take, a lost connection halfway), the batch is retried one row at a time, each row in a savepoint of its own, so only the offending rows are skipped.
+
+- Rows look like the products export (/store/exports/products/): title, slug, description, unit_price, inventory, collection (the title), promotions (descriptions separated by ";", each optionally "description:discount"). Other columns, e.g. id and last_update, are ignored. A promotion that doesn't exist yet is created only if the row gives its discount.
+"""
+
+FORMATS = ('csv', 'json', 'ndjson')
+BATCH_SIZE = 1000
+
+
+def file_format(path):
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    return 'ndjson' if extension == 'jsonl' else extension
+
+
+def read_rows(path, format):
+    """
+    - The rows of the file as dicts, one at a time. A .json file is one array and is parsed as a whole - for very large catalogs use CSV or NDJSON, which are streamed.
+    """
+    with open(path, newline='' if format == 'csv' else None, encoding='utf-8-sig') as file:
+        if format == 'csv':
+            for row in csv.DictReader(file):
+                yield _normalize(row)
+        elif format == 'ndjson':
+            for line in file:
+                if line.strip():
+                    yield _normalize(json.loads(line))
+        else:
+            for row in json.load(file):
+                yield _normalize(row)
+
+
+def _normalize(row):
+    promotions = row.get('promotions')
+    if isinstance(promotions, str):
+        row['promotions'] = [entry for entry in (part.strip() for part in promotions.split(';')) if entry]
+    elif promotions is None:
+        row.pop('promotions', None)
+    return row
+
+
+def validate_rows(rows):
+    """
+    - rows: [(row_number, raw_row)]. Returns [(row_number, validated_data, None)] for the valid rows and [(row_number, None, errors)] for the rest, errors as plain lists of strings.
+    """
+    # One serializer for every row - building its fields costs more than validating a row (ListSerializer does the same, but gives up on all rows if one is invalid)
+    serializer = ImportProductSerializer()
+    results = []
+    for number, row in rows:
+        try:
+            results.append((number, dict(serializer.run_validation(row)), None))
+        except ValidationError as error:
+            results.append((number, None, json.loads(json.dumps(error.detail))))
+    return results
+
+
+def load_batch(rows):
+    """
+    - rows: [(row_number, validated_data)] from validate_rows(). Returns counts and the errors of the rows that couldn't be loaded.
+    """
+    errors = []
+    with transaction.atomic():
+        collections, new_collections = _resolve(Collection, 'title', [data['collection'] for number, data in rows])
+
+        # A new promotion takes the first discount any row gives it
+        discounts = {}
+        for number, data in rows:
+            for description, discount in data['promotions']:
+                if discounts.get(description.casefold()) is None:
+                    discounts[description.casefold()] = discount
+        promotions, new_promotions = _resolve(
+            Promotion, 'description', [description for number, data in rows for description, discount in data['promotions']],
+            create=lambda description: Promotion(description=description, discount=discounts[description.casefold()]),
+            creatable=lambda description: discounts[description.casefold()] is not None,
+        )
+        loadable = []
+        for number, data in rows:
+            unknown = [description for description, discount in data['promotions'] if description.casefold() not in promotions]
+            if unknown:
+                errors.append({'row': number, 'errors': {'promotions': [f'Unknown promotion "{description}" - give its discount to create it, e.g. "{description}:0.1".' for description in unknown]}})
+            else:
+                loadable.append((number, data))
+
+        try:
+            with transaction.atomic():
+                products = _create_products(loadable, collections, promotions)
+        except DatabaseError:
+            products = []
+            for number, data in loadable:
+                try:
+                    with transaction.atomic():
+                        products += _create_products([(number, data)], collections, promotions)
+                except DatabaseError as error:
+                    errors.append({'row': number, 'errors': {'non_field_errors': [str(error)]}})
+
+        counts, facet_deltas = {}, {}
+        for product in products:
+            counts[product.collection_id] = counts.get(product.collection_id, 0) + 1
+            product_facets = facets.product_facets(product.collection_id, product.unit_price, product.inventory)
+            for facet in product_facets + [('promotion', str(promotion_id)) for promotion_id in product.promotion_ids]:
+                facet_deltas[facet] = facet_deltas.get(facet, 0) + 1
+        Collection.adjust_products_count(counts)
+        facets.adjust(facet_deltas)
+        if products:
+            # bulk_create() sends no signals
+            transaction.on_commit(lambda: bump_version('product', 'collection', 'promotion'))
+            reindex_on_commit()
+
+    return {
+        'created': len(products),
+        'collections_created': new_collections,
+        'promotions_created': new_promotions,
+        'errors': errors,
+    }
+
+
+def _resolve(model, field, names, create=None, creatable=None):
+    """
+    - {casefolded name: id} for names, creating the missing rows (those creatable() allows) with one bulk_create. Names are keyed casefolded, so one name in different cases is one row (MySQL's default collation compares them that way too), created with the spelling that comes first; of several rows with the same name the oldest wins.
+    """
+    names = list(dict.fromkeys(names))
+    def lookup():
+        found = {}
+        for name, id in model.objects.filter(**{field + '__in': names}).order_by('id').values_list(field, 'id'):
+            found.setdefault(name.casefold(), id)
+        return found
+
+    found = lookup()
+    missing = {}
+    for name in names:
+        if name.casefold() not in found and (creatable is None or creatable(name)):
+            missing.setdefault(name.casefold(), name)
+    if not missing:
+        return found, 0
+    model.objects.bulk_create([create(name) if create else model(**{field: name}) for name in missing.values()], batch_size=BATCH_SIZE)
+    return lookup(), len(missing)
+
+
+def _create_products(rows, collections, promotions):
+    products = [
+        Product(
+            title=data['title'], slug=data['slug'], description=data.get('description'),
+            unit_price=data['unit_price'], inventory=data['inventory'],
+            collection_id=collections[data['collection'].casefold()],
+        )
+        for number, data in rows
+    ]
+    for product, (number, data) in zip(products, rows):
+        product.promotion_ids = sorted({promotions[description.casefold()] for description, discount in data['promotions']})
+    linked = any(product.promotion_ids for product in products)
+    read_back = linked and not connection.features.can_return_rows_from_bulk_insert
+    if read_back:
+        after_id = Product.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    Product.objects.bulk_create(products, batch_size=BATCH_SIZE)
+    if not linked:
+        return products
+
+    if read_back:
+        _read_back_ids(products, after_id)
+    through = Product.promotions.through
+    through.objects.bulk_create([
+        through(product_id=product.id, promotion_id=promotion_id)
+        for product in products
+        for promotion_id in product.promotion_ids
+    ], batch_size=BATCH_SIZE)
+    return products
+
+
+def _read_back_ids(products, after_id):
+    """
+    - MySQL hands back no ids from bulk_create. The new rows are read back by (slug, title, collection) among the ids after after_id - the highest one before the insert - and rows with the same key are matched in insertion order, the order an INSERT hands out ids in.
+
+    - Another import committing a row with the same key in between would make the match ambiguous. Then DatabaseError is raised, and load_batch retries the batch one row at a time.
+    """
+    key = lambda product: (product.slug, product.title, product.collection_id)
+    new_ids = {}
+    rows = Product.objects.filter(id__gt=after_id, slug__in={product.slug for product in products}).order_by('id').values_list('id', 'slug', 'title', 'collection_id')
+    for id, *row_key in rows:
+        new_ids.setdefault(tuple(row_key), []).append(id)
+    expected = Counter(key(product) for product in products)
+    if any(len(new_ids.get(product_key, ())) != count for product_key, count in expected.items()):
+        raise DatabaseError('The ids of the new products could not be read back.')
+    for product in products:
+        product.id = new_ids[key(product)].pop(0)
@@ -0,0 +1,122 @@
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import AdminJob
+
+# Background Jobs Here...
+"""
+- Bulk admin actions don't write inside the admin request. They create an AdminJob row and hand it to a job worker. The worker walks the selected rows in primary key order, chunk_size ids at a time, and calls the job's handler once per chunk. Each chunk is its own short transaction, so a select-all over the whole table never holds its row locks for long, and a failure only rolls back the chunk it happened in. After every chunk the job's processed counter goes up - the AdminJob changelist shows the progress.
+
+- A handler is a function handler(ids, **params) given by its dotted path, e.g. 'store.bulk.clear_inventory'. It writes one chunk of ids inside the transaction run_job opens for it.
+
+- Workers are pluggable:
+
+    STORE_JOB_WORKER = {
+        'BACKEND': 'store.jobs.ThreadPoolWorker',   # the default - jobs run on a small thread pool in the web process
+        'OPTIONS': {'max_workers': 2},
+    }
+
+  'store.jobs.ImmediateWorker' runs the job right away in the calling thread (tests, management commands). Any class with a submit(function, *args) method works. A worker that hands the call to another process has to pickle the arguments - the selection is a QuerySet, which pickles as its query.
+
+- A job writes a heartbeat (AdminJob.heartbeat_at) when it starts and after every chunk. The thread pool lives and dies with its web process, so a restart takes its queued and running jobs along; fail_stale_jobs() marks the ones without a heartbeat for STORE_JOB_STALE_SECONDS (600 by default) as failed, instead of leaving them running forever. It runs when a ThreadPoolWorker starts, and on a schedule with manage.py fail_stale_jobs - reading the AdminJob changelist never writes. The selection isn't stored, so a failed job isn't resumed - the action is run again. A job that was only slow is set back to running by its next chunk.
+"""
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def enqueue(handler, queryset, description, params=None, user=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    - Creates the AdminJob and submits it to the worker once the current transaction has committed.
+    """
+    job = AdminJob.objects.create(
+        description=description,
+        handler=handler,
+        params=params or {},
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+    # Only the ids matter - ordering and select_related of the changelist queryset would only slow the chunk queries down
+    selection = queryset.model._default_manager.filter(pk__in=queryset.values('pk')) if queryset.query.is_sliced else queryset.order_by()
+    transaction.on_commit(lambda: get_job_worker().submit(run_job, job.id, selection, chunk_size))
+    return job
+
+
+def run_job(job_id, queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    last_pk = None
+    try:
+        job = AdminJob.objects.get(id=job_id)
+        handler = import_string(job.handler)
+        now = timezone.now()
+        AdminJob.objects.filter(id=job_id).update(status=AdminJob.STATUS_RUNNING, started_at=now, heartbeat_at=now, finished_at=None, total=queryset.count())
+        while True:
+            chunk = queryset.order_by('pk')
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            ids = list(chunk.values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                handler(ids, **job.params)
+                AdminJob.objects.filter(id=job_id).update(status=AdminJob.STATUS_RUNNING, processed=F('processed') + len(ids), heartbeat_at=timezone.now())
+            last_pk = ids[-1]
+    except Exception:
+        AdminJob.objects.filter(id=job_id).update(status=AdminJob.STATUS_FAILED, finished_at=timezone.now(), error=traceback.format_exc())
+        raise
+    # error is cleared in case fail_stale_jobs() gave up on the job too early
+    AdminJob.objects.filter(id=job_id).update(status=AdminJob.STATUS_DONE, finished_at=timezone.now(), error='')
+
+
+def fail_stale_jobs(max_age=None):
+    """
+    - Marks the queued and running jobs without a heartbeat for max_age seconds (STORE_JOB_STALE_SECONDS by default) as failed, and returns how many there were.
+    """
+    if max_age is None:
+        max_age = getattr(settings, 'STORE_JOB_STALE_SECONDS', 600)
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=max_age)
+    return AdminJob.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, created_at__lt=cutoff),
+        status__in=[AdminJob.STATUS_QUEUED, AdminJob.STATUS_RUNNING],
+    ).update(status=AdminJob.STATUS_FAILED, finished_at=now, error='The worker stopped before the job finished, e.g. because the server was restarted. Run the action again for the rows it did not reach.')
+
+
+# Job Workers Here...
+class ImmediateWorker:
+    def submit(self, function, *args):
+        return function(*args)
+
+
+class ThreadPoolWorker:
+    def __init__(self, max_workers=2):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='admin-job')
+        # The jobs of the pool this process had before a restart are gone
+        fail_stale_jobs()
+
+    def submit(self, function, *args):
+        return self.executor.submit(self._run, function, *args)
+
+    def _run(self, function, *args):
+        # Every pool thread has its own database connection - give it back when the job is over
+        try:
+            return function(*args)
+        finally:
+            connection.close()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_job_worker():
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                config = getattr(settings, 'STORE_JOB_WORKER', {})
+                _worker = import_string(config.get('BACKEND', 'store.jobs.ThreadPoolWorker'))(**config.get('OPTIONS', {}))
+    return _worker
@@ -0,0 +1,61 @@
+from decimal import Decimal
+from time import perf_counter
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from store.models import Collection, Product
+from store.serializers import CompiledProductSerializer, ProductSerializer
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark: ProductSerializer vs CompiledProductSerializer on list responses. Rows are created inside a transaction that is rolled back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000])
+        parser.add_argument('--repeat', type=int, default=3, help='Best of N runs per size.')
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        self.stdout.write(f"{'products':>10} {'drf (s)':>10} {'compiled (s)':>13} {'speedup':>8}")
+
+        for size in options['sizes']:
+            with transaction.atomic():
+                self._populate(size)
+
+                drf_seconds, drf_body = self._best_of(options['repeat'], lambda: renderer.render(
+                    ProductSerializer(Product.objects.select_related('collection').order_by('title', 'id'), many=True).data
+                ))
+                compiled_seconds, compiled_body = self._best_of(options['repeat'], lambda: renderer.render(
+                    CompiledProductSerializer.serialize(Product.objects.values(*CompiledProductSerializer.columns()).order_by('title', 'id'))
+                ))
+                transaction.set_rollback(True)
+
+            if drf_body != compiled_body:
+                raise CommandError(f'Output mismatch at {size} products')
+            self.stdout.write(f'{size:>10} {drf_seconds:>10.3f} {compiled_seconds:>13.3f} {drf_seconds / compiled_seconds:>7.1f}x')
+
+    def _populate(self, size):
+        collection = Collection.objects.create(title='Benchmark')
+        Product.objects.bulk_create(
+            [
+                Product(
+                    title=f'Product {i:06d}',
+                    slug=f'product-{i}',
+                    description='Benchmark product' if i % 2 else None,
+                    unit_price=Decimal(100 + i % 9000) / 100,
+                    inventory=i % 50,
+                    collection=collection,
+                )
+                for i in range(size)
+            ],
+            batch_size=1000,
+        )
+
+    def _best_of(self, repeat, function):
+        best, result = None, None
+        for _ in range(max(1, repeat)):
+            start = perf_counter()
+            result = function()
+            elapsed = perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
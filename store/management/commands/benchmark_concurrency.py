@@ -0,0 +1,274 @@
+import asyncio
+import importlib.util
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+from io import StringIO
+from time import perf_counter
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from store.models import Collection, Product
+
+SERVERS = {
+    # ASGI: the async read views (store/async_views.py) under uvicorn
+    'asgi': 'uvicorn',
+    # WSGI: the regular sync views under gunicorn with threaded workers
+    'wsgi': 'gunicorn',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the throughput of the ASGI deployment (async read views under uvicorn) with the WSGI deployment (sync views under gunicorn) '
+        'at several numbers of concurrent keep-alive clients. Both servers run as subprocesses on the SQLite database of the given settings, '
+        'which is filled by generate_catalog first - run it with --settings=trikha_store.bench_settings. Needs uvicorn and gunicorn installed. '
+        'Reports requests/s, p50/p95/p99 latency and errors per server and concurrency level; --output writes JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[100, 250, 500, 1000], help='Concurrent client connections, one run per value.')
+        parser.add_argument('--duration', type=float, default=10.0, help='Measured seconds per run.')
+        parser.add_argument('--warmup', type=float, default=2.0, help='Seconds of load before each measured run.')
+        parser.add_argument('--servers', nargs='+', choices=sorted(SERVERS), default=['asgi', 'wsgi'])
+        parser.add_argument('--workers', type=int, default=2, help='Server processes, for both servers.')
+        parser.add_argument('--threads', type=int, default=32, help='Threads per gunicorn worker.')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--warm-cache', action='store_true', help="Let the sync views answer from the response cache (default: every request misses it, like the async views, which don't cache).")
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+            raise CommandError('benchmark_concurrency needs a SQLite database file the servers can open - pass --settings=trikha_store.bench_settings')
+        missing = [SERVERS[name] for name in options['servers'] if importlib.util.find_spec(SERVERS[name]) is None]
+        if missing:
+            raise CommandError(f"Install {' and '.join(missing)} first (pip install {' '.join(missing)})")
+
+        self._prepare(options)
+        rng = random.Random(options['seed'])
+        product_ids = list(Product.objects.values_list('id', flat=True))
+        collection_ids = list(Collection.objects.values_list('id', flat=True))
+        # The servers run in other processes - don't keep the database open here
+        connection.close()
+        _raise_open_files_limit()
+
+        results = []
+        for name in options['servers']:
+            targets = self._targets(name, rng, product_ids, collection_ids, options['warm_cache'])
+            with _server(name, options) as port:
+                for concurrency in options['concurrency']:
+                    self.stdout.write(f'{name}: {concurrency} connections ...')
+                    result = asyncio.run(_load(port, targets, concurrency, options['duration'], options['warmup']))
+                    results.append({'server': name, 'concurrency': concurrency, **result})
+
+        self._print(results)
+        if options['output']:
+            report = {
+                'meta': {
+                    'products': options['products'],
+                    'seed': options['seed'],
+                    'duration': options['duration'],
+                    'workers': options['workers'],
+                    'threads': options['threads'],
+                    'warm_cache': options['warm_cache'],
+                    'cpus': os.cpu_count(),
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                },
+                'results': results,
+            }
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def _prepare(self, options):
+        call_command('migrate', verbosity=0, interactive=False)
+        if Product.objects.count() != options['products']:
+            call_command('flush', verbosity=0, interactive=False)
+            call_command('generate_catalog', products=options['products'], seed=options['seed'], stdout=StringIO())
+
+    def _targets(self, name, rng, product_ids, collection_ids, warm_cache):
+        # The same four reads on both servers; the product lists are one collection each, streamed as a whole
+        if name == 'asgi':
+            paths = [
+                lambda: f'/store/async/products/?collection={rng.choice(collection_ids)}',
+                lambda: f'/store/async/product/{rng.choice(product_ids)}/',
+                lambda: '/store/async/collections/',
+                lambda: f'/store/async/collection/{rng.choice(collection_ids)}/',
+            ]
+        else:
+            paths = [
+                lambda: f'/store/products/?stream=true&collection={rng.choice(collection_ids)}',
+                lambda: f'/store/product/{rng.choice(product_ids)}/',
+                lambda: '/store/collections/',
+                lambda: f'/store/collection/{rng.choice(collection_ids)}/',
+            ]
+        if warm_cache:
+            return lambda: rng.choice(paths)()
+        # The query string is part of the cache key - a unique one makes every request a miss
+        counter = iter(range(sys.maxsize))
+
+        def cold():
+            path = rng.choice(paths)()
+            return f"{path}{'&' if '?' in path else '?'}nocache={next(counter)}"
+        return cold
+
+    def _print(self, results):
+        self.stdout.write(f"{'server':<6} {'conns':>6} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for result in results:
+            self.stdout.write(
+                f"{result['server']:<6} {result['concurrency']:>6} {result['requests']:>9} {result['requests_per_second']:>9.1f} "
+                f"{result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['errors']:>7}"
+            )
+
+
+class _server:
+    def __init__(self, name, options):
+        self.name = name
+        self.options = options
+        self.process = None
+
+    def __enter__(self):
+        port = self.options['port']
+        workers = str(self.options['workers'])
+        if self.name == 'asgi':
+            command = [
+                sys.executable, '-m', 'uvicorn', 'trikha_store.asgi:application',
+                '--host', '127.0.0.1', '--port', str(port), '--workers', workers,
+                '--backlog', '4096', '--no-access-log', '--log-level', 'warning',
+            ]
+        else:
+            command = [
+                sys.executable, '-m', 'gunicorn', 'trikha_store.wsgi:application',
+                '--bind', f'127.0.0.1:{port}', '--workers', workers, '--worker-class', 'gthread', '--threads', str(self.options['threads']),
+                '--worker-connections', '4096', '--backlog', '4096', '--keep-alive', '30', '--log-level', 'warning',
+            ]
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+        self.process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+        _wait_until_serving(port, self.process)
+        return port
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+def _wait_until_serving(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f'The server exited with status {process.returncode}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise CommandError(f'The server did not start listening on port {port} within {timeout}s')
+
+
+def _raise_open_files_limit():
+    # One socket per client connection on this side, one per accepted connection on the server side (the servers inherit the limit)
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = 65536 if hard == resource.RLIM_INFINITY else min(hard, 65536)
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+
+async def _load(port, next_path, concurrency, duration, warmup):
+    """
+    - concurrency clients, each on its own keep-alive connection, sending GETs back to back. Only responses that finish inside the measured window count.
+    """
+    latencies = []
+    errors = 0
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    async def client():
+        nonlocal errors
+        reader = writer = None
+        while loop.time() < stop_at:
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                path = next_path()
+                start = perf_counter()
+                writer.write(f'GET {path} HTTP/1.1\r\nHost: testserver\r\nAccept: application/json\r\n\r\n'.encode('ascii'))
+                status, keep_alive = await _read_response(reader)
+                elapsed = perf_counter() - start
+                if loop.time() >= measure_from:
+                    if status == 200:
+                        latencies.append(elapsed * 1000)
+                    else:
+                        errors += 1
+                if not keep_alive:
+                    writer.close()
+                    writer = None
+            except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+                if loop.time() >= measure_from:
+                    errors += 1
+                if writer is not None:
+                    writer.close()
+                writer = None
+                await asyncio.sleep(0.05)
+        if writer is not None:
+            writer.close()
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'requests_per_second': round(len(latencies) / duration, 1),
+        'p50_ms': round(_percentile(latencies, 50), 3),
+        'p95_ms': round(_percentile(latencies, 95), 3),
+        'p99_ms': round(_percentile(latencies, 99), 3),
+        'errors': errors,
+    }
+
+
+async def _read_response(reader):
+    # Just enough HTTP/1.1 for the two servers: a status line, headers, and a Content-Length or chunked body
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ', 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip().lower()
+
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';', 1)[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get('connection') != 'close'
+
+
+def _percentile(ordered, percent):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
@@ -0,0 +1,137 @@
+import json
+import platform
+import random
+import resource
+from time import perf_counter
+import django
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from store.cache import get_backend
+from store.models import Collection, Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the store API and admin changelists through the test client against a throwaway database filled by generate_catalog. '
+        'Run it with SQLite settings, e.g. --settings=trikha_store.bench_settings. Reports p50/p95/p99 latency, queries per request and peak RSS; '
+        '--output writes JSON and --compare prints the change against an earlier JSON file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--requests', type=int, default=50, help='Measured requests per endpoint.')
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--warm-cache', action='store_true', help='Keep the response cache between requests (default: cold, every request does the full work).')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--compare', help='Earlier JSON results to compare against.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('benchmark_endpoints runs on SQLite only - pass --settings=trikha_store.bench_settings')
+
+        setup_test_environment()
+        runner = DiscoverRunner(interactive=False, verbosity=0)
+        old_config = runner.setup_databases()
+        try:
+            call_command('generate_catalog', products=options['products'], seed=options['seed'], stdout=self.stdout)
+            results = self._run(options)
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'products': options['products'],
+                'seed': options['seed'],
+                'requests': options['requests'],
+                'warm_cache': options['warm_cache'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'results': results,
+        }
+        self._print(results, self._load(options['compare']) if options['compare'] else None)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def _targets(self, rng):
+        product_ids = list(Product.objects.values_list('id', flat=True))
+        collection_ids = list(Collection.objects.values_list('id', flat=True))
+        return [
+            ('product-list', lambda: reverse('product-list')),
+            ('product-detail', lambda: reverse('product-detail', args=[rng.choice(product_ids)])),
+            ('collection-list', lambda: reverse('collection-list')),
+            ('collection-detail', lambda: reverse('collection-detail', args=[rng.choice(collection_ids)])),
+            ('admin:store_product_changelist', lambda: reverse('admin:store_product_changelist')),
+            ('admin:store_collection_changelist', lambda: reverse('admin:store_collection_changelist')),
+            ('admin:store_customer_changelist', lambda: reverse('admin:store_customer_changelist')),
+            ('admin:store_order_changelist', lambda: reverse('admin:store_order_changelist')),
+            ('admin:store_cartitem_changelist', lambda: reverse('admin:store_cartitem_changelist')),
+        ]
+
+    def _run(self, options):
+        rng = random.Random(options['seed'])
+        client = Client()
+        client.force_login(User.objects.create_superuser('bench', 'bench@example.com', 'bench'))
+        cache = get_backend()
+
+        results = {}
+        for name, url in self._targets(rng):
+            for _ in range(options['warmup']):
+                client.get(url())
+
+            latencies, queries = [], []
+            for _ in range(options['requests']):
+                if not options['warm_cache']:
+                    cache.clear()
+                path = url()
+                with CaptureQueriesContext(connection) as captured:
+                    start = perf_counter()
+                    response = client.get(path)
+                    latencies.append((perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    raise CommandError(f'{name}: GET {path} returned {response.status_code}')
+                queries.append(len(captured))
+
+            latencies.sort()
+            results[name] = {
+                'p50_ms': round(_percentile(latencies, 50), 3),
+                'p95_ms': round(_percentile(latencies, 95), 3),
+                'p99_ms': round(_percentile(latencies, 99), 3),
+                'queries_per_request': round(sum(queries) / len(queries), 2),
+                # ru_maxrss is in kilobytes on Linux - it is the peak of the whole process so far
+                'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            }
+        return results
+
+    def _load(self, path):
+        with open(path) as baseline:
+            return json.load(baseline)['results']
+
+    def _print(self, results, baseline):
+        self.stdout.write(f"{'endpoint':<36} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'rss kb':>9}")
+        for name, result in results.items():
+            line = (
+                f"{name:<36} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+                f"{result['queries_per_request']:>8.1f} {result['peak_rss_kb']:>9}"
+            )
+            if baseline and name in baseline and baseline[name]['p50_ms']:
+                change = (result['p50_ms'] - baseline[name]['p50_ms']) / baseline[name]['p50_ms'] * 100
+                line += f"   p50 {change:+.1f}%  queries {baseline[name]['queries_per_request']:.1f} -> {result['queries_per_request']:.1f}"
+            self.stdout.write(line)
+
+
+def _percentile(ordered, percent):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
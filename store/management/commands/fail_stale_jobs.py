@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from store.jobs import fail_stale_jobs
+
+
+class Command(BaseCommand):
+    help = 'Mark queued and running admin jobs without a recent heartbeat as failed. Safe to schedule (cron, Celery beat, ...) - e.g. every few minutes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, help='Heartbeat age after which a job counts as stale (default: settings.STORE_JOB_STALE_SECONDS, or 600).')
+
+    def handle(self, *args, **options):
+        failed = fail_stale_jobs(options['seconds'])
+        self.stdout.write(self.style.SUCCESS(f'Marked {failed} stale jobs as failed.'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from store.carts import get_cart_store
+
+
+class Command(BaseCommand):
+    help = 'Write carts changed in the hot cart store back to the CartItem table. Schedule it every few seconds when STORE_CART_STORE uses HotCartStore.'
+
+    def handle(self, *args, **options):
+        flushed = get_cart_store().flush()
+        self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} carts.'))
@@ -0,0 +1,122 @@
+import random
+from io import StringIO
+from datetime import timedelta
+from decimal import Decimal
+from time import perf_counter
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from store import analytics, facets
+from store.cache import bump_version
+from store.models import Collection, Customer, Order, OrderItem, Product, Promotion, Review, ReviewSummary
+from store.search import reindex_on_commit
+from tags.models import Tag, TaggedItem
+
+BATCH_SIZE = 1000
+WORDS = [
+    'classic', 'premium', 'organic', 'compact', 'wireless', 'smart', 'vintage', 'deluxe', 'portable', 'eco',
+    'coffee', 'laptop', 'sneaker', 'lamp', 'backpack', 'watch', 'speaker', 'jacket', 'bottle', 'chair',
+]
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic synthetic dataset (same --seed and --products give the same rows) with bulk_create. Meant for an empty database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        products = options['products']
+        start = perf_counter()
+
+        with transaction.atomic():
+            collection_ids = self._create(Collection, [Collection(title=f'Collection {i:04d}') for i in range(max(1, products // 100))])
+            promotion_ids = self._create(Promotion, [
+                Promotion(description=f'Promotion {i}', discount=rng.choice([0.05, 0.1, 0.15, 0.2, 0.3])) for i in range(max(1, products // 500))
+            ])
+            product_ids = self._create(Product, [
+                Product(
+                    title=f'{rng.choice(WORDS).title()} {rng.choice(WORDS)} {i:07d}',
+                    slug=f'product-{i}',
+                    description=' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 30))),
+                    unit_price=Decimal(rng.randint(100, 99999)) / 100,
+                    inventory=rng.randint(0, 200),
+                    collection_id=rng.choice(collection_ids),
+                )
+                for i in range(products)
+            ])
+
+            through = Product.promotions.through
+            self._create(through, [
+                through(product_id=product_id, promotion_id=rng.choice(promotion_ids))
+                for product_id in product_ids if rng.random() < 0.2
+            ], fetch_ids=False)
+
+            tag_ids = self._create(Tag, [Tag(label=f'{word}-{i}') for i, word in enumerate(WORDS * 3)])
+            content_type = ContentType.objects.get_for_model(Product)
+            self._create(TaggedItem, [
+                TaggedItem(tag_id=tag_id, content_type=content_type, object_id=product_id)
+                for product_id in product_ids
+                for tag_id in rng.sample(tag_ids, rng.randint(0, 3))
+            ], fetch_ids=False)
+
+            customer_ids = self._create(Customer, [
+                Customer(
+                    first_name=f'First{i}', last_name=f'Last{i}',
+                    email=f'customer{i}.seed{options["seed"]}@example.com', phone=f'555{i:07d}',
+                )
+                for i in range(max(1, products // 10))
+            ])
+
+            order_count = max(1, products // 5)
+            statuses = [Order.PAYMENT_STATUS_COMPLETE] * 8 + [Order.PAYMENT_STATUS_PENDING, Order.PAYMENT_STATUS_FAILED]
+            order_ids = self._create(Order, [
+                Order(customer_id=rng.choice(customer_ids), payment_status=rng.choice(statuses)) for _ in range(order_count)
+            ])
+            # placed_at is auto_now_add, so orders are spread over the last year afterwards - one UPDATE per day
+            by_day = {}
+            for order_id in order_ids:
+                by_day.setdefault(rng.randint(0, 364), []).append(order_id)
+            now = timezone.now()
+            for day, ids in by_day.items():
+                Order.objects.filter(id__in=ids).update(placed_at=now - timedelta(days=day))
+
+            prices, collections = {}, {}
+            for product_id, unit_price, collection_id in Product.objects.filter(id__in=product_ids).values_list('id', 'unit_price', 'collection_id'):
+                prices[product_id], collections[product_id] = unit_price, collection_id
+            items = []
+            for order_id in order_ids:
+                for product_id in rng.sample(product_ids, min(len(product_ids), rng.randint(1, 5))):
+                    items.append(OrderItem(order_id=order_id, product_id=product_id, collection_id=collections[product_id], quantity=rng.randint(1, 5), unit_price=prices[product_id]))
+            self._create(OrderItem, items, fetch_ids=False)
+
+            self._create(Review, [
+                Review(product_id=rng.choice(product_ids), name=f'Reviewer {i}', description=' '.join(rng.choice(WORDS) for _ in range(20)))
+                for i in range(products // 2)
+            ], fetch_ids=False)
+
+            # bulk_create skips every signal - bring the derived data up to date in one go
+            call_command('reconcile_products_count', stdout=StringIO())
+            facets.rebuild()
+            ReviewSummary.rebuild()
+            Order.refresh_totals()
+            analytics.rebuild()
+            transaction.on_commit(lambda: bump_version('product', 'collection', 'promotion', 'tag', 'review'))
+            reindex_on_commit()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {products} products, {len(customer_ids)} customers, {order_count} orders, {len(items)} order items in {perf_counter() - start:.1f}s.'
+        ))
+
+    def _create(self, model, objects, fetch_ids=True):
+        """
+        - bulk_create() only returns primary keys on some backends (not MySQL), so the new ids are read back as the highest len(objects) ids.
+        """
+        model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+        if not fetch_ids:
+            return []
+        return sorted(model.objects.order_by('-id').values_list('id', flat=True)[:len(objects)])
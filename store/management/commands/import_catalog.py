@@ -0,0 +1,145 @@
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from time import perf_counter
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from store import imports
+
+MAX_ERRORS_SHOWN = 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Import products from a CSV, JSON or NDJSON file (columns like the products export: title, slug, description, unit_price, inventory, '
+        'collection, promotions). Rows are validated with ProductSerializer\'s rules in a pool of worker processes while the main process loads '
+        'the valid ones in bulk_create batches, creating missing collections and promotions on the way - see store/imports.py. '
+        'Progress is saved to a checkpoint file after every batch; running the same command again resumes after the last loaded batch.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='The file to import.')
+        parser.add_argument('--format', choices=imports.FORMATS, help='Default: from the file extension (.csv, .json, .ndjson / .jsonl).')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows validated and loaded (in one transaction) at a time.')
+        parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help='Validation processes; 0 validates in this process.')
+        parser.add_argument('--checkpoint', help='Checkpoint file. Default: <path>.checkpoint.json')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint and start from the first row.')
+        parser.add_argument('--errors', help='Write the rejected rows (row number and errors) to this file, one JSON object per line.')
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        if not os.path.isfile(path):
+            raise CommandError(f'No such file: {path}')
+        format = options['format'] or imports.file_format(path)
+        if format not in imports.FORMATS:
+            raise CommandError(f"Can't tell the format of {path} - pass --format ({', '.join(imports.FORMATS)}).")
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        checkpoint_path = options['checkpoint'] or f'{path}.checkpoint.json'
+        checkpoint = self._load_checkpoint(checkpoint_path, path, options['restart'])
+        if checkpoint['done']:
+            self.stdout.write(f"{path} was imported already ({checkpoint['rows']} rows) - pass --restart to import it again.")
+            return
+        if checkpoint['rows']:
+            self.stdout.write(f"Resuming after row {checkpoint['rows']}.")
+
+        rows = islice(enumerate(imports.read_rows(path, format), 1), checkpoint['rows'], None)
+        batches = iter(lambda: list(islice(rows, options['batch_size'])), [])
+        errors_file = open(options['errors'], 'a' if checkpoint['rows'] else 'w') if options['errors'] else None
+        totals = {'rows': 0, 'created': 0, 'invalid': 0, 'collections_created': 0, 'promotions_created': 0}
+        shown_errors = 0
+        began = perf_counter()
+        load_time = 0.0
+        try:
+            for results in self._validated(batches, options['workers']):
+                loading = perf_counter()
+                valid = [(number, data) for number, data, errors in results if errors is None]
+                rejected = [{'row': number, 'errors': errors} for number, data, errors in results if errors is not None]
+                loaded = imports.load_batch(valid) if valid else {'created': 0, 'collections_created': 0, 'promotions_created': 0, 'errors': []}
+                load_time += perf_counter() - loading
+                rejected = sorted(rejected + loaded['errors'], key=lambda error: error['row'])
+
+                checkpoint['rows'] = results[-1][0]
+                for name in ('created', 'collections_created', 'promotions_created'):
+                    checkpoint[name] += loaded[name]
+                    totals[name] += loaded[name]
+                checkpoint['invalid'] += len(rejected)
+                totals['rows'] += len(results)
+                totals['invalid'] += len(rejected)
+                self._save_checkpoint(checkpoint_path, checkpoint)
+
+                for error in rejected:
+                    if errors_file:
+                        errors_file.write(json.dumps(error) + '\n')
+                    if shown_errors < MAX_ERRORS_SHOWN:
+                        self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
+                        shown_errors += 1
+                elapsed = perf_counter() - began
+                self.stdout.write(
+                    f"{checkpoint['rows']} rows: {totals['created']} created, {totals['invalid']} rejected - {totals['rows'] / elapsed:,.0f} rows/s"
+                )
+        finally:
+            if errors_file:
+                errors_file.close()
+
+        checkpoint['done'] = True
+        self._save_checkpoint(checkpoint_path, checkpoint)
+        elapsed = perf_counter() - began
+        rate = totals['rows'] / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {totals['created']} products from {totals['rows']} rows in {elapsed:.1f}s ({rate:,.0f} rows/s, {load_time:.1f}s of it loading); "
+            f"{totals['invalid']} rows rejected, {totals['collections_created']} collections and {totals['promotions_created']} promotions created."
+        ))
+        if totals['invalid'] > shown_errors and not errors_file:
+            self.stdout.write(f"Only the first {shown_errors} rejected rows were shown - pass --errors to write all of them to a file.")
+
+    def _validated(self, batches, workers):
+        """
+        - The validated batches in file order. With workers, up to two batches per worker are validated ahead while the current one is loaded.
+        """
+        if workers < 1:
+            for batch in batches:
+                yield imports.validate_rows(batch)
+            return
+        # The workers are forked from this process - don't hand them an open database connection (one inside a transaction has to stay open)
+        for connection in connections.all(initialized_only=True):
+            if not connection.in_atomic_block:
+                connection.close()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            pending = deque()
+            for batch in batches:
+                pending.append(executor.submit(imports.validate_rows, batch))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def _load_checkpoint(self, checkpoint_path, path, restart):
+        stat = os.stat(path)
+        fresh = {
+            'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime,
+            'rows': 0, 'created': 0, 'invalid': 0, 'collections_created': 0, 'promotions_created': 0, 'done': False,
+        }
+        if restart or not os.path.exists(checkpoint_path):
+            return fresh
+        with open(checkpoint_path) as file:
+            checkpoint = json.load(file)
+        if (checkpoint.get('path'), checkpoint.get('size'), checkpoint.get('mtime')) != (path, stat.st_size, stat.st_mtime):
+            raise CommandError(f'{checkpoint_path} belongs to another file, or the file changed since - pass --restart to start over.')
+        return {**fresh, **checkpoint}
+
+    def _save_checkpoint(self, checkpoint_path, checkpoint):
+        # Written next to the old one and renamed over it, so an interrupted write never leaves half a checkpoint
+        temporary = f'{checkpoint_path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(checkpoint, file, indent=2)
+        os.replace(temporary, checkpoint_path)
+
+
+def _init_worker():
+    # Only needed where workers are spawned rather than forked (macOS, Windows) - a forked worker has Django set up already
+    django.setup()
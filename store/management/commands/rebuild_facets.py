@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from store import facets
+from store.cache import bump_version
+
+
+class Command(BaseCommand):
+    help = 'Recompute the FacetCount table from products, promotions and tags.'
+
+    def handle(self, *args, **options):
+        rows = facets.rebuild()
+        # The facet counts are part of the cached product list responses
+        bump_version('product')
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} facet counts.'))
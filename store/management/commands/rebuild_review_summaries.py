@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from store.cache import bump_version
+from store.models import ReviewSummary
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the ReviewSummary table (review count and latest review date per product) from the review table.'
+
+    def handle(self, *args, **options):
+        ReviewSummary.rebuild()
+        bump_version('review')
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the review summaries of {ReviewSummary.objects.count()} products.'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from store.cache import bump_version
+from store.models import Collection, Product
+
+
+class Command(BaseCommand):
+    help = 'Recompute Collection.products_count from the product table and fix any collection that has drifted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report drift, do not write.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # Lock the counters so concurrent product writes queue behind the reconciliation
+            stored = dict(Collection.objects.select_for_update().values_list('id', 'products_count'))
+            actual = dict(
+                Product.objects.order_by().values('collection').annotate(count=Count('id')).values_list('collection', 'count')
+            )
+
+            drifted = []
+            for collection_id, count in stored.items():
+                expected = actual.get(collection_id, 0)
+                if count != expected:
+                    drifted.append(Collection(id=collection_id, products_count=expected))
+                    self.stdout.write(f'Collection {collection_id}: stored {count}, actual {expected}')
+
+            if drifted and not options['dry_run']:
+                Collection.objects.bulk_update(drifted, ['products_count'], batch_size=1000)
+
+        if drifted and not options['dry_run']:
+            # bulk_update() sends no signals - cached collection responses still show the drifted counts
+            bump_version('collection')
+
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {len(drifted)} of {len(stored)} collections with a drifted products_count.'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from store.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored total and item count of every order from its order items.'
+
+    def handle(self, *args, **options):
+        Order.refresh_totals()
+        self.stdout.write(self.style.SUCCESS(f'Refreshed the totals of {Order.objects.count()} orders.'))
@@ -0,0 +1,27 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from store.carts import sweep_expired_carts
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned carts older than --days, in small chunks in creation order. Safe to schedule (cron, Celery beat, ...).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, help='Maximum cart age in days (default: settings.STORE_CART_MAX_AGE, or 30).')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0.1, help='Seconds to pause between chunks.')
+        parser.add_argument('--dry-run', action='store_true', help='Count what would be deleted without deleting.')
+
+    def handle(self, *args, **options):
+        max_age = timedelta(days=options['days']) if options['days'] is not None else None
+        total_carts = total_items = 0
+        total_seconds = 0.0
+
+        for report in sweep_expired_carts(max_age, options['chunk_size'], options['sleep'], options['dry_run']):
+            total_carts += report['carts']
+            total_items += report['items']
+            total_seconds += report['seconds']
+            self.stdout.write(f"Chunk {report['chunk']}: {report['carts']} carts, {report['items']} items in {report['seconds']:.3f}s")
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {total_carts} carts and {total_items} items in {total_seconds:.3f}s.'))
@@ -0,0 +1,183 @@
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Request Metrics Middleware Here...
+"""
+- For every request, records the number of SQL queries, the time spent in the database (via connection.execute_wrapper), the time spent serializing the response body (DRF rendering), and the total time, under the URL name of the view.
+
+- Records go to a per-process ring buffer (the last STORE_METRICS_BUFFER_SIZE requests, 5000 by default) that the staff-only stats endpoint summarises.
+
+- With STORE_SERVER_TIMING = True (the default when DEBUG is on) every response carries a Server-Timing header, so the numbers show up in the browser's network panel.
+
+- The middleware is sync and async capable. Under ASGI an async view's queries run in worker threads, on connections the middleware can't wrap from the event loop - there the timer travels with the request's context instead, and every connection counts its queries into the timer of whichever request runs them.
+
+- STORE_QUERY_BUDGETS = {'<url name>': <max queries>} sets per-view query budgets for GET requests; with STORE_ENFORCE_QUERY_BUDGETS = True a request that goes over its budget raises QueryBudgetExceeded. The test suite turns enforcement on, so an N+1 regression fails the tests.
+"""
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class MetricsBuffer:
+    def __init__(self, size):
+        self._records = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def append(self, record):
+        with self._lock:
+            self._records.append(record)
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def summary(self):
+        by_view = {}
+        for record in self.records():
+            by_view.setdefault(record['view'], []).append(record)
+
+        summary = {}
+        for view, records in sorted(by_view.items()):
+            totals = sorted(record['total_ms'] for record in records)
+            summary[view] = {
+                'requests': len(records),
+                'queries_avg': round(sum(record['queries'] for record in records) / len(records), 2),
+                'queries_max': max(record['queries'] for record in records),
+                'db_ms_avg': round(sum(record['db_ms'] for record in records) / len(records), 3),
+                'serialize_ms_avg': round(sum(record['serialize_ms'] for record in records) / len(records), 3),
+                'total_ms_p50': round(_percentile(totals, 50), 3),
+                'total_ms_p95': round(_percentile(totals, 95), 3),
+                'total_ms_p99': round(_percentile(totals, 99), 3),
+            }
+        return summary
+
+
+def _percentile(ordered, percent):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+metrics = MetricsBuffer(getattr(settings, 'STORE_METRICS_BUFFER_SIZE', 5000))
+
+
+class _QueryTimer:
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+# The timer of the async request being served - asgiref copies it into the threads that run the request's queries
+_request_timer = ContextVar('request_timer', default=None)
+
+
+def _time_for_request(execute, sql, params, many, context):
+    timer = _request_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_request_timer(sender, connection, **kwargs):
+    if _time_for_request not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_for_request)
+
+
+def add_serialize_time(request, seconds):
+    # For code that renders a response itself, before the middleware sees it (e.g. store.cache.cached_response)
+    request._serialize_seconds = getattr(request, '_serialize_seconds', 0.0) + seconds
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = _QueryTimer()
+        request._serialize_seconds = 0.0
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            # Every database the request may read from - the primary and any read replicas (store/db/replicas.py)
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(timer))
+            response = self.get_response(request)
+        return self.record(request, response, timer, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        timer = _QueryTimer()
+        request._serialize_seconds = 0.0
+        start = time.perf_counter()
+        token = _request_timer.set(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_timer.reset(token)
+        return self.record(request, response, timer, time.perf_counter() - start)
+
+    def record(self, request, response, timer, total):
+        # Streamed bodies are produced after this point - their queries and time aren't in the record
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match and match.view_name else 'unresolved'
+        record = {
+            'view': view,
+            'method': request.method,
+            'status': response.status_code,
+            'queries': timer.queries,
+            'db_ms': timer.seconds * 1000,
+            'serialize_ms': request._serialize_seconds * 1000,
+            'total_ms': total * 1000,
+        }
+        metrics.append(record)
+
+        if getattr(settings, 'STORE_SERVER_TIMING', settings.DEBUG):
+            response['Server-Timing'] = (
+                f'db;dur={record["db_ms"]:.2f};desc="{timer.queries} queries", '
+                f'serialize;dur={record["serialize_ms"]:.2f}, '
+                f'total;dur={record["total_ms"]:.2f}'
+            )
+
+        budget = getattr(settings, 'STORE_QUERY_BUDGETS', {}).get(view) if request.method in ('GET', 'HEAD') else None
+        if budget is not None and timer.queries > budget and getattr(settings, 'STORE_ENFORCE_QUERY_BUDGETS', False):
+            raise QueryBudgetExceeded(f'{request.method} {request.path} ({view}) ran {timer.queries} queries, budget is {budget}')
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook returns - time that rendering through a post-render callback
+        if response.is_rendered:
+            return response
+        start = time.perf_counter()
+
+        def finished(rendered):
+            request._serialize_seconds = time.perf_counter() - start
+        response.add_post_render_callback(finished)
+        return response
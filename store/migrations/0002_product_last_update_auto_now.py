@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='last_update',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:22
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+PRICE_BANDS = [(0, 10, '0-10'), (10, 50, '10-50'), (50, 100, '50-100'), (100, None, '100+')]
+INVENTORY_BANDS = [(None, 1, 'out'), (1, 10, 'low'), (10, None, 'ok')]
+
+
+def band_for(value, bands):
+    for low, high, name in bands:
+        if (low is None or value >= low) and (high is None or value < high):
+            return name
+
+
+def populate_facets(apps, schema_editor):
+    # Same counts as store.facets.rebuild(), written against the historical models
+    FacetCount = apps.get_model('store', 'FacetCount')
+    Product = apps.get_model('store', 'Product')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    TaggedItem = apps.get_model('tags', 'TaggedItem')
+
+    counts = {}
+    for collection_id, unit_price, inventory in Product.objects.values_list('collection_id', 'unit_price', 'inventory').iterator():
+        for facet in [('collection', str(collection_id)), ('price', band_for(unit_price, PRICE_BANDS)), ('inventory', band_for(inventory, INVENTORY_BANDS))]:
+            counts[facet] = counts.get(facet, 0) + 1
+    for promotion_id, count in Product.promotions.through.objects.values('promotion_id').annotate(count=Count('id')).values_list('promotion_id', 'count'):
+        counts[('promotion', str(promotion_id))] = count
+    content_type = ContentType.objects.filter(app_label='store', model='product').first()
+    if content_type is not None:
+        tagged = TaggedItem.objects.filter(content_type=content_type, object_id__in=Product.objects.values('id'))
+        for tag_id, count in tagged.values('tag_id').annotate(count=Count('id')).values_list('tag_id', 'count'):
+            counts[('tag', str(tag_id))] = count
+
+    FacetCount.objects.bulk_create(
+        [FacetCount(dimension=dimension, value=value, count=count) for (dimension, value), count in counts.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_collection_products_count'),
+        ('tags', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(max_length=32)),
+                ('value', models.CharField(max_length=64)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('dimension', 'value')},
+            },
+        ),
+        migrations.RunPython(populate_facets, migrations.RunPython.noop),
+    ]
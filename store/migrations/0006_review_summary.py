@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:42
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+import django.db.models.deletion
+
+
+def populate_review_summaries(apps, schema_editor):
+    # Same rows as ReviewSummary.rebuild(), written against the historical models
+    Review = apps.get_model('store', 'Review')
+    ReviewSummary = apps.get_model('store', 'ReviewSummary')
+    rows = Review.objects.order_by().values('product_id').annotate(count=Count('id'), latest=Max('date'))
+    ReviewSummary.objects.bulk_create(
+        [ReviewSummary(product_id=row['product_id'], reviews_count=row['count'], last_review_date=row['latest']) for row in rows.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_cart_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewSummary',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='review_summary', serialize=False, to='store.product')),
+                ('reviews_count', models.PositiveIntegerField(default=0)),
+                ('last_review_date', models.DateField(null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'date', 'id'], name='store_revie_product_9c1f89_idx'),
+        ),
+        migrations.RunPython(populate_review_summaries, migrations.RunPython.noop),
+    ]
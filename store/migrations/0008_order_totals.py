@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:01
+
+from django.db import migrations, models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_order_totals(apps, schema_editor):
+    # Same UPDATE as Order.refresh_totals(), written against the historical models
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    money = DecimalField(max_digits=12, decimal_places=2)
+    items = OrderItem.objects.filter(order_id=OuterRef('pk')).order_by().values('order_id')
+    Order.objects.update(
+        total=Coalesce(Subquery(items.annotate(total=Sum(F('quantity') * F('unit_price'), output_field=money)).values('total')), Value(0), output_field=money),
+        items_count=Coalesce(Subquery(items.annotate(count=Sum('quantity')).values('count')), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_adminjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'placed_at', 'id'], name='store_order_custome_c64870_idx'),
+        ),
+        migrations.RunPython(populate_order_totals, migrations.RunPython.noop),
+    ]
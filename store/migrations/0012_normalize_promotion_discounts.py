@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def normalize_discounts(apps, schema_editor):
+    # Discounts used to be entered as percentages too (15 for 15%) - those become rates. What is still out of 0..1 after that (negative, above 100) can't be read either way and is set to no discount
+    Promotion = apps.get_model('store', 'Promotion')
+    for promotion in Promotion.objects.filter(discount__gt=1, discount__lte=100):
+        promotion.discount = promotion.discount / 100
+        promotion.save(update_fields=['discount'])
+    Promotion.objects.filter(discount__lt=0).update(discount=0)
+    Promotion.objects.filter(discount__gt=1).update(discount=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_adminjob_heartbeat'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_discounts, migrations.RunPython.noop),
+    ]
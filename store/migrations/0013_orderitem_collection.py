@@ -0,0 +1,27 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def snapshot_collections(apps, schema_editor):
+    # Existing items weren't snapshotted - the product's collection now is the best there is, and what the rollups were built from so far
+    OrderItem = apps.get_model('store', 'OrderItem')
+    Product = apps.get_model('store', 'Product')
+    OrderItem.objects.filter(collection=None).update(
+        collection_id=models.Subquery(Product.objects.filter(id=models.OuterRef('product_id')).values('collection_id')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_normalize_promotion_discounts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='collection',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='store.collection'),
+        ),
+        migrations.RunPython(snapshot_collections, migrations.RunPython.noop),
+    ]
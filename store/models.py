@@ -1,23 +1,105 @@
-from django.db import models
-from django.core.validators import MinValueValidator
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, DecimalField, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.conf import settings
 from uuid import uuid4
 
 # Promotion Model Here...
 class Promotion(models.Model):
     description = models.CharField(max_length=255)
-    discount = models.FloatField()
+    # A rate - 0.15 takes 15% off
+    discount = models.FloatField(validators=[MinValueValidator(0), MaxValueValidator(1)])
+
+# Facet Count Model Here...
+class FacetCount(models.Model):
+    # Precomputed number of products per filter value, e.g. ('collection', '3') or ('price', '10-50') - maintained by store/facets.py
+    dimension = models.CharField(max_length=32)
+    value = models.CharField(max_length=64)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [['dimension', 'value']]
 
 # Collection Model Here...
 class Collection(models.Model):
     title = models.CharField(max_length=255)
     featured_product = models.ForeignKey('Product', on_delete=models.SET_NULL, null=True, related_name='+')
+    # Denormalized count of products, kept current by Product.save() and the post_delete signal (reconcile with: manage.py reconcile_products_count)
+    products_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self) -> str:
         return self.title
+
+    @classmethod
+    def adjust_products_count(cls, deltas):
+        # deltas: {collection_id: change} - one UPDATE per distinct change, never a read-modify-write
+        by_delta = {}
+        for collection_id, delta in deltas.items():
+            if delta:
+                by_delta.setdefault(delta, []).append(collection_id)
+        for delta, ids in by_delta.items():
+            cls.objects.filter(id__in=ids).update(products_count=F('products_count') + delta)
     
     class Meta:
         ordering = ['title']
 
+# Product QuerySet Here...
+class ProductQuerySet(models.QuerySet):
+    """
+    - with_tags() and with_like_counts() put tags (a list of labels) and likes_count on every product of the result, with one extra query each for the whole result instead of one per product. They work on model instances and on .values() rows.
+
+    - They are applied when the queryset is evaluated (list(), slicing, iteration, async for) - .iterator() skips them, use TaggedItem.objects.for_objects() per chunk there.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._attach_tags = False
+        self._attach_like_counts = False
+
+    def with_tags(self):
+        clone = self._chain()
+        clone._attach_tags = True
+        return clone
+
+    def with_like_counts(self):
+        clone = self._chain()
+        clone._attach_like_counts = True
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._attach_tags = self._attach_tags
+        clone._attach_like_counts = self._attach_like_counts
+        return clone
+
+    def _fetch_all(self):
+        fetched = self._result_cache is None
+        super()._fetch_all()
+        if fetched and (self._attach_tags or self._attach_like_counts):
+            self._attach_generic(self._result_cache)
+
+    def _attach_generic(self, rows):
+        from likes.counters import like_counts
+        from tags.models import TaggedItem
+
+        ids = [row.get('id') if isinstance(row, dict) else row.pk for row in rows if isinstance(row, (dict, models.Model))]
+        ids = [pk for pk in ids if pk is not None]
+        if not ids:
+            return
+        tags = TaggedItem.objects.for_objects(ids, model=self.model).labels_by_object() if self._attach_tags else None
+        likes = like_counts(self.model, ids) if self._attach_like_counts else None
+        for row in rows:
+            if isinstance(row, dict):
+                if tags is not None:
+                    row['tags'] = tags.get(row.get('id'), [])
+                if likes is not None:
+                    row['likes_count'] = likes.get(row.get('id'), 0)
+            elif isinstance(row, models.Model):
+                if tags is not None:
+                    row.tags = tags.get(row.pk, [])
+                if likes is not None:
+                    row.likes_count = likes.get(row.pk, 0)
+
 # Product Model Here...
 class Product(models.Model):
     title = models.CharField(max_length=255)
@@ -25,12 +107,44 @@ class Product(models.Model):
     description = models.TextField(null=True, blank=True)
     unit_price = models.DecimalField(max_digits=6, decimal_places=2, validators=[MinValueValidator(1, message="Value cannot be less than 1")])
     inventory = models.IntegerField()
-    last_update = models.DateTimeField(auto_now_add=True)
+    last_update = models.DateTimeField(auto_now=True)
     collection = models.ForeignKey(Collection, on_delete=models.PROTECT, related_name='products')
     promotions = models.ManyToManyField(Promotion, blank=True)
 
+    objects = ProductQuerySet.as_manager()
+
+    TRACKED_FIELDS = ('collection_id', 'unit_price', 'inventory')
+    # The fields that go into the product's search document (store/search.py)
+    SEARCH_FIELDS = ('title', 'description', 'collection_id')
+
     def __str__(self) -> str:
         return self.title
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the values we were loaded with, so save() and the facet signals can tell what changed
+        instance._loaded_values = {name: instance.__dict__.get(name) for name in cls.TRACKED_FIELDS}
+        # Deferred fields are left out - they count as changed
+        instance._loaded_search = {name: instance.__dict__[name] for name in cls.SEARCH_FIELDS if name in instance.__dict__}
+        return instance
+
+    def search_fields_changed(self):
+        loaded = getattr(self, '_loaded_search', None)
+        return loaded is None or any(name not in loaded or loaded[name] != getattr(self, name) for name in self.SEARCH_FIELDS)
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        previous = getattr(self, '_loaded_values', {}).get('collection_id')
+        # The product row and the collection counters are written in the same transaction
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            if adding:
+                Collection.adjust_products_count({self.collection_id: 1})
+            elif previous is not None and previous != self.collection_id:
+                Collection.adjust_products_count({previous: -1, self.collection_id: 1})
+        self._loaded_values = {name: getattr(self, name) for name in self.TRACKED_FIELDS}
+        self._loaded_search = {name: getattr(self, name) for name in self.SEARCH_FIELDS}
     
     class Meta:
         ordering = ['title']
@@ -75,6 +189,33 @@ class Order(models.Model):
     placed_at = models.DateTimeField(auto_now_add=True)
     payment_status = models.CharField(max_length=1, choices=PAYMENT_STATUS_CHOICES, default=PAYMENT_STATUS_PENDING)
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT)
+    # Sum of quantity x unit_price and of quantity over the order's items - written by checkout, kept current by the OrderItem signals
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    items_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Serves a customer's order history, newest first by (placed_at, id)
+        indexes = [models.Index(fields=['customer', 'placed_at', 'id'])]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The sales rollups follow changes of these two - remember what the order was loaded with
+        instance._loaded_values = {name: instance.__dict__.get(name) for name in ('payment_status', 'placed_at')}
+        return instance
+
+    @classmethod
+    def refresh_totals(cls, order_ids=None):
+        """
+        - Recomputes total and items_count of the given orders (all of them when order_ids is None) from their items, with one UPDATE. Writes that skip the OrderItem signals (queryset.update(), bulk_create()) must call it themselves.
+        """
+        orders = cls.objects.all() if order_ids is None else cls.objects.filter(id__in=list(order_ids))
+        items = OrderItem.objects.filter(order_id=OuterRef('pk')).order_by().values('order_id')
+        money = DecimalField(max_digits=12, decimal_places=2)
+        orders.update(
+            total=Coalesce(Subquery(items.annotate(total=Sum(F('quantity') * F('unit_price'), output_field=money)).values('total')), Value(0), output_field=money),
+            items_count=Coalesce(Subquery(items.annotate(count=Sum('quantity')).values('count')), Value(0)),
+        )
 
 # Order Item Model Here...
 class OrderItem(models.Model):
@@ -82,6 +223,23 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name="orderitems")
     quantity = models.PositiveSmallIntegerField()
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
+    # The product's collection when it was ordered, snapshotted like unit_price - the collection sales rollups count the item there, wherever the product moves later
+    collection = models.ForeignKey(Collection, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # An item moved to another order changes the totals of both - remember where it came from
+        instance._loaded_order_id = instance.__dict__.get('order_id')
+        instance._loaded_product_id = instance.__dict__.get('product_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Items written one by one (the admin's OrderItemInline) take the collection of their product; bulk_create() callers set it themselves
+        if self.product_id is not None and (self.collection_id is None or self.product_id != getattr(self, '_loaded_product_id', self.product_id)):
+            self.collection_id = Product.objects.filter(id=self.product_id).values_list('collection_id', flat=True).first()
+        super().save(*args, **kwargs)
+        self._loaded_product_id = self.product_id
 
 # Address Model Here...
 class Address(models.Model):
@@ -92,7 +250,7 @@ class Address(models.Model):
 # Cart Model Here...
 class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
 # Cart Item Model Here...
 class CartItem(models.Model):
@@ -109,4 +267,118 @@ class Review(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
     name = models.CharField(max_length=255)
     description = models.TextField()
-    date = models.DateField(auto_now_add=True)
\ No newline at end of file
+    date = models.DateField(auto_now_add=True)
+
+    class Meta:
+        # Serves the per-product review pages, newest first by (date, id)
+        indexes = [models.Index(fields=['product', 'date', 'id'])]
+
+# Review Summary Model Here...
+class ReviewSummary(models.Model):
+    """
+    - One row per reviewed product with its number of reviews and the date of the latest one, kept current by the Review post_save/post_delete signals - the product list reads it with a one-to-one join instead of a COUNT ... GROUP BY over reviews.
+
+    - It is a table of its own rather than columns on Product, so posting a review never locks the product row that checkouts lock. Rebuild it with: manage.py rebuild_review_summaries
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='review_summary')
+    reviews_count = models.PositiveIntegerField(default=0)
+    last_review_date = models.DateField(null=True)
+
+    @classmethod
+    def review_added(cls, product_id, date):
+        updated = cls.objects.filter(product_id=product_id).update(
+            reviews_count=F('reviews_count') + 1,
+            last_review_date=Greatest(Coalesce('last_review_date', Value(date, output_field=models.DateField())), Value(date, output_field=models.DateField())),
+        )
+        if updated:
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(product_id=product_id, reviews_count=1, last_review_date=date)
+        except IntegrityError:
+            # A concurrent first review created the row between our UPDATE and INSERT
+            cls.review_added(product_id, date)
+
+    @classmethod
+    def review_removed(cls, product_id):
+        latest = Review.objects.filter(product_id=OuterRef('product_id')).order_by('-date').values('date')[:1]
+        cls.objects.filter(product_id=product_id, reviews_count__gt=0).update(
+            reviews_count=F('reviews_count') - 1,
+            last_review_date=Subquery(latest),
+        )
+
+    @classmethod
+    def rebuild(cls):
+        with transaction.atomic():
+            cls.objects.all().delete()
+            rows = Review.objects.order_by().values('product_id').annotate(count=Count('id'), latest=Max('date'))
+            cls.objects.bulk_create(
+                [cls(product_id=row['product_id'], reviews_count=row['count'], last_review_date=row['latest']) for row in rows.iterator()],
+                batch_size=1000,
+            )
+
+# Admin Job Model Here...
+class AdminJob(models.Model):
+    # A bulk admin action running in the background - store/jobs.py walks the selection in primary key chunks and records the progress here
+    STATUS_QUEUED = 'Q'
+    STATUS_RUNNING = 'R'
+    STATUS_DONE = 'D'
+    STATUS_FAILED = 'F'
+
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    description = models.CharField(max_length=255)
+    handler = models.CharField(max_length=255)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    total = models.PositiveIntegerField(null=True)
+    processed = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    # Written after every chunk - a queued or running job without one for long lost its worker (see store/jobs.py)
+    heartbeat_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+
+    def __str__(self) -> str:
+        return self.description
+
+    class Meta:
+        ordering = ['-id']
+
+
+# Sales Rollup Models Here...
+class DailyProductSales(models.Model):
+    """
+    - Sales of one product on one day (the local date of Order.placed_at), counting PAYMENT_STATUS_COMPLETE orders only: units sold, revenue (quantity x the unit price the items were sold at) and the number of orders it was in. Maintained by store/analytics.py.
+    """
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    orders_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [['day', 'product']]
+        # Date-range reports for one product
+        indexes = [models.Index(fields=['product', 'day'])]
+
+class DailyCollectionSales(models.Model):
+    """
+    - The same per collection (the collection the product was in when it was ordered - OrderItem.collection); orders_count is the number of orders with at least one product of the collection.
+    """
+    day = models.DateField()
+    collection = models.ForeignKey(Collection, on_delete=models.CASCADE, related_name='+')
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    orders_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [['day', 'collection']]
+        indexes = [models.Index(fields=['collection', 'day'])]
@@ -0,0 +1,114 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime
+from functools import reduce
+from operator import or_
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+# Keyset Pagination Here...
+class KeysetPagination:
+    """
+    - Keyset (cursor) pagination: instead of OFFSET, every page starts strictly after the last row of the previous page, using a WHERE on the ordering columns. The database walks the index from that position, so page 1 and page 10,000 cost the same.
+
+    - The cursor is an opaque urlsafe base64 string holding the ordering values of the last row on the page. The ordering must end in a unique column (id) so no two rows share a position.
+
+    - Prefix a field with '-' for descending order, e.g. ordering = ('-placed_at', '-id').
+    """
+    ordering = ('title', 'id')
+    cursor_query_param = 'cursor'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering=None):
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def encode_cursor(self, values):
+        payload = json.dumps([self._to_json(value) for value in values], separators=(',', ':'))
+        return urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def clean_cursor(self, model, values):
+        # A well-formed cursor can still hold values of the wrong type (a string id, a list for a title) - convert them like the model fields would, so a bad one is a 404 rather than an error while the query is built
+        cleaned = []
+        for name, value in zip(self._field_names(), values):
+            if value is None or isinstance(value, (list, dict)):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                cleaned.append(model._meta.get_field(name).to_python(value))
+            except (DjangoValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        return cleaned
+
+    def _to_json(self, value):
+        if isinstance(value, (date, datetime)):
+            return value.isoformat()
+        return value
+
+    def _field_names(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def keyset_filter(self, values):
+        # (a > x) OR (a = x AND b > y) OR ... - one branch per ordering column
+        branches = []
+        for position, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            lookup = '__lt' if field.startswith('-') else '__gt'
+            equal = {prefix.lstrip('-'): value for prefix, value in zip(self.ordering[:position], values)}
+            branches.append(Q(**equal, **{name + lookup: values[position]}))
+        return reduce(or_, branches)
+
+    def paginate_queryset(self, queryset, request):
+        self.request = request
+        self.limit = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.keyset_filter(self.clean_cursor(queryset.model, self.decode_cursor(cursor))))
+
+        # Fetch one extra row to know whether a next page exists without a COUNT(*)
+        rows = list(queryset[:self.limit + 1])
+        self.has_next = len(rows) > self.limit
+        self.page = rows[:self.limit]
+        return self.page
+
+    def get_position(self, row):
+        # Works for model instances and for .values() dicts alike
+        if isinstance(row, dict):
+            return [row[name] for name in self._field_names()]
+        return [getattr(row, name) for name in self._field_names()]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        cursor = self.encode_cursor(self.get_position(self.page[-1]))
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
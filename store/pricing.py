@@ -0,0 +1,156 @@
+import logging
+from collections import namedtuple
+from decimal import ROUND_HALF_UP, Decimal
+from functools import lru_cache
+from django.db.models import Max
+from .models import Product
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional - without it every batch goes through the Decimal path
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Pricing Here...
+"""
+- Every price the store shows or charges comes from here, for a whole batch of products at once:
+
+    discount        = unit_price x the product's best promotion discount, rounded to the cent
+    effective_price = unit_price - discount
+    tax             = effective_price x TAX_RATE, rounded to the cent
+    price_with_tax  = effective_price + tax
+
+- Promotions don't stack - a product in several promotions gets the largest discount. Discounts are applied with DISCOUNT_PLACES decimal places and must lie within 0..1 - Promotion.discount's validators keep other values out, migration 0012 converted the legacy percentages, and a promotion that gets in with one anyway is ignored with a logged warning. Rounding is ROUND_HALF_UP throughout.
+
+- The promotions of the whole batch are read with one query (best_discounts).
+
+- Two paths give the same amounts: quote()/quote_many() return Decimals, for money that gets stored or charged; quote_cents()/quote_floats() run the rules over NumPy int64 arrays in fixed point (cents, discounts in millionths) with integer-only rounding, for large read-only batches like list pages. NumPy is optional - without it the fixed-point path falls back to plain ints.
+"""
+
+TAX_RATE = Decimal('0.10')
+CENT = Decimal('0.01')
+DISCOUNT_PLACES = 6
+
+_DISCOUNT_SCALE = 10 ** DISCOUNT_PLACES
+_TAX_SCALE = 10 ** 4
+_TAX_UNITS = int(TAX_RATE * _TAX_SCALE)
+
+Price = namedtuple('Price', ['unit_price', 'discount', 'effective_price', 'tax', 'price_with_tax'])
+
+
+@lru_cache(maxsize=1024)
+def _discount_rate(discount):
+    # Promotion.discount is a float - read it through its shortest repr so 0.15 means 0.15, not 0.1499999...
+    rate = Decimal(repr(float(discount or 0))).quantize(Decimal(1).scaleb(-DISCOUNT_PLACES), rounding=ROUND_HALF_UP)
+    if not 0 <= rate <= 1:
+        # Bad data, not a price - clamping it would sell at full price or give the product away, raising would take every priced page down. Logged once per value (lru_cache)
+        logger.warning('Ignoring the discount %r - a discount must be between 0 and 1.', discount)
+        return Decimal(0)
+    return rate
+
+
+@lru_cache(maxsize=1024)
+def _discount_units(discount):
+    return int(_discount_rate(discount).scaleb(DISCOUNT_PLACES))
+
+
+def quote_decimal(unit_price, discount=0):
+    """
+    - The reference path: one product, Decimal arithmetic.
+    """
+    unit_price = Decimal(unit_price).quantize(CENT)
+    discount_amount = (unit_price * _discount_rate(discount)).quantize(CENT, rounding=ROUND_HALF_UP)
+    effective_price = unit_price - discount_amount
+    tax = (effective_price * TAX_RATE).quantize(CENT, rounding=ROUND_HALF_UP)
+    return Price(unit_price, discount_amount, effective_price, tax, effective_price + tax)
+
+
+def _round_div(numerator, scale):
+    # ROUND_HALF_UP of numerator / scale for non-negative integers - integer arithmetic only, so it works on ints and int64 arrays alike
+    return (numerator + scale // 2) // scale
+
+
+def quote_many(unit_prices, discounts):
+    """
+    - [Price] for parallel lists of unit prices and discount rates, in Decimals - for money that is stored or charged (carts, orders).
+    """
+    return [quote_decimal(unit_price, discount) for unit_price, discount in zip(unit_prices, discounts)]
+
+
+def quote_cents(unit_prices, discounts):
+    """
+    - The same prices as quote_many(), as whole cents in columns: (unit, discount, effective, tax, with_tax). With NumPy these are int64 arrays and the rules run once over the whole batch; without it, lists of ints computed with the same integer formulas.
+
+    - Meant for large read-only batches (list pages, exports), where building five Decimals per product would cost more than the arithmetic itself.
+    """
+    rates = [_discount_units(discount) for discount in discounts]
+    if np is None:
+        cents = [int(Decimal(unit_price).quantize(CENT).scaleb(2)) for unit_price in unit_prices]
+        discount_cents = [_round_div(amount * rate, _DISCOUNT_SCALE) for amount, rate in zip(cents, rates)]
+        effective_cents = [amount - discount for amount, discount in zip(cents, discount_cents)]
+        tax_cents = [_round_div(amount * _TAX_UNITS, _TAX_SCALE) for amount in effective_cents]
+        return cents, discount_cents, effective_cents, tax_cents, [amount + tax for amount, tax in zip(effective_cents, tax_cents)]
+
+    # Unit prices have two decimal places and at most 6 digits, so price * 100 as a double rounds back to the exact cent count
+    cents = np.rint(np.array(unit_prices, dtype=np.float64) * 100).astype(np.int64)
+    # cents < 10**6 and rates <= 10**6, so every product stays far inside int64
+    discount_cents = _round_div(cents * np.array(rates, dtype=np.int64), _DISCOUNT_SCALE)
+    effective_cents = cents - discount_cents
+    tax_cents = _round_div(effective_cents * _TAX_UNITS, _TAX_SCALE)
+    return cents, discount_cents, effective_cents, tax_cents, effective_cents + tax_cents
+
+
+def quote_floats(unit_prices, discounts):
+    """
+    - quote_cents() divided by 100, as rows of (discount, effective_price, tax, price_with_tax) floats. cents / 100 is the double closest to the Decimal amount, so it renders to exactly the JSON that float(Decimal) from the Decimal path does.
+    """
+    cents, discount, effective, tax, with_tax = quote_cents(unit_prices, discounts)
+    if np is not None:
+        return list(zip(*((column / 100).tolist() for column in (discount, effective, tax, with_tax))))
+    return list(zip(*([amount / 100 for amount in column] for column in (discount, effective, tax, with_tax))))
+
+
+def _best_discounts_queryset(product_ids):
+    # A promotion with a discount outside 0..1 is left out, so it can't shadow a valid one of the same product
+    return (
+        Product.promotions.through.objects.filter(product_id__in=product_ids, promotion__discount__gte=0, promotion__discount__lte=1)
+        .values('product_id').annotate(discount=Max('promotion__discount'))
+        .values_list('product_id', 'discount')
+    )
+
+
+def best_discounts(product_ids):
+    """
+    - {product_id: largest promotion discount} for the products that have a promotion - one query for the whole batch.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return {}
+    return dict(_best_discounts_queryset(product_ids))
+
+
+async def abest_discounts(product_ids):
+    """
+    - best_discounts() for async views, through the async ORM.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return {}
+    return {product_id: discount async for product_id, discount in _best_discounts_queryset(product_ids)}
+
+
+def quote(products):
+    """
+    - {product_id: Price} for (product_id, unit_price) pairs, model instances or .values() rows with 'id' and 'unit_price'. Loads the promotions of all of them with one query.
+    """
+    pairs = []
+    for product in products:
+        if isinstance(product, dict):
+            pairs.append((product['id'], product['unit_price']))
+        elif isinstance(product, Product):
+            pairs.append((product.id, product.unit_price))
+        else:
+            pairs.append(tuple(product))
+    discounts = best_discounts(product_id for product_id, unit_price in pairs)
+    return {product_id: quote_decimal(unit_price, discounts.get(product_id, 0)) for product_id, unit_price in pairs}
@@ -0,0 +1,227 @@
+import heapq
+import math
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from .cache import bump_version, get_backend
+from .models import Product
+from tags.models import TaggedItem
+
+# Product Search Index Here...
+"""
+- An in-process inverted index over Product.title, Product.description, the collection title and the product's tag labels, ranked with BM25.
+
+- Every term maps to a posting list {product_id: weighted term frequency}. Fields are weighted by repeating their terms (a title word counts 3 times, a tag 2 times), which is the usual cheap stand-in for BM25F.
+
+- Each query word matches the term itself and, through a sorted term list, every term it is a prefix of ("lap" finds "laptop"); prefix hits score a little lower than exact ones.
+
+- The index is built on the first search and then kept current by the signals in store/signals.py. It lives in one process, so every worker builds its own, and the signals only reach the index of the process that made the write. The other workers notice through a version counter of its own in the response cache's backend (store/cache.py), 'search': every write to a searchable field - a product's title, description or collection, a collection title, a tag or tagging - goes through reindex_on_commit(), which bumps it. The index remembers the version it was built at, and a search that finds it moved rebuilds first. Writes that don't touch the documents (checkouts, price and inventory changes) leave the index alone. With the default per-process LRUBackend the versions aren't shared, so the index is also rebuilt once it is older than STORE_SEARCH_INDEX_MAX_AGE seconds (300 by default) - the same bound the cached responses have.
+
+- Writes that skip signals (bulk_create, queryset.update) call reindex_on_commit() themselves - with the product ids, or without them when the ids aren't known (MySQL's bulk_create), which rebuilds on the next search.
+"""
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+# The version counter of the search documents
+SEARCH_VERSION = 'search'
+FIELD_WEIGHTS = {'title': 3, 'tags': 2, 'collection': 1, 'description': 1}
+K1 = 1.2
+B = 0.75
+PREFIX_PENALTY = 0.8
+MAX_PREFIX_EXPANSIONS = 50
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+class ProductSearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._postings = {}
+        self._terms = []
+        self._doc_terms = {}
+        self._doc_length = {}
+        self._total_length = 0
+        self._versions = None
+        self._built_at = 0.0
+
+    # Building
+    def build(self):
+        # Read before the rows, so a write that lands while they are read triggers another rebuild
+        versions = get_backend().get_versions([SEARCH_VERSION])
+        documents = {}
+        for row in Product.objects.values('id', 'title', 'description', 'collection__title').iterator(chunk_size=2000):
+            documents[row['id']] = {
+                'title': row['title'],
+                'description': row['description'],
+                'collection': row['collection__title'],
+                'tags': [],
+            }
+        content_type = ContentType.objects.get_for_model(Product)
+        for object_id, label in TaggedItem.objects.filter(content_type=content_type).values_list('object_id', 'tag__label').iterator(chunk_size=2000):
+            if object_id in documents:
+                documents[object_id]['tags'].append(label)
+
+        with self._lock:
+            self._postings, self._terms, self._doc_terms, self._doc_length, self._total_length = {}, [], {}, {}, 0
+            for product_id, fields in documents.items():
+                self._add(product_id, fields)
+            self._terms = sorted(self._postings)
+            self._versions = versions
+            self._built_at = time.monotonic()
+            self._built = True
+
+    def invalidate(self):
+        with self._lock:
+            self._built = False
+
+    def is_current(self):
+        if not self._built:
+            return False
+        if time.monotonic() - self._built_at >= getattr(settings, 'STORE_SEARCH_INDEX_MAX_AGE', 300):
+            return False
+        return get_backend().get_versions([SEARCH_VERSION]) == self._versions
+
+    def ensure_built(self):
+        if not self.is_current():
+            with self._lock:
+                if not self.is_current():
+                    self.build()
+
+    def _caught_up(self):
+        # Called after a signal applied this process's own write, whose version bump ran just before - the index is current with the versions as they are now. A write of another process committing in between would be taken as seen too; max age bounds how long that can last.
+        self._versions = get_backend().get_versions([SEARCH_VERSION])
+
+    # Incremental updates
+    def refresh(self, product_ids):
+        """
+        - Re-reads the given products and replaces their entries. Products that no longer exist are dropped.
+        """
+        if not self._built:
+            return
+        product_ids = list(product_ids)
+        rows = Product.objects.filter(id__in=product_ids).values('id', 'title', 'description', 'collection__title')
+        documents = {
+            row['id']: {'title': row['title'], 'description': row['description'], 'collection': row['collection__title'], 'tags': []}
+            for row in rows
+        }
+        for object_id, labels in TaggedItem.objects.for_objects(product_ids, model=Product).labels_by_object().items():
+            if object_id in documents:
+                documents[object_id]['tags'] = labels
+
+        with self._lock:
+            for product_id in product_ids:
+                self._remove(product_id)
+                if product_id in documents:
+                    self._add(product_id, documents[product_id], keep_sorted=True)
+            self._caught_up()
+
+    def remove(self, product_id):
+        if not self._built:
+            return
+        with self._lock:
+            self._remove(product_id)
+            self._caught_up()
+
+    def _add(self, product_id, fields, keep_sorted=False):
+        frequencies = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            value = fields[field]
+            tokens = tokenize(' '.join(value) if isinstance(value, list) else value)
+            for token in tokens:
+                frequencies[token] = frequencies.get(token, 0) + weight
+        for term, frequency in frequencies.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if keep_sorted:
+                    insort(self._terms, term)
+            postings[product_id] = frequency
+        length = sum(frequencies.values())
+        self._doc_terms[product_id] = list(frequencies)
+        self._doc_length[product_id] = length
+        self._total_length += length
+
+    def _remove(self, product_id):
+        terms = self._doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._doc_length.pop(product_id)
+        for term in terms:
+            postings = self._postings[term]
+            del postings[product_id]
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect_left(self._terms, term)]
+
+    # Searching
+    def _expand(self, token):
+        expansions = []
+        position = bisect_left(self._terms, token)
+        while position < len(self._terms) and len(expansions) < MAX_PREFIX_EXPANSIONS:
+            term = self._terms[position]
+            if not term.startswith(token):
+                break
+            expansions.append((term, 1.0 if term == token else PREFIX_PENALTY))
+            position += 1
+        return expansions
+
+    def search(self, query, limit=20):
+        """
+        - Returns [(product_id, score), ...], best match first.
+        """
+        self.ensure_built()
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+
+        with self._lock:
+            documents = len(self._doc_length)
+            if not documents:
+                return []
+            average_length = self._total_length / documents
+            scores = {}
+            doc_length = self._doc_length
+            length_scale = K1 * B / average_length
+            length_base = K1 * (1 - B)
+            for token in tokens:
+                expansions = self._expand(token)
+                # Per query word, a product keeps its best-scoring expansion; with a single expansion there is nothing to compare
+                best = scores if len(expansions) == 1 else {}
+                for term, boost in expansions:
+                    postings = self._postings[term]
+                    idf = math.log(1 + (documents - len(postings) + 0.5) / (len(postings) + 0.5))
+                    weight = boost * idf * (K1 + 1)
+                    if best is scores:
+                        for product_id, frequency in postings.items():
+                            scores[product_id] = scores.get(product_id, 0) + weight * frequency / (frequency + length_base + length_scale * doc_length[product_id])
+                        continue
+                    for product_id, frequency in postings.items():
+                        score = weight * frequency / (frequency + length_base + length_scale * doc_length[product_id])
+                        if score > best.get(product_id, 0):
+                            best[product_id] = score
+                if best is not scores:
+                    for product_id, score in best.items():
+                        scores[product_id] = scores.get(product_id, 0) + score
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+
+
+product_index = ProductSearchIndex()
+
+
+def reindex_on_commit(product_ids=None):
+    """
+    - Once the transaction commits, bumps the search version and refreshes the given products in this process's index - or, without ids, drops it for a rebuild. product_ids may be a queryset; it is read at commit time.
+    """
+    # The bump runs first, so the refresh records the version that includes this write
+    transaction.on_commit(lambda: bump_version(SEARCH_VERSION))
+    if product_ids is None:
+        transaction.on_commit(product_index.invalidate)
+    else:
+        transaction.on_commit(lambda: product_index.refresh(product_ids))
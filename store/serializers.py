@@ -1,22 +1,111 @@
 from rest_framework import serializers
-from .models import Product, Collection
-from decimal import Decimal
+from rest_framework.settings import api_settings
+from operator import itemgetter
+from django.utils.text import slugify
+from .models import Product, Collection, Customer, Order, Review, ReviewSummary
+from .carts import MAX_QUANTITY
+from . import pricing
+from decimal import Decimal, getcontext
+
+
+def count_or_zero(count):
+    # Products without reviews have no ReviewSummary row, so the LEFT JOIN gives NULL
+    return count or 0
 
 # Collection Serializer
 class CollectionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Collection
-        fields = ['id', 'title']
+        fields = ['id', 'title', 'products_count']
+        read_only_fields = ['products_count']
 
     """
     - A Model Serializer in Django REST framework offers code optimization by automatically generating serialization fields based on the structure of a model. It eliminates the need to define each field manually, saving developers time and reducing redundancy. While Model Serializers can automatically include all fields from the model, developers have the flexibility to customize which fields are exposed in the serialized output. This customization ensures that only the necessary data is exposed, enhancing security and performance in API development.
     """
 
-# Product Serializer
-class ProductSerializer(serializers.ModelSerializer):
+class TagLabelsField(serializers.ListField):
+    # A class of its own rather than ListField(child=...) - the child is copied for every instance
+    child = serializers.CharField()
+
+# Sparse Fieldsets Here...
+class SparseFieldsMixin:
+    """
+    - ?fields=id,title,price_with_tax returns only those fields; ?expand=collection nests the full related object (expandable_fields) instead of its id, and an expandable field that isn't in the default output (ProductSerializer's tags and likes_count) is added. Expanding a field also selects it.
+
+    - fieldset(query_params) reads both parameters into keyword arguments for the serializer and for CompiledModelSerializer.select(), e.g. ProductSerializer(product, **ProductSerializer.fieldset(request.query_params)). Unknown names raise a ValidationError (400).
+
+    - Keeping the output small is only half of it - the views also read just the columns the selected fields need (.only() / .values() with select_related for expansions), see CompiledModelSerializer.only().
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in expand:
+            self.fields[name] = self.expandable_fields[name](read_only=True)
+        if fields is not None:
+            for name in [name for name in self.fields if name not in fields]:
+                self.fields.pop(name)
+
+    @classmethod
+    def fieldset(cls, query_params):
+        errors = {}
+        expand = _names(query_params.get('expand'))
+        unknown = [name for name in expand if name not in cls.expandable_fields]
+        if unknown:
+            errors['expand'] = [f"Can't expand {', '.join(unknown)}. Expandable: {', '.join(cls.expandable_fields) or 'none'}."]
+
+        fields = None
+        if query_params.get('fields'):
+            available = list(cls().fields)
+            # Fields that only exist expanded (ProductSerializer's tags) come last, and selecting one expands it
+            extra = [name for name in cls.expandable_fields if name not in available]
+            available += extra
+            requested = _names(query_params['fields'])
+            unknown = [name for name in requested if name not in available]
+            if unknown:
+                errors['fields'] = [f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(available)}."]
+            expand += [name for name in extra if name in requested]
+            # In declaration order, so the same selection always gives the same output (and cache key for the compiled plan)
+            fields = tuple(name for name in available if name in requested or name in expand)
+
+        if errors:
+            raise serializers.ValidationError(errors)
+        return {'fields': fields, 'expand': tuple(name for name in cls.expandable_fields if name in expand)}
+
+
+def _names(value):
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+# Product Serializers
+class ProductListSerializer(serializers.ListSerializer):
+    # Prices the whole list with one promotions query before the items are serialized one by one
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        self.child.prices = pricing.quote(items)
+        return super().to_representation(items)
+
+
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = ['id', 'title', 'description', 'slug', 'inventory', 'unit_price', 'price_with_tax', 'collection']
+        fields = ['id', 'title', 'description', 'slug', 'inventory', 'unit_price', 'discount', 'effective_price', 'price_with_tax', 'collection', 'reviews_count']
+        list_serializer_class = ProductListSerializer
+
+    # tags and likes_count are read by ProductQuerySet.with_tags() / with_like_counts() for the whole page at once - prefetch() applies them. Likes don't move a cache version: in a cached response likes_count can be as old as the entry, like the counters themselves lag by a flush interval
+    expandable_fields = {
+        'collection': CollectionSerializer,
+        'tags': TagLabelsField,
+        'likes_count': serializers.IntegerField,
+    }
+
+    @staticmethod
+    def prefetch(queryset, expand):
+        if 'tags' in expand:
+            queryset = queryset.with_tags()
+        if 'likes_count' in expand:
+            queryset = queryset.with_like_counts()
+        return queryset
 
     """ 
     - source = "unit_price": This indicates that when you serialize this field, you should use the value from the unit_price attribute of the model. In other words, you're telling the serializer to look for the value in the unit_price attribute and use it when serializing the price field.
@@ -31,7 +120,32 @@ class ProductSerializer(serializers.ModelSerializer):
     - 'calculate_tax' Function, we are using in 'price_with_tax' custom serializer field.
     """
     def calculate_tax(self, product:Product):
-        return product.unit_price * Decimal(1.1)
+        return self.get_price(product).price_with_tax
+
+    # Promotion-aware prices from store/pricing.py - a list is priced in one go by ProductListSerializer, a single product on its own
+    discount = serializers.SerializerMethodField(method_name='calculate_discount')
+    effective_price = serializers.SerializerMethodField(method_name='calculate_effective_price')
+
+    def calculate_discount(self, product:Product):
+        return self.get_price(product).discount
+
+    def calculate_effective_price(self, product:Product):
+        return self.get_price(product).effective_price
+
+    def get_price(self, product:Product):
+        prices = getattr(self, 'prices', None)
+        if prices is None or product.id not in prices:
+            prices = self.prices = pricing.quote([product])
+        return prices[product.id]
+
+    # Read from the precomputed ReviewSummary row - select_related('review_summary') keeps it in the same query
+    reviews_count = serializers.SerializerMethodField(method_name='count_reviews')
+
+    def count_reviews(self, product:Product):
+        try:
+            return product.review_summary.reviews_count
+        except ReviewSummary.DoesNotExist:
+            return 0
     
 
     """
@@ -64,4 +178,317 @@ class ProductSerializer(serializers.ModelSerializer):
         queryset=Collection.objects.all(),
         view_name='collection-detail',
     )
-    """
\ No newline at end of file
+    """
+
+
+# Bulk Product Serializers
+class BulkProductSerializer(ProductSerializer):
+    """
+    - One item of a bulk write. The field rules are ProductSerializer's, with two changes: an optional id (present = update that product, absent = create), and collection taken as a plain integer so that validating thousands of items doesn't run one Collection lookup per item - store.bulk resolves all of them with a single query.
+    """
+    id = serializers.IntegerField(required=False)
+    collection = serializers.IntegerField(source='collection_id')
+
+
+class ImportProductSerializer(ProductSerializer):
+    """
+    - One row of a catalog import (manage.py import_catalog). The field rules are ProductSerializer's - unit_price's MinValueValidator and digit limits, the title and slug lengths - but the collection is named by its title and the promotions by their descriptions, each optionally followed by :discount (e.g. "Summer Sale:0.15"). store.imports resolves or creates them in bulk, so validation never touches the database and can run in worker processes. A blank slug is made from the title.
+    """
+    collection = serializers.CharField(max_length=255)
+    promotions = serializers.ListField(child=serializers.CharField(max_length=255), required=False, default=list)
+    slug = serializers.SlugField(max_length=50, required=False, allow_blank=True)
+
+    class Meta(ProductSerializer.Meta):
+        fields = ['title', 'description', 'slug', 'inventory', 'unit_price', 'collection', 'promotions']
+
+    def validate_promotions(self, value):
+        promotions = []
+        for entry in value:
+            description, discount = entry, None
+            head, separator, tail = entry.rpartition(':')
+            if separator:
+                try:
+                    description, discount = head, float(tail)
+                except ValueError:
+                    # A colon that is part of the description
+                    pass
+            if discount is not None and not 0 <= discount <= 1:
+                raise serializers.ValidationError(f'The discount of "{description}" must be between 0 and 1.')
+            promotions.append((description.strip(), discount))
+        return promotions
+
+    def validate(self, data):
+        if not data.get('slug'):
+            data['slug'] = slugify(data['title'])[:50]
+        return data
+
+
+class ProductBatchSerializer(serializers.Serializer):
+    upsert = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+    delete = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+
+
+# Review Serializer
+class ReviewSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Review
+        fields = ['id', 'name', 'description', 'date']
+
+    # The product comes from the URL, not from the request body
+    def create(self, validated_data):
+        return Review.objects.create(product_id=self.context['product_id'], **validated_data)
+
+
+# Order Serializer
+class OrderSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Order
+        fields = ['id', 'placed_at', 'payment_status', 'items_count', 'total']
+        read_only_fields = fields
+
+
+# Cart Serializers
+class AddCartItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, max_value=MAX_QUANTITY)
+
+    def validate_product_id(self, value):
+        if not Product.objects.filter(id=value).exists():
+            raise serializers.ValidationError('No product with the given ID was found.')
+        return value
+
+
+class UpdateCartItemSerializer(serializers.Serializer):
+    quantity = serializers.IntegerField(min_value=1, max_value=MAX_QUANTITY)
+
+
+class CheckoutSerializer(serializers.Serializer):
+    customer_id = serializers.IntegerField()
+
+    def validate_customer_id(self, value):
+        if not Customer.objects.filter(id=value).exists():
+            raise serializers.ValidationError('No customer with the given ID was found.')
+        return value
+
+
+# Compiled (Fast-Path) Serializers
+class CompiledModelSerializer:
+    """
+    - A read-only twin of a ModelSerializer for list responses. The field plan (which column feeds which output key and how the value is converted) is worked out once from the real serializer's fields, then every row coming out of queryset.values() is turned into a dict with a single pass over that plan - no get_attribute(), no per-field to_representation() dispatch, no model instances.
+
+    - The output is identical to serializer_class(queryset, many=True).data, so the rendered JSON is byte-for-byte the same.
+
+    - SerializerMethodFields can't run against a dict, so each one is declared in computed_fields as {output_name: (source_column, function)}.
+
+    - Values that are worked out for all rows at once go through prepare(rows), which adds them to every row under a key of prepared_columns = {key: (columns it is computed from, ...)} (not read from the database); computed_fields can use those keys as their source.
+
+    - Nested serializers (e.g. an expanded collection) are read through the relation in the same query - collection__id, collection__title, ... - and put back together per row.
+
+    - select(fields=..., expand=...) gives the twin of serializer_class(fields=..., expand=...) (see SparseFieldsMixin), with a plan and columns of its own: unselected fields are neither read nor rendered. only(queryset) narrows a model queryset the same way, for the views that serialize instances.
+
+    Code:
+    rows = queryset.values(*CompiledProductSerializer.columns())
+    data = CompiledProductSerializer.serialize(rows)
+    """
+    serializer_class = None
+    serializer_kwargs = {}
+    computed_fields = {}
+    prepared_columns = {}
+    _plan = None
+    _selections = None
+
+    @classmethod
+    def compile(cls):
+        if cls._plan is not None:
+            return cls._plan
+
+        plan = []
+        columns = []
+        sources = set()
+        for name, field in cls.serializer_class(**cls.serializer_kwargs).fields.items():
+            if field.write_only:
+                continue
+            if name in cls.computed_fields:
+                source, function = cls.computed_fields[name]
+                plan.append((name, source, function, False))
+                needed = cls.prepared_columns.get(source, (source,))
+            elif isinstance(field, serializers.SerializerMethodField):
+                raise TypeError(f'{cls.__name__}: method field {name!r} needs an entry in computed_fields')
+            elif isinstance(field, serializers.BaseSerializer):
+                # The converter gets the whole row (source None) and builds the nested dict from the prefixed columns
+                build, needed = _nested_converter(cls, field)
+                plan.append((name, None, build, False))
+            else:
+                source = field.source
+                plan.append((name, source, _converter_for(field), True))
+                needed = cls.prepared_columns.get(source, (source,))
+            sources.add(plan[-1][1])
+            for column in needed:
+                if column not in columns:
+                    columns.append(column)
+
+        cls._columns = tuple(columns)
+        cls._sources = frozenset(sources)
+        cls._plan = plan
+        return plan
+
+    @classmethod
+    def columns(cls, *extra):
+        # extra: columns the caller needs besides the serialized ones, e.g. the ordering of a keyset page
+        cls.compile()
+        return cls._columns + tuple(column for column in extra if column not in cls._columns)
+
+    @classmethod
+    def uses(cls, source):
+        cls.compile()
+        return source in cls._sources
+
+    @classmethod
+    def select(cls, fields=None, expand=()):
+        if fields is None and not expand:
+            return cls
+        key = (fields, tuple(expand))
+        if cls._selections is None:
+            cls._selections = {}
+        selection = cls._selections.get(key)
+        if selection is None:
+            selection = cls._selections[key] = type(cls.__name__, (cls,), {
+                'serializer_kwargs': {'fields': fields, 'expand': tuple(expand)},
+                '_plan': None,
+                '_selections': None,
+            })
+        return selection
+
+    @classmethod
+    def only(cls, queryset):
+        # Related columns (collection__title, review_summary__reviews_count) come in through a JOIN, like they do in .values()
+        columns = cls.columns()
+        related = sorted({column.split('__', 1)[0] for column in columns if '__' in column})
+        if related:
+            # select_related() without arguments would follow every foreign key
+            queryset = queryset.select_related(*related)
+        return queryset.only(*columns)
+
+    @classmethod
+    def to_representation(cls, row):
+        ret = {}
+        for name, source, convert, skip_none in cls.compile():
+            value = row if source is None else row[source]
+            if convert is None or (skip_none and value is None):
+                ret[name] = value
+            else:
+                ret[name] = convert(value)
+        return ret
+
+    @classmethod
+    def prepare(cls, rows):
+        return list(rows)
+
+    @classmethod
+    async def aprepare(cls, rows):
+        # For async views - an override that queries the database has to do it through the async ORM here
+        return cls.prepare(rows)
+
+    @classmethod
+    def serialize(cls, rows):
+        to_representation = cls.to_representation
+        return [to_representation(row) for row in cls.prepare(rows)]
+
+    @classmethod
+    async def aserialize(cls, rows):
+        to_representation = cls.to_representation
+        return [to_representation(row) for row in await cls.aprepare(rows)]
+
+
+def _nested_converter(compiled, serializer):
+    prefix = serializer.source + '__'
+    fields = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, (serializers.SerializerMethodField, serializers.BaseSerializer)):
+            raise TypeError(f'{compiled.__name__}: nested field {serializer.field_name}.{name} is not supported')
+        fields.append((name, prefix + field.source, _converter_for(field)))
+    # A NULL foreign key comes back as NULL in every joined column - render it as None, like the nested serializer does
+    pk_column = prefix + 'id'
+    columns = tuple(column for name, column, convert in fields)
+    if pk_column not in columns:
+        columns += (pk_column,)
+
+    def build(row):
+        if row[pk_column] is None:
+            return None
+        ret = {}
+        for name, column, convert in fields:
+            value = row[column]
+            ret[name] = value if convert is None or value is None else convert(value)
+        return ret
+    return build, columns
+
+
+def _converter_for(field):
+    """
+    - Returns the cheapest function that gives the same result as field.to_representation() for the values the database hands back, or None when the value can be used as it is.
+    """
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        # .values() already yields the related id
+        return None
+    if isinstance(field, (serializers.IntegerField, serializers.CharField)):
+        # ints and strings come back from the database in their final form
+        return None
+    if isinstance(field, serializers.DecimalField) and not field.normalize_output and field.decimal_places is not None:
+        if getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING):
+            return field.to_representation
+        exponent = Decimal('.1') ** field.decimal_places
+        context = getcontext().copy()
+        if field.max_digits is not None:
+            context.prec = field.max_digits
+        rounding = field.rounding
+
+        def convert(value):
+            if not isinstance(value, Decimal):
+                value = Decimal(str(value).strip())
+            return value.quantize(exponent, rounding=rounding, context=context)
+        return convert
+    return field.to_representation
+
+
+class CompiledProductSerializer(CompiledModelSerializer):
+    serializer_class = ProductSerializer
+    # The prices come out of pricing.quote_floats() as floats, which render to the same JSON as the Decimals ProductSerializer returns
+    computed_fields = {
+        'discount': ('price', itemgetter(0)),
+        'effective_price': ('price', itemgetter(1)),
+        'price_with_tax': ('price', itemgetter(3)),
+        'reviews_count': ('review_summary__reviews_count', count_or_zero),
+    }
+    # tags and likes_count are put on the rows by ProductSerializer.prefetch()
+    prepared_columns = {'price': ('id', 'unit_price'), 'tags': ('id',), 'likes_count': ('id',)}
+
+    @classmethod
+    def prepare(cls, rows, discounts=None):
+        # One promotions query and one pass of the fixed-point pricing rules for all rows - none when no price field is selected
+        rows = list(rows)
+        if not cls.uses('price'):
+            return rows
+        if discounts is None:
+            discounts = pricing.best_discounts(row['id'] for row in rows)
+        prices = pricing.quote_floats([row['unit_price'] for row in rows], [discounts.get(row['id'], 0) for row in rows])
+        for row, price in zip(rows, prices):
+            row['price'] = price
+        return rows
+
+    @classmethod
+    async def aprepare(cls, rows):
+        rows = list(rows)
+        if not cls.uses('price'):
+            return rows
+        return cls.prepare(rows, await pricing.abest_discounts(row['id'] for row in rows))
+
+
+class CompiledCollectionSerializer(CompiledModelSerializer):
+    serializer_class = CollectionSerializer
+
+
+class CompiledOrderSerializer(CompiledModelSerializer):
+    serializer_class = OrderSerializer
@@ -0,0 +1,202 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from . import analytics, facets
+from .cache import bump_version
+from .models import Collection, Order, OrderItem, Product, Promotion, Review, ReviewSummary
+from .search import reindex_on_commit
+from likes.models import LikeCount, LikedItem
+from tags.models import Tag, TaggedItem
+
+# Cache Invalidation Signals Here...
+"""
+- Every write to a cached model bumps that model's version counter, which retires all cached responses built from the old version (see store/cache.py).
+
+- The bump waits for the transaction to commit. Bumped before it, a concurrent request could read the not yet committed old rows and cache them under the new version, where they would be served until the entry expires.
+
+- Bulk writes that skip signals (queryset.update(), bulk_create(), bulk_update()) must call bump_version() themselves, in transaction.on_commit() too.
+"""
+
+def bump_on_commit(*names):
+    transaction.on_commit(lambda: bump_version(*names))
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, **kwargs):
+    bump_on_commit('product')
+
+# Deletes run inside the deletion's transaction, including queryset.delete(), so the counter stays in step with the rows
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    Collection.adjust_products_count({instance.collection_id: -1})
+
+@receiver([post_save, post_delete], sender=Collection)
+def collection_changed(sender, **kwargs):
+    bump_on_commit('collection')
+
+@receiver([post_save, post_delete], sender=Promotion)
+def promotion_changed(sender, **kwargs):
+    bump_on_commit('promotion')
+
+@receiver(m2m_changed, sender=Product.promotions.through)
+def product_promotions_changed(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_on_commit('product', 'promotion')
+
+@receiver([post_save, post_delete], sender=Review)
+def review_changed(sender, **kwargs):
+    bump_on_commit('review')
+
+# The summary row is written right after the review, in the same transaction when there is one
+@receiver(post_save, sender=Review)
+def review_added(sender, instance, created, **kwargs):
+    if created:
+        ReviewSummary.review_added(instance.product_id, instance.date)
+
+@receiver(post_delete, sender=Review)
+def review_removed(sender, instance, **kwargs):
+    ReviewSummary.review_removed(instance.product_id)
+
+
+# Order Totals Signals Here...
+"""
+- Order.total and Order.items_count follow every saved or deleted OrderItem - the admin's OrderItemInline included - in the same transaction as the item.
+"""
+
+@receiver(post_save, sender=OrderItem)
+def order_item_saved(sender, instance, **kwargs):
+    previous = getattr(instance, '_loaded_order_id', None)
+    Order.refresh_totals({instance.order_id, previous} - {None})
+    instance._loaded_order_id = instance.order_id
+
+@receiver(post_delete, sender=OrderItem)
+def order_item_deleted(sender, instance, **kwargs):
+    Order.refresh_totals([instance.order_id])
+
+
+# Sales Rollup Signals Here...
+"""
+- Keep the daily sales rollups (store/analytics.py) in step with complete orders, inside the writing transaction.
+"""
+
+@receiver(post_save, sender=Order)
+def order_rollups(sender, instance, created, **kwargs):
+    analytics.order_saved(instance, created)
+    instance._loaded_values = {'payment_status': instance.payment_status, 'placed_at': instance.placed_at}
+
+@receiver([pre_save, pre_delete], sender=OrderItem)
+def order_item_rollups_before(sender, instance, **kwargs):
+    analytics.item_changing(instance)
+
+@receiver([post_save, post_delete], sender=OrderItem)
+def order_item_rollups_after(sender, instance, **kwargs):
+    analytics.item_changed(instance)
+
+
+# Search Index Signals Here...
+"""
+- Only writes that change a search document reindex (store/search.py) - a product save that leaves title, description and collection alone, e.g. an inventory change, doesn't. The index is only touched once the transaction commits, so a rolled-back write never shows up in search results.
+"""
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, created, **kwargs):
+    if created or instance.search_fields_changed():
+        reindex_on_commit([instance.id])
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    # Read now - delete() sets instance.id to None before the transaction commits
+    reindex_on_commit([instance.id])
+
+@receiver(post_save, sender=Collection)
+def index_collection_products(sender, instance, created, **kwargs):
+    if not created:
+        reindex_on_commit(instance.products.values_list('id', flat=True))
+
+@receiver([post_save, post_delete], sender=TaggedItem)
+def index_tagged_product(sender, instance, **kwargs):
+    if instance.content_type_id == ContentType.objects.get_for_model(Product).id:
+        reindex_on_commit([instance.object_id])
+
+@receiver(post_save, sender=Tag)
+def index_tag_products(sender, instance, created, **kwargs):
+    if not created:
+        # A renamed tag changes the search documents and the cached responses of its products
+        bump_on_commit('tag')
+        reindex_on_commit(TaggedItem.objects.filter(
+            tag=instance, content_type=ContentType.objects.get_for_model(Product)
+        ).values_list('object_id', flat=True))
+
+
+# Facet Count Signals Here...
+"""
+- Each handler turns a change into +1/-1 deltas on the FacetCount rows it touches (see store/facets.py). They run inside the writing transaction, so counts and rows commit or roll back together.
+"""
+
+@receiver(post_save, sender=Product)
+def count_product_facets(sender, instance, created, **kwargs):
+    current = {name: getattr(instance, name) for name in Product.TRACKED_FIELDS}
+    if created:
+        facets.adjust(facets.facet_changes([], facets.product_facets(**current)))
+        return
+    loaded = getattr(instance, '_loaded_values', None)
+    if loaded is None:
+        return
+    # Fields that were deferred when the product was loaded can't be compared - leave them out on both sides
+    known = {name: value for name, value in loaded.items() if value is not None}
+    before = facets.product_facets(**{name: known.get(name) for name in Product.TRACKED_FIELDS})
+    after = facets.product_facets(**{name: current[name] if name in known else None for name in Product.TRACKED_FIELDS})
+    facets.adjust(facets.facet_changes(before, after))
+
+@receiver(pre_delete, sender=Product)
+def collect_product_relations(sender, instance, **kwargs):
+    # The promotion links go away without m2m_changed, so they are read before the delete
+    instance._deleted_promotion_ids = list(instance.promotions.values_list('id', flat=True))
+    # Tags and likes point at products through a generic relation, which doesn't cascade - clear them here so no orphan stays counted
+    content_type = ContentType.objects.get_for_model(Product)
+    TaggedItem.objects.filter(content_type=content_type, object_id=instance.id).delete()
+    LikedItem.objects.filter(content_type=content_type, object_id=instance.id).delete()
+    LikeCount.objects.filter(content_type=content_type, object_id=instance.id).delete()
+
+@receiver(post_delete, sender=Product)
+def uncount_product_facets(sender, instance, **kwargs):
+    before = facets.product_facets(**{name: getattr(instance, name) for name in Product.TRACKED_FIELDS})
+    before += [('promotion', str(promotion_id)) for promotion_id in getattr(instance, '_deleted_promotion_ids', [])]
+    facets.adjust(facets.facet_changes(before, []))
+
+@receiver(m2m_changed, sender=Product.promotions.through)
+def count_promotion_facets(sender, instance, action, reverse, pk_set, **kwargs):
+    through = Product.promotions.through
+    if action in ('pre_remove', 'pre_clear'):
+        # pk_set may name links that don't exist, so the real ones are read before they are removed
+        links = through.objects.filter(promotion_id=instance.pk) if reverse else through.objects.filter(product_id=instance.pk)
+        if action == 'pre_remove':
+            links = links.filter(**{'product_id__in' if reverse else 'promotion_id__in': pk_set})
+        instance._removed_promotion_ids = list(links.values_list('promotion_id', flat=True))
+    elif action == 'post_add':
+        promotion_ids = [instance.pk] * len(pk_set) if reverse else list(pk_set)
+        facets.adjust(facets.facet_changes([], [('promotion', str(promotion_id)) for promotion_id in promotion_ids]))
+    elif action in ('post_remove', 'post_clear'):
+        promotion_ids = getattr(instance, '_removed_promotion_ids', [])
+        facets.adjust(facets.facet_changes([('promotion', str(promotion_id)) for promotion_id in promotion_ids], []))
+        instance._removed_promotion_ids = []
+
+@receiver(post_save, sender=TaggedItem)
+def count_tag_facet(sender, instance, created, **kwargs):
+    bump_on_commit('tag')
+    if created and instance.content_type_id == ContentType.objects.get_for_model(Product).id:
+        facets.adjust({('tag', str(instance.tag_id)): 1})
+
+@receiver(post_delete, sender=TaggedItem)
+def uncount_tag_facet(sender, instance, **kwargs):
+    bump_on_commit('tag')
+    if instance.content_type_id == ContentType.objects.get_for_model(Product).id:
+        facets.adjust({('tag', str(instance.tag_id)): -1})
+
+@receiver(post_delete, sender=Promotion)
+def drop_promotion_facet(sender, instance, **kwargs):
+    facets.drop('promotion', instance.id)
+
+@receiver(post_delete, sender=Collection)
+def drop_collection_facet(sender, instance, **kwargs):
+    facets.drop('collection', instance.id)
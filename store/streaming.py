@@ -0,0 +1,91 @@
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+from .pagination import KeysetPagination
+
+# Streaming JSON Helpers Here...
+"""
+- Large responses are produced chunk by chunk: every chunk is read by a keyset query of its own (WHERE (title, id) > <the last row of the chunk before> ORDER BY title, id LIMIT chunk_size - the same WHERE as KeysetPagination's pages), serialized on its own, written out, and then dropped. Peak memory is bounded by one chunk, no matter how many rows the table has.
+
+- Not .iterator(chunk_size=...): it holds one cursor open for the whole response, and MySQL's client driver reads the cursor's complete result into memory anyway. Keyset queries are short and stay bounded by one chunk on every backend.
+
+- The a-prefixed twins do the same for async views with the async ORM and an async serialize function. Under ASGI the response is then an async iterator, so the event loop keeps serving other requests while a chunk is being fetched.
+"""
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def iter_keyset_chunks(queryset, chunk_size=DEFAULT_CHUNK_SIZE, ordering=None):
+    """
+    - The rows of a values() queryset in the order of ordering (the primary key by default; it must end in a unique column, and its columns must be among the values), chunk_size at a time, each chunk read by a query of its own: WHERE <ordering> > <the position of the last row of the chunk before> ORDER BY <ordering> LIMIT chunk_size.
+    """
+    keyset = _keyset(queryset, ordering)
+    queryset = queryset.order_by(*keyset.ordering)
+    position = None
+    while True:
+        chunk = list((queryset if position is None else queryset.filter(keyset.keyset_filter(position)))[:chunk_size])
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+        position = keyset.get_position(chunk[-1])
+
+
+def _keyset(queryset, ordering):
+    return KeysetPagination(ordering=ordering or (queryset.model._meta.pk.attname,))
+
+
+def iter_json_array(queryset, serialize, chunk_size=DEFAULT_CHUNK_SIZE, ordering=None):
+    """
+    - queryset: a values() queryset, read with iter_keyset_chunks() in the order of ordering. serialize: any callable turning a list of rows into a list of dicts, e.g. CompiledProductSerializer.serialize.
+    """
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    yield '['
+    first = True
+    for chunk in iter_keyset_chunks(queryset, chunk_size, ordering):
+        data = serialize(chunk)
+        body = ','.join(encoder.encode(item) for item in data)
+        yield body if first else ',' + body
+        first = False
+    yield ']'
+
+
+def stream_json_array(queryset, serialize, chunk_size=DEFAULT_CHUNK_SIZE, ordering=None):
+    return StreamingHttpResponse(
+        iter_json_array(queryset, serialize, chunk_size, ordering),
+        content_type='application/json',
+    )
+
+
+async def aiter_keyset_chunks(queryset, chunk_size=DEFAULT_CHUNK_SIZE, ordering=None):
+    keyset = _keyset(queryset, ordering)
+    queryset = queryset.order_by(*keyset.ordering)
+    position = None
+    while True:
+        chunk = [row async for row in (queryset if position is None else queryset.filter(keyset.keyset_filter(position)))[:chunk_size]]
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+        position = keyset.get_position(chunk[-1])
+
+
+async def aiter_json_array(queryset, aserialize, chunk_size=DEFAULT_CHUNK_SIZE, ordering=None):
+    """
+    - aserialize: an async callable turning a list of rows into a list of dicts, e.g. CompiledProductSerializer.aserialize.
+    """
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    yield '['
+    first = True
+    async for chunk in aiter_keyset_chunks(queryset, chunk_size, ordering):
+        data = await aserialize(chunk)
+        body = ','.join(encoder.encode(item) for item in data)
+        yield body if first else ',' + body
+        first = False
+    yield ']'
+
+
+def astream_json_array(queryset, aserialize, chunk_size=DEFAULT_CHUNK_SIZE, ordering=None):
+    return StreamingHttpResponse(
+        aiter_json_array(queryset, aserialize, chunk_size, ordering),
+        content_type='application/json',
+    )
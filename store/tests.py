@@ -1,3 +1,1329 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock, skipUnless
+from asgiref.sync import async_to_sync
+from django.apps import apps as django_apps
+from django.db import OperationalError, connection
+from django.conf import settings
+from django.db.models import Count
+from django.core.exceptions import ValidationError
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from .cache import get_backend
+from .carts import MAX_QUANTITY, DatabaseCartStore, HotCartStore, sweep_expired_carts
+from .checkout import CheckoutError, checkout
+from .db import replicas
+from . import analytics, bulk, exports, facets, imports, jobs, pricing
+from .facets import get_facets
+from .middleware import metrics
+from .pagination import KeysetPagination
+from .models import AdminJob, Cart, CartItem, Collection, Customer, FacetCount, Order, OrderItem, Product, Promotion, Review, ReviewSummary
+from .search import ProductSearchIndex, product_index
+from .serializers import CollectionSerializer, CompiledCollectionSerializer, CompiledOrderSerializer, CompiledProductSerializer, OrderSerializer, ProductSerializer
+from .streaming import iter_keyset_chunks
+from likes.counters import ShardedCounter, apply_deltas, like_counts
+from likes.models import LikeCount, LikedItem
+from tags.models import Tag, TaggedItem
 
-# Create your tests here.
+def rebuilt_facets():
+    # What rebuild_facets counts from scratch - the incrementally kept counts must come out the same
+    facets.rebuild()
+    return get_facets()
+
+
+# Checkout Concurrency Test
+@skipUnless(connection.features.has_select_for_update, "needs a backend with row locks (MySQL) - SQLite has no SELECT ... FOR UPDATE, so the checkouts would only be serialized by its database-wide write lock and the test couldn't tell a missing row lock apart")
+class CheckoutConcurrencyTest(TransactionTestCase):
+    """
+    - Many more threads than there is stock check out one unit each, all at once, and the contention is repeated for several rounds with fresh stock and carts. Whatever the interleaving, the product must never be sold more often than it was in stock, and every unit sold must have an OrderItem.
+
+    - Only runs on a backend with row locks, so it exercises checkout's SELECT ... FOR UPDATE and conditional UPDATE. Passing makes overselling unlikely under this load, it doesn't prove it impossible - it's a stress test, not a proof.
+    """
+    threads = 32
+    stock = 3
+    rounds = 20
+    attempts = 50
+
+    def setUp(self):
+        collection = Collection.objects.create(title='Stress')
+        self.product = Product.objects.create(title='Limited', slug='limited', unit_price=10, inventory=0, collection=collection)
+        self.customer = Customer.objects.create(first_name='Load', last_name='Test', email='load@test.com', phone='0')
+
+    def test_no_overselling(self):
+        for round in range(self.rounds):
+            with self.subTest(round=round):
+                self.contend()
+
+    def contend(self):
+        Product.objects.filter(id=self.product.id).update(inventory=self.stock)
+        ordered = OrderItem.objects.filter(product=self.product).count()
+        carts = []
+        for _ in range(self.threads):
+            cart = Cart.objects.create()
+            CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+            carts.append(cart.id)
+        barrier = threading.Barrier(self.threads)
+        outcomes = []
+
+        def buy(cart_id):
+            barrier.wait()
+            try:
+                for attempt in range(self.attempts):
+                    try:
+                        checkout(cart_id, self.customer.id)
+                        outcomes.append('sold')
+                        return
+                    except CheckoutError:
+                        outcomes.append('out of stock')
+                        return
+                    except OperationalError:
+                        # A lock wait timeout rolls the checkout back - try again like a client would
+                        time.sleep(random.uniform(0, 0.01))
+                outcomes.append('busy')
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=buy, args=(cart_id,)) for cart_id in carts]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.product.refresh_from_db()
+        sold = outcomes.count('sold')
+        self.assertEqual(len(outcomes), self.threads)
+        self.assertEqual(outcomes.count('busy'), 0)
+        self.assertGreaterEqual(self.product.inventory, 0)
+        self.assertEqual(sold, self.stock)
+        self.assertEqual(self.product.inventory, self.stock - sold)
+        self.assertEqual(OrderItem.objects.filter(product=self.product).count() - ordered, sold)
+
+
+# Read Replica Routing Test
+@skipUnless('replica' in settings.DATABASES, 'needs a replica database - run with --settings=trikha_store.replica_settings')
+class ReplicaRoutingTest(TransactionTestCase):
+    """
+    - Two SQLite databases stand in for the primary and a replica, each with a product the other doesn't have - whichever product a request finds tells which database served it. Catalog GETs go to the replica; after a write the client sticks to the primary until the sticky cookie runs out. Pinned clients skip the response cache, and replica responses aren't cached within STICKY_SECONDS of a write.
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        get_backend().clear()
+        replicas.monitor.reset()
+        collection = Collection.objects.create(title='Primary')
+        self.primary_product = Product.objects.create(title='On primary', slug='on-primary', unit_price=10, inventory=1, collection=collection)
+        Collection.objects.using('replica').bulk_create([Collection(id=1000, title='Replica')])
+        Product.objects.using('replica').bulk_create([Product(id=1000, title='On replica', slug='on-replica', unit_price=10, inventory=1, collection_id=1000)])
+
+    def assertServedBy(self, database):
+        get_backend().clear()
+        found, missing = (1000, self.primary_product.id) if database == 'replica' else (self.primary_product.id, 1000)
+        for name in ('product-detail', 'async-product-detail'):
+            self.assertEqual(self.client.get(reverse(name, args=[found])).status_code, 200)
+            self.assertEqual(self.client.get(reverse(name, args=[missing])).status_code, 404)
+
+    def test_reads_go_to_replica_until_client_writes(self):
+        self.assertServedBy('replica')
+        response = self.client.post(reverse('cart-create'))
+        self.assertIn(replicas.STICKY_COOKIE, response.cookies)
+        self.assertServedBy('default')
+        self.client.cookies[replicas.STICKY_COOKIE] = '0'
+        self.assertServedBy('replica')
+
+    def detail(self, product_id, client):
+        response = client.get(reverse('product-detail', args=[product_id]))
+        return response.json()['title'] if response.status_code == 200 else response.status_code
+
+    def test_response_cache(self):
+        # Forget setUp's writes - nothing was written recently
+        get_backend().clear()
+        replica = Product.objects.using('replica').filter(id=1000)
+        reader = self.client_class()
+        self.assertEqual(self.detail(1000, self.client), 'On replica')
+        replica.update(title='Replicated')
+        self.assertEqual(self.detail(1000, self.client), 'On replica')
+
+        # A client that wrote skips the cache and reads from the primary
+        self.client.post(reverse('cart-create'))
+        self.assertEqual(self.detail(1000, self.client), 404)
+        self.assertEqual(self.detail(1000, reader), 'On replica')
+
+        # Right after a product write the replica may be behind - its responses are served but not stored
+        self.primary_product.save()
+        self.assertEqual(self.detail(1000, reader), 'Replicated')
+        replica.update(title='Caught up')
+        self.assertEqual(self.detail(1000, reader), 'Caught up')
+
+        # Once STICKY_SECONDS have passed they are cached again
+        with mock.patch('store.db.replicas.time.time', return_value=time.time() + replicas.get_config()['STICKY_SECONDS']):
+            self.assertEqual(self.detail(1000, reader), 'Caught up')
+            replica.update(title='Later')
+            self.assertEqual(self.detail(1000, reader), 'Caught up')
+
+    def test_replica_choice(self):
+        self.assertEqual([replicas.monitor.choose(['a', 'b'], 'round_robin') for _ in range(4)].count('a'), 2)
+        replicas.monitor.record('a', 0.050)
+        replicas.monitor.record('b', 0.002)
+        picks = [replicas.monitor.choose(['a', 'b'], 'least_latency') for _ in range(replicas.monitor.EXPLORE_EVERY)]
+        self.assertGreater(picks.count('b'), picks.count('a'))
+
+
+# Catalog Import Test
+class ImportCatalogTest(TestCase):
+    """
+    - A small CSV through import_catalog with one validation worker: invalid rows are rejected with ProductSerializer's messages, collections and promotions are created once, the counters bulk_create skips are kept up, and running it again resumes from the checkpoint instead of importing twice.
+    """
+    def test_import(self):
+        Collection.objects.create(title='Shoes')
+        rows = [
+            'title,slug,description,unit_price,inventory,collection,promotions',
+            'Runner,,Fast,49.99,5,Shoes,Launch:0.1',
+            'Walker,walker,,19.50,0,shoes,launch',
+            'Free,free,,0.50,1,Shoes,',
+            'Cap,cap,,9.99,3,Hats,Unknown',
+            'Hat,hat,,12.00,7,Hats,',
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'catalog.csv')
+            with open(path, 'w') as file:
+                file.write('\n'.join(rows) + '\n')
+            call_command('import_catalog', path, '--workers', '1', '--batch-size', '2', stdout=StringIO(), stderr=StringIO())
+            call_command('import_catalog', path, stdout=StringIO())
+
+        self.assertEqual(sorted(Product.objects.values_list('title', flat=True)), ['Hat', 'Runner', 'Walker'])
+        self.assertEqual(Product.objects.get(title='Runner').slug, 'runner')
+        self.assertEqual(dict(Collection.objects.values_list('title', 'products_count')), {'Shoes': 2, 'Hats': 1})
+        launch = Promotion.objects.get(description='Launch')
+        self.assertEqual(launch.product_set.count(), 2)
+        facets = {(facet['value'], facet['count']) for facet in get_facets()['promotion']}
+        self.assertEqual(facets, {(str(launch.id), 2)})
+
+    def test_ids_read_back(self):
+        # Without RETURNING (MySQL) the new ids are read back by slug - an older product with the same slug, or one another import commits meanwhile, must not get the links
+        shoes = Collection.objects.create(title='Shoes')
+        older = Product.objects.create(title='Runner', slug='runner', unit_price=10, inventory=1, collection=shoes)
+        rows = imports.validate_rows(enumerate([
+            {'title': 'Runner', 'slug': 'runner', 'unit_price': '49.99', 'inventory': 5, 'collection': 'Shoes', 'promotions': ['Launch:0.1']},
+            {'title': 'Runner', 'slug': 'runner', 'unit_price': '59.99', 'inventory': 5, 'collection': 'Shoes', 'promotions': []},
+            {'title': 'Walker', 'slug': 'walker', 'unit_price': '19.50', 'inventory': 0, 'collection': 'Shoes', 'promotions': ['Launch:0.1']},
+        ], start=1))
+        bulk_create = Product.objects.bulk_create
+        def concurrent_import(products, **kwargs):
+            created = bulk_create(products, **kwargs)
+            if len(products) > 1:
+                Product.objects.create(title='Walker', slug='walker', unit_price=1, inventory=1, collection=shoes)
+            return created
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False), mock.patch.object(Product.objects, 'bulk_create', concurrent_import):
+            result = imports.load_batch([(number, data) for number, data, errors in rows])
+
+        # The batch couldn't tell the Walkers apart, so it was loaded again one row at a time
+        self.assertEqual((result['created'], result['errors']), (3, []))
+        linked = Product.objects.filter(promotions__description='Launch').order_by('id')
+        self.assertEqual([(product.title, product.unit_price) for product in linked], [('Runner', Decimal('49.99')), ('Walker', Decimal('19.50'))])
+        self.assertFalse(older.promotions.exists())
+
+
+# Query Budget Test
+@override_settings(STORE_ENFORCE_QUERY_BUDGETS=True)
+class QueryBudgetTest(TestCase):
+    """
+    - Every read endpoint is requested with the response cache cold, against enough rows that an N+1 would show. RequestMetricsMiddleware raises QueryBudgetExceeded when a view goes over its entry in STORE_QUERY_BUDGETS.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        promotion = Promotion.objects.create(description='Sale', discount=0.1)
+        tag = Tag.objects.create(label='featured')
+        content_type = ContentType.objects.get_for_model(Product)
+        cls.collections = [Collection.objects.create(title=f'Collection {i}') for i in range(5)]
+        cls.products = []
+        for i in range(30):
+            product = Product.objects.create(
+                title=f'Product {i}', slug=f'product-{i}', description='Budget test product',
+                unit_price=5 + i, inventory=i, collection=cls.collections[i % 5],
+            )
+            product.promotions.add(promotion)
+            TaggedItem.objects.create(tag=tag, content_type=content_type, object_id=product.id)
+            Review.objects.create(product=product, name='Reviewer', description='Budget test review')
+            cls.products.append(product)
+        cls.cart = Cart.objects.create()
+        for product in cls.products[:10]:
+            CartItem.objects.create(cart=cls.cart, product=product, quantity=2)
+        cls.customer = Customer.objects.create(first_name='Budget', last_name='Test', email='budget@test.com', phone='0')
+        for i in range(10):
+            order = Order.objects.create(customer=cls.customer, payment_status=Order.PAYMENT_STATUS_COMPLETE if i % 2 else Order.PAYMENT_STATUS_PENDING)
+            for product in cls.products[i:i + 3]:
+                OrderItem.objects.create(order=order, product=product, quantity=2, unit_price=product.unit_price)
+        cls.staff = User.objects.create_superuser('budget', 'budget@test.com', 'budget')
+
+    def setUp(self):
+        get_backend().clear()
+        product_index.invalidate()
+        metrics.clear()
+
+    def assertWithinBudget(self, name, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        record = metrics.records()[-1]
+        self.assertEqual(record['view'], name)
+        self.assertLessEqual(record['queries'], settings.STORE_QUERY_BUDGETS[name])
+
+    def test_product_endpoints(self):
+        self.assertWithinBudget('product-list', reverse('product-list'))
+        self.assertWithinBudget('product-detail', reverse('product-detail', args=[self.products[0].id]))
+        self.assertWithinBudget('product-list', reverse('product-list') + '?fields=id,title,price_with_tax&expand=collection')
+        self.assertWithinBudget('product-detail', reverse('product-detail', args=[self.products[0].id]) + '?expand=collection')
+        self.assertWithinBudget('product-search', reverse('product-search') + '?q=product')
+        self.assertWithinBudget('product-reviews', reverse('product-reviews', args=[self.products[0].id]))
+        self.assertWithinBudget('async-product-detail', reverse('async-product-detail', args=[self.products[0].id]))
+
+    def test_collection_endpoints(self):
+        self.assertWithinBudget('collection-list', reverse('collection-list'))
+        self.assertWithinBudget('collection-detail', reverse('collection-detail', args=[self.collections[0].id]))
+        self.assertWithinBudget('async-collection-detail', reverse('async-collection-detail', args=[self.collections[0].id]))
+
+    def test_cart_endpoints(self):
+        self.assertWithinBudget('cart-detail', reverse('cart-detail', args=[self.cart.id]))
+
+    def test_customer_endpoints(self):
+        self.client.force_login(self.staff)
+        self.assertWithinBudget('customer-orders', reverse('customer-orders', args=[self.customer.id]) + '?page_size=5')
+
+    def test_analytics_endpoints(self):
+        self.client.force_login(self.staff)
+        self.assertWithinBudget('sales-report', reverse('sales-report'))
+        self.assertWithinBudget('sales-report', reverse('sales-report') + '?group=collection')
+        response = self.client.get(reverse('sales-report') + '?group=collection')
+        self.assertEqual(response.data['totals']['quantity'], 5 * 3 * 2)
+
+    def test_export_endpoints(self):
+        # Streamed after the view returns - counted around the whole body. Per chunk of 4 orders: the orders, their customers, their items
+        self.client.force_login(self.staff)
+        with self.assertNumQueries(2 + 3 * 3):
+            response = self.client.get(reverse('export', args=['orders']) + '?chunk_size=4')
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1 + 10 * 3)
+
+
+# Data Export Test
+class ExportTest(TestCase):
+    """
+    - The product export holds every product once, in id order, with the header and values the CSV promises - whatever the chunk size, the keyset chunks cover the table without gaps or repeats - and the gzip variants decompress to the very same file.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        shoes = Collection.objects.create(title='Shoes, "Outdoor"')
+        sale, clearance = Promotion.objects.create(description='Sale', discount=0.1), Promotion.objects.create(description='Clearance', discount=0.5)
+        for i in range(7):
+            product = Product.objects.create(title=f'Boot {i}, "waterproof"', slug=f'boot-{i}', unit_price=Decimal('10.50') + i, inventory=i, collection=shoes)
+            if i % 2:
+                product.promotions.add(clearance, sale)
+        cls.staff = User.objects.create_superuser('exports', 'exports@test.com', 'exports')
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def download(self, **params):
+        headers = params.pop('headers', {})
+        response = self.client.get(reverse('export', args=['products']), params, **headers)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_matches_products(self):
+        expected = [
+            [str(product.id), product.title, product.slug, str(product.collection_id), product.collection.title, str(product.unit_price), str(product.inventory),
+             timezone.localtime(product.last_update).isoformat(), ';'.join(product.promotions.order_by('id').values_list('description', flat=True))]
+            for product in Product.objects.select_related('collection').order_by('id')
+        ]
+        for chunk_size in (1, 3, 7, 100):
+            with self.subTest(chunk_size=chunk_size):
+                response, body = self.download(chunk_size=chunk_size)
+                rows = list(csv.reader(StringIO(body.decode())))
+                self.assertEqual(rows[0], list(exports.ProductExport.columns))
+                self.assertEqual(rows[1:], expected)
+
+    def test_keyset_chunks_cover_table(self):
+        ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+        queryset = Product.objects.values('id', 'title')
+        for chunk_size in range(1, len(ids) + 2):
+            with self.subTest(chunk_size=chunk_size):
+                chunks = list(iter_keyset_chunks(queryset, chunk_size))
+                self.assertEqual([row['id'] for chunk in chunks for row in chunk], ids)
+                self.assertTrue(all(len(chunk) == chunk_size for chunk in chunks[:-1]))
+                # A filtered selection is walked the same way
+                odd = [row['id'] for chunk in iter_keyset_chunks(queryset.filter(inventory__in=[1, 3, 5]), chunk_size) for row in chunk]
+                self.assertEqual(odd, ids[1:6:2])
+
+    def test_gzip(self):
+        plain_response, plain = self.download(chunk_size=2)
+        self.assertNotIn('Content-Encoding', plain_response)
+
+        response, body = self.download(chunk_size=2, gzip='true')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertTrue(response['Content-Disposition'].endswith('.csv.gz"'))
+        self.assertEqual(gzip.decompress(body), plain)
+
+        response, body = self.download(chunk_size=2, headers={'HTTP_ACCEPT_ENCODING': 'gzip, deflate'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(body), plain)
+
+        response, body = self.download(chunk_size=2, type='ndjson', headers={'HTTP_ACCEPT_ENCODING': 'gzip'})
+        records = [json.loads(line) for line in gzip.decompress(body).decode().splitlines()]
+        self.assertEqual([record['id'] for record in records], list(Product.objects.order_by('id').values_list('id', flat=True)))
+        self.assertEqual(records[1]['promotions'], ['Sale', 'Clearance'])
+
+
+# Keyset Pagination Test
+class KeysetPaginationTest(TestCase):
+    """
+    - The product list walks the catalog in (title, id) order both ways - page by page after the 'next' cursor, and streamed in keyset chunks. A cursor that decodes but holds values of the wrong type is a 404, like any other bad cursor.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        collection = Collection.objects.create(title='Paged')
+        # Repeated titles, so the id has to break the ties
+        for i in range(7):
+            Product.objects.create(title=f'Item {i % 3}', slug=f'item-{i}', unit_price=1, inventory=1, collection=collection)
+        cls.expected = list(Product.objects.order_by('title', 'id').values_list('id', flat=True))
+
+    def setUp(self):
+        get_backend().clear()
+
+    def test_pages_and_stream_agree(self):
+        ids, url = [], reverse('product-list') + '?page_size=3'
+        while url:
+            response = self.client.get(url)
+            ids += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(ids, self.expected)
+
+        # Per chunk of 2: the products and their promotion discounts - 7 rows are 4 chunks, the last one short
+        with self.assertNumQueries(2 * 4):
+            response = self.client.get(reverse('product-list') + '?stream=true&chunk_size=2')
+            streamed = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([item['id'] for item in streamed], self.expected)
+
+    def test_cursor_with_wrong_types(self):
+        paginator = KeysetPagination()
+        for values in (['Item 0', 'abc'], ['Item 0', None], [['Item 0'], 1], ['Item 0', {'id': 1}]):
+            response = self.client.get(reverse('product-list') + '?cursor=' + paginator.encode_cursor(values))
+            self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('product-list') + '?cursor=' + paginator.encode_cursor(['Item 0', str(self.expected[0])]))
+        self.assertEqual(response.status_code, 200)
+
+
+# Async Product List Test
+class AsyncProductListTest(TestCase):
+    """
+    - The async product list streams exactly what the sync one streams with ?stream=true - the same rows in the same (title, id) order, filters, ?fields= and ?expand= included - and turns a bad filter or field selection into the same 400.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        shoes, hats = Collection.objects.create(title='Shoes'), Collection.objects.create(title='Hats')
+        promotion = Promotion.objects.create(description='Sale', discount=0.25)
+        tag = Tag.objects.create(label='featured')
+        content_type = ContentType.objects.get_for_model(Product)
+        for i in range(7):
+            product = Product.objects.create(title=f'Item {i % 3}', slug=f'item-{i}', unit_price=10 + i, inventory=i, collection=shoes if i % 2 else hats)
+            if i % 3 == 0:
+                product.promotions.add(promotion)
+                TaggedItem.objects.create(tag=tag, content_type=content_type, object_id=product.id)
+        cls.hats = hats
+
+    def setUp(self):
+        get_backend().clear()
+
+    def async_get(self, params):
+        # Drains the async iterator Django 4.2 hands back for an async view's streamed body
+        async def fetch():
+            response = await self.async_client.get(reverse('async-product-list'), params)
+            if not response.streaming:
+                return response.status_code, response.content
+            return response.status_code, b''.join([chunk async for chunk in response.streaming_content])
+        return async_to_sync(fetch)()
+
+    def sync_get(self, params):
+        response = self.client.get(reverse('product-list'), {**params, 'stream': 'true'})
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response.status_code, body
+
+    def test_matches_sync_stream(self):
+        for params, count in (
+            ({}, 7),
+            ({'chunk_size': 2}, 7),
+            ({'collection': self.hats.id, 'chunk_size': 3}, 4),
+            ({'fields': 'id,title,price_with_tax', 'chunk_size': 2}, 7),
+            ({'expand': 'collection,tags,likes_count', 'chunk_size': 2}, 7),
+            ({'fields': 'id,tags', 'price_min': 12}, 5),
+        ):
+            with self.subTest(params=params):
+                status, body = self.async_get(params)
+                sync_status, sync_body = self.sync_get(params)
+                self.assertEqual((status, sync_status), (200, 200))
+                data = json.loads(body)
+                self.assertEqual(data, json.loads(sync_body))
+                self.assertEqual(len(data), count)
+                self.assertEqual(len({item['id'] for item in data}), count)
+        self.assertEqual([item['tags'] for item in json.loads(self.async_get({'fields': 'id,tags'})[1]) if item['tags']], [['featured']] * 3)
+
+    def test_bad_requests(self):
+        for params in ({'fields': 'id,nope'}, {'expand': 'nope'}, {'price_min': 'cheap'}, {'price': 'nope'}):
+            with self.subTest(params=params):
+                status, body = self.async_get(params)
+                self.assertEqual(status, 400)
+                sync_status, sync_body = self.sync_get(params)
+                self.assertEqual((sync_status, json.loads(sync_body)), (400, json.loads(body)))
+
+
+# Compiled Serializer Test
+class CompiledSerializerTest(TestCase):
+    """
+    - The compiled serializers render the very same JSON bytes as the DRF serializers they stand in for - products with and without promotions, reviews and a description, in more than one collection, with and without ?fields= / ?expand=.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        sale = Promotion.objects.create(description='Sale', discount=0.15)
+        clearance = Promotion.objects.create(description='Clearance', discount=1 / 3)
+        collections = [Collection.objects.create(title='Plain'), Collection.objects.create(title='Ünïcode "quoted"')]
+        for i, unit_price in enumerate(map(Decimal, ['1.00', '9.99', '10.05', '123.45', '999.99', '33.33'])):
+            product = Product.objects.create(
+                title=f'Product {i}', slug=f'product-{i}', description=None if i % 2 else f'Description {i}',
+                unit_price=unit_price, inventory=i, collection=collections[i % 2],
+            )
+            if i % 3 == 1:
+                product.promotions.add(sale)
+            if i % 3 == 2:
+                product.promotions.add(sale, clearance)
+            for _ in range(i % 3):
+                Review.objects.create(product=product, name='Reviewer', description='Review')
+
+    def assertSameJSON(self, selection={}):
+        renderer = JSONRenderer()
+        products = Product.objects.select_related('collection', 'review_summary').order_by('id')
+        expected = renderer.render(ProductSerializer(products, many=True, **selection).data)
+        compiled = CompiledProductSerializer.select(**selection)
+        rows = Product.objects.order_by('id').values(*compiled.columns())
+        self.assertEqual(renderer.render(compiled.serialize(rows)), expected)
+
+    def test_products(self):
+        self.assertSameJSON()
+        self.assertSameJSON({'fields': ('id', 'title', 'effective_price'), 'expand': ()})
+        self.assertSameJSON({'fields': None, 'expand': ('collection',)})
+
+    def test_collections_and_orders(self):
+        renderer = JSONRenderer()
+        collections = Collection.objects.order_by('id')
+        self.assertEqual(
+            renderer.render(CompiledCollectionSerializer.serialize(collections.values(*CompiledCollectionSerializer.columns()))),
+            renderer.render(CollectionSerializer(collections, many=True).data),
+        )
+        customer = Customer.objects.create(first_name='Compiled', last_name='Test', email='compiled@test.com', phone='0')
+        order = Order.objects.create(customer=customer)
+        for product in Product.objects.all()[:3]:
+            OrderItem.objects.create(order=order, product=product, quantity=3, unit_price=product.unit_price)
+        orders = Order.objects.order_by('id')
+        self.assertEqual(
+            renderer.render(CompiledOrderSerializer.serialize(orders.values(*CompiledOrderSerializer.columns()))),
+            renderer.render(OrderSerializer(orders, many=True).data),
+        )
+
+
+# Response Cache Test
+class ResponseCacheTest(TestCase):
+    """
+    - A cached product list or detail is answered without touching the database until a write to a model it depends on commits - not before the commit, so a reader can't cache the old rows under the new version.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.collection = Collection.objects.create(title='Cached')
+        cls.product = Product.objects.create(title='Original', slug='original', unit_price=10, inventory=1, collection=cls.collection)
+
+    def setUp(self):
+        get_backend().clear()
+        self.urls = [reverse('product-list'), reverse('product-detail', args=[self.product.id])]
+
+    def assertTitles(self, titles):
+        list_response, detail_response = [self.client.get(url) for url in self.urls]
+        self.assertEqual([item['title'] for item in list_response.json()['results']], titles)
+        if titles:
+            self.assertEqual(detail_response.json()['title'], titles[0])
+        else:
+            self.assertEqual(detail_response.status_code, 404)
+
+    def test_write_invalidates_after_commit(self):
+        self.assertTitles(['Original'])
+        with self.assertNumQueries(0):
+            self.assertTitles(['Original'])
+
+        versions = get_backend().get_versions(['product'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.title = 'Renamed'
+            self.product.save()
+            self.assertEqual(get_backend().get_versions(['product']), versions)
+        self.assertTitles(['Renamed'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        self.assertTitles([])
+
+    def test_related_write_invalidates(self):
+        self.client.get(self.urls[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.promotions.add(Promotion.objects.create(description='Sale', discount=0.5))
+        self.assertEqual(self.client.get(self.urls[0]).json()['results'][0]['effective_price'], 5.0)
+
+    def test_collection_rename_invalidates(self):
+        # ?expand=collection puts the collection's title into the product responses
+        urls = [url + '?expand=collection' for url in self.urls]
+        self.assertEqual(self.client.get(urls[1]).json()['collection']['title'], 'Cached')
+        self.assertEqual(self.client.get(urls[0]).json()['results'][0]['collection']['title'], 'Cached')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.collection.title = 'Renamed'
+            self.collection.save()
+        self.assertEqual(self.client.get(urls[1]).json()['collection']['title'], 'Renamed')
+        self.assertEqual(self.client.get(urls[0]).json()['results'][0]['collection']['title'], 'Renamed')
+
+
+# Products Count Test
+class ProductsCountTest(TestCase):
+    """
+    - Collection.products_count follows every create, move and delete (queryset deletes too) without a COUNT, and reconcile_products_count repairs a counter that has drifted anyway, cached collection responses included.
+    """
+    def counts(self):
+        return dict(Collection.objects.values_list('title', 'products_count'))
+
+    def test_counter_follows_writes(self):
+        shoes = Collection.objects.create(title='Shoes')
+        hats = Collection.objects.create(title='Hats')
+        products = [Product.objects.create(title=f'Shoe {i}', slug=f'shoe-{i}', unit_price=10, inventory=1, collection=shoes) for i in range(3)]
+        self.assertEqual(self.counts(), {'Shoes': 3, 'Hats': 0})
+
+        products[0].collection = hats
+        products[0].save()
+        # Saved again without a move - counted once
+        products[0].save()
+        self.assertEqual(self.counts(), {'Shoes': 2, 'Hats': 1})
+
+        # A deferred collection can't be compared, and a product loaded that way must not be counted twice
+        product = Product.objects.only('title').get(id=products[1].id)
+        product.title = 'Renamed'
+        product.save()
+        self.assertEqual(self.counts(), {'Shoes': 2, 'Hats': 1})
+
+        products[1].delete()
+        Product.objects.filter(collection=hats).delete()
+        self.assertEqual(self.counts(), {'Shoes': 1, 'Hats': 0})
+
+    def test_reconcile(self):
+        shoes = Collection.objects.create(title='Shoes')
+        Product.objects.create(title='Shoe', slug='shoe', unit_price=10, inventory=1, collection=shoes)
+        Collection.objects.filter(id=shoes.id).update(products_count=7)
+
+        get_backend().clear()
+        url = reverse('collection-detail', args=[shoes.id])
+        self.assertEqual(self.client.get(url).json()['products_count'], 7)
+
+        call_command('reconcile_products_count', '--dry-run', stdout=StringIO())
+        self.assertEqual(self.counts(), {'Shoes': 7})
+        call_command('reconcile_products_count', stdout=StringIO())
+        self.assertEqual(self.counts(), {'Shoes': 1})
+        # The cached response is retired with the fix
+        self.assertEqual(self.client.get(url).json()['products_count'], 1)
+
+
+# Bulk Product Test
+class BulkProductTest(TestCase):
+    """
+    - One /store/products/bulk/ request creates, updates, moves and deletes products with a fixed number of queries, rejects the invalid items by position (and deletes of missing or ordered products by id) without stopping the rest, and leaves products_count and the facet counts as if every product had been saved one by one.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.shoes = Collection.objects.create(title='Shoes')
+        cls.hats = Collection.objects.create(title='Hats')
+        cls.products = [Product.objects.create(title=f'Shoe {i}', slug=f'shoe-{i}', unit_price=Decimal('20.00'), inventory=5, collection=cls.shoes) for i in range(4)]
+        customer = Customer.objects.create(first_name='Bulk', last_name='Test', email='bulk@test.com', phone='0')
+        order = Order.objects.create(customer=customer)
+        OrderItem.objects.create(order=order, product=cls.products[3], quantity=1, unit_price=Decimal('20.00'))
+
+    def setUp(self):
+        get_backend().clear()
+
+    def post(self, body):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('product-bulk'), body, content_type='application/json')
+
+    def test_batch(self):
+        new = {'title': 'Cap', 'slug': 'cap', 'unit_price': '75.00', 'inventory': 0, 'collection': self.hats.id}
+        moved = {'id': self.products[0].id, 'title': 'Moved', 'slug': 'moved', 'unit_price': '120.00', 'inventory': 50, 'collection': self.hats.id}
+        response = self.post({
+            'upsert': [new, {**new, 'unit_price': '0.10'}, moved, {**new, 'collection': 999}, {**moved, 'id': 999}],
+            'delete': [self.products[1].id, self.products[3].id, 999],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['deleted']), (1, 1, 1))
+        self.assertEqual([error.get('index', error.get('delete')) for error in response.data['errors']], [1, 3, 4, self.products[3].id, 999])
+        self.assertEqual(response.data['errors'][-1]['errors'], ['Product 999 does not exist.'])
+
+        self.assertEqual(Product.objects.get(id=self.products[0].id).collection_id, self.hats.id)
+        self.assertFalse(Product.objects.filter(id=self.products[1].id).exists())
+        self.assertEqual(dict(Collection.objects.values_list('title', 'products_count')), {'Shoes': 2, 'Hats': 2})
+        self.assertEqual(get_facets(), rebuilt_facets())
+        # The list shows the batch straight away - the version was bumped when it committed
+        titles = [item['title'] for item in self.client.get(reverse('product-list')).json()['results']]
+        self.assertEqual(titles, ['Cap', 'Moved', 'Shoe 2', 'Shoe 3'])
+
+    def test_queries_dont_grow_with_batch(self):
+        def items(count):
+            return [{'title': f'Item {i}', 'slug': f'item-{i}', 'unit_price': '5.00', 'inventory': 1, 'collection': self.shoes.id} for i in range(count)]
+
+        # The first batch creates the facet rows it touches
+        self.post({'upsert': items(1)})
+        with CaptureQueriesContext(connection) as small:
+            self.post({'upsert': items(2)})
+        with CaptureQueriesContext(connection) as large:
+            self.post({'upsert': items(40)})
+        self.assertEqual(len(large), len(small))
+
+
+# Facet Count Test
+class FacetCountTest(TestCase):
+    """
+    - The FacetCount rows follow product saves and deletes, promotion links added and removed from either side, and tags - after every step they match what rebuild_facets counts from scratch - and every facet value works as a filter that selects exactly that many products. A rebuild retires the cached product lists that show the counts.
+    """
+    def assertFacetsKept(self):
+        counted = get_facets()
+        self.assertEqual(counted, rebuilt_facets())
+        for dimension, values in counted.items():
+            for facet in values:
+                response = self.client.get(reverse('product-list'), {dimension: facet['value'], 'page_size': 1000})
+                self.assertEqual(len(response.json()['results']), facet['count'], (dimension, facet))
+
+    def test_counts_follow_writes(self):
+        get_backend().clear()
+        shoes = Collection.objects.create(title='Shoes')
+        hats = Collection.objects.create(title='Hats')
+        sale = Promotion.objects.create(description='Sale', discount=0.1)
+        clearance = Promotion.objects.create(description='Clearance', discount=0.5)
+        tag = Tag.objects.create(label='featured')
+        content_type = ContentType.objects.get_for_model(Product)
+        products = [
+            Product.objects.create(title=f'Product {i}', slug=f'product-{i}', unit_price=Decimal(price), inventory=inventory, collection=shoes)
+            for i, (price, inventory) in enumerate([('5.00', 0), ('25.00', 3), ('75.00', 30), ('150.00', 12)])
+        ]
+        self.assertFacetsKept()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            products[0].unit_price, products[0].inventory, products[0].collection = Decimal('60.00'), 9, hats
+            products[0].save()
+            products[1].promotions.add(sale, clearance)
+            clearance.product_set.add(products[2], products[3])
+            products[1].promotions.remove(sale, Promotion(id=999))
+            clearance.product_set.remove(products[3])
+            products[2].promotions.clear()
+            for product in products[:3]:
+                TaggedItem.objects.create(tag=tag, content_type=content_type, object_id=product.id)
+        self.assertFacetsKept()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            products[1].delete()
+            TaggedItem.objects.filter(object_id=products[0].id).delete()
+            sale.delete()
+        self.assertFacetsKept()
+
+    def test_rebuild_retires_cached_lists(self):
+        get_backend().clear()
+        shoes = Collection.objects.create(title='Shoes')
+        Product.objects.create(title='Shoe', slug='shoe', unit_price=10, inventory=1, collection=shoes)
+        FacetCount.objects.filter(dimension='collection').update(count=9)
+
+        def collection_counts():
+            return [facet['count'] for facet in self.client.get(reverse('product-list')).json()['facets']['collection']]
+        self.assertEqual(collection_counts(), [9])
+        call_command('rebuild_facets', stdout=StringIO())
+        self.assertEqual(collection_counts(), [1])
+
+
+# Product Search Test
+class ProductSearchTest(TestCase):
+    """
+    - BM25 ranking over the search index: title words outweigh description words, exact words outweigh prefixes, and every query word counts. Saved and deleted products show up and drop out straight away, and an index in another process - whose signals never ran - catches up through the search version. Writes outside the search documents (inventory, checkouts) rebuild nothing.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.collection = Collection.objects.create(title='Computers')
+        cls.laptop = Product.objects.create(title='Gaming laptop', slug='gaming-laptop', description='Fast', unit_price=900, inventory=1, collection=cls.collection)
+        cls.bag = Product.objects.create(title='Bag', slug='bag', description='Fits any laptop', unit_price=50, inventory=1, collection=cls.collection)
+        cls.lap_desk = Product.objects.create(title='Lap desk', slug='lap-desk', description='Wooden', unit_price=30, inventory=1, collection=cls.collection)
+
+    def setUp(self):
+        get_backend().clear()
+        product_index.invalidate()
+
+    def search(self, query, index=product_index):
+        return [product_id for product_id, score in index.search(query)]
+
+    def test_ranking(self):
+        self.assertEqual(self.search('laptop'), [self.laptop.id, self.bag.id])
+        # "lap" is a whole word of the desk and a prefix of the laptop's title word
+        self.assertEqual(self.search('lap')[:2], [self.lap_desk.id, self.laptop.id])
+        self.assertEqual(self.search('gaming laptop')[0], self.laptop.id)
+        self.assertCountEqual(self.search('computers'), [self.laptop.id, self.bag.id, self.lap_desk.id])
+        self.assertEqual(self.search('nothing'), [])
+
+        response = self.client.get(reverse('product-search'), {'q': 'laptop', 'fields': 'id,title'})
+        self.assertEqual([(item['id'], set(item)) for item in response.data['results']], [(self.laptop.id, {'id', 'title', 'score'}), (self.bag.id, {'id', 'title', 'score'})])
+
+    def test_writes_show_up(self):
+        self.search('laptop')
+        with self.captureOnCommitCallbacks(execute=True):
+            stand = Product.objects.create(title='Laptop stand', slug='laptop-stand', unit_price=20, inventory=1, collection=self.collection)
+        self.assertIn(stand.id, self.search('laptop'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bag.description = 'Fits a tablet'
+            self.bag.save()
+            stand.delete()
+        self.assertEqual(self.search('laptop'), [self.laptop.id])
+        self.assertEqual(self.search('tablet'), [self.bag.id])
+
+    def test_other_process_catches_up(self):
+        other = ProductSearchIndex()
+        self.assertEqual(self.search('laptop', other), [self.laptop.id, self.bag.id])
+        # Only this process's product_index hears the signals
+        with self.captureOnCommitCallbacks(execute=True):
+            self.laptop.delete()
+        self.assertEqual(self.search('laptop', other), [self.bag.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.collection.title = 'Notebooks'
+            self.collection.save()
+        self.assertCountEqual(self.search('notebooks', other), [self.bag.id, self.lap_desk.id])
+
+        with override_settings(STORE_SEARCH_INDEX_MAX_AGE=0):
+            Product.objects.filter(id=self.bag.id).update(title='Backpack')
+            self.assertEqual(self.search('backpack', other), [self.bag.id])
+
+    def test_rebuilds_only_for_documents(self):
+        other = ProductSearchIndex()
+        for index in (product_index, other):
+            self.search('laptop', index)
+        customer = Customer.objects.create(first_name='Search', last_name='Test', email='search@test.com', phone='0')
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=self.bag, quantity=1)
+        with mock.patch.object(product_index, 'build', wraps=product_index.build) as build, mock.patch.object(other, 'build', wraps=other.build) as other_build:
+            # Inventory isn't in the search document - neither a save nor a checkout moves the search version
+            with self.captureOnCommitCallbacks(execute=True):
+                self.laptop.inventory = 5
+                self.laptop.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                checkout(cart.id, customer.id)
+            self.assertEqual(self.search('laptop', other), [self.laptop.id, self.bag.id])
+
+            # A tag is - this process refreshes the one product, the other one rebuilds
+            with self.captureOnCommitCallbacks(execute=True):
+                TaggedItem.objects.create(tag=Tag.objects.create(label='portable'), content_type=ContentType.objects.get_for_model(Product), object_id=self.lap_desk.id)
+            self.assertEqual(self.search('portable'), [self.lap_desk.id])
+            self.assertEqual(self.search('portable', other), [self.lap_desk.id])
+            self.assertEqual((build.call_count, other_build.call_count), (0, 1))
+
+
+# Cart Store Test
+class CartStoreTest(TestCase):
+    """
+    - Adding a product twice adds up its quantity in both cart stores, up to MAX_QUANTITY. The hot store writes a cart back to the table on every flush - the second flush of the same cart updates the rows the first one inserted and deletes the removed ones.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        collection = Collection.objects.create(title='Carts')
+        cls.products = [Product.objects.create(title=f'Product {i}', slug=f'product-{i}', unit_price=10, inventory=100, collection=collection) for i in range(3)]
+
+    def table(self, cart):
+        return dict(CartItem.objects.filter(cart=cart).values_list('product_id', 'quantity'))
+
+    def test_database_store_adds_up(self):
+        cart_id = self.client.post(reverse('cart-create')).data['id']
+        for quantity in (2, 3):
+            response = self.client.post(reverse('cart-items', args=[cart_id]), {'product_id': self.products[0].id, 'quantity': quantity})
+        self.assertEqual([(line['product']['id'], line['quantity']) for line in response.data['items']], [(self.products[0].id, 5)])
+        self.assertEqual(self.table(cart_id), {self.products[0].id: 5})
+
+    def test_hot_store_flushes_twice(self):
+        store = HotCartStore(client='store.carts.InMemoryKV')
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=self.products[2], quantity=1)
+        first, second, third = (product.id for product in self.products)
+
+        store.add_item(cart.id, first, 2)
+        store.add_item(cart.id, first, 3)
+        store.add_item(cart.id, second, 1)
+        self.assertEqual(store.flush(), 1)
+        self.assertEqual(self.table(cart), {first: 5, second: 1, third: 1})
+
+        store.set_item(cart.id, first, 7)
+        store.remove_item(cart.id, third)
+        self.assertEqual(store.flush(cart.id), 1)
+        self.assertEqual(self.table(cart), {first: 7, second: 1})
+        # Nothing changed since - nothing to write
+        self.assertEqual(store.flush(), 0)
+
+    def test_quantity_is_capped(self):
+        product_id = self.products[0].id
+        for store in (DatabaseCartStore(), HotCartStore(client='store.carts.InMemoryKV')):
+            with self.subTest(store=type(store).__name__):
+                cart = Cart.objects.create()
+                for quantity in (MAX_QUANTITY - 1, 5, MAX_QUANTITY):
+                    store.add_item(cart.id, product_id, quantity)
+                self.assertEqual(store.get_items(cart.id), {product_id: MAX_QUANTITY})
+                store.flush(cart.id)
+                self.assertEqual(self.table(cart), {product_id: MAX_QUANTITY})
+
+    def test_conflict_target(self):
+        store = HotCartStore(client='store.carts.InMemoryKV')
+        # MySQL takes no conflict target, PostgreSQL and SQLite need one
+        for supported, expected in ((False, {}), (True, {'unique_fields': ['cart', 'product']})):
+            with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', supported):
+                self.assertEqual(store._conflict_target(), expected)
+
+
+# Cart Sweeper Test
+class CartSweeperTest(TestCase):
+    """
+    - sweep_carts deletes the carts older than the maximum age with their items - chunk by chunk, each chunk in its own transaction - leaves younger carts alone, forgets the swept carts in the hot store, and with --dry-run only counts.
+    """
+    def test_sweep(self):
+        collection = Collection.objects.create(title='Sweep')
+        product = Product.objects.create(title='Swept', slug='swept', unit_price=10, inventory=1, collection=collection)
+        carts = [Cart.objects.create() for _ in range(5)]
+        for cart in carts:
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+        expired = carts[:3]
+        Cart.objects.filter(id__in=[cart.id for cart in expired]).update(created_at=timezone.now() - timedelta(days=10))
+        store = HotCartStore(client='store.carts.InMemoryKV')
+        store.add_item(expired[0].id, product.id, 1)
+
+        output = StringIO()
+        call_command('sweep_carts', '--days', '7', '--chunk-size', '2', '--sleep', '0', '--dry-run', stdout=output)
+        self.assertIn('Would delete 3 carts and 3 items', output.getvalue())
+        self.assertEqual(Cart.objects.count(), 5)
+
+        with mock.patch('store.carts._store', store):
+            reports = list(sweep_expired_carts(timedelta(days=7), chunk_size=2, pause=0))
+        self.assertEqual([(report['chunk'], report['carts'], report['items']) for report in reports], [(1, 2, 2), (2, 1, 1)])
+        self.assertCountEqual(Cart.objects.values_list('id', flat=True), [cart.id for cart in carts[3:]])
+        self.assertEqual(CartItem.objects.count(), 2)
+        self.assertFalse(store.kv.exists(store._key(expired[0].id)))
+
+    def test_walks_creation_order(self):
+        # Carts created at the same moment are told apart by id - every expired cart is in exactly one chunk, the younger ones in none
+        now = timezone.now()
+        ages = [12, 10, 10, 10, 8, 1]
+        for age in ages:
+            Cart.objects.filter(id=Cart.objects.create().id).update(created_at=now - timedelta(days=age))
+        for chunk_size in (1, 2, 10):
+            with self.subTest(chunk_size=chunk_size):
+                reports = list(sweep_expired_carts(timedelta(days=7), chunk_size=chunk_size, pause=0, dry_run=True))
+                self.assertEqual(sum(report['carts'] for report in reports), 5)
+                self.assertEqual(len(reports), -(-5 // chunk_size))
+        self.assertEqual(sum(report['carts'] for report in sweep_expired_carts(timedelta(days=7), chunk_size=2, pause=0)), 5)
+        self.assertEqual(Cart.objects.count(), 1)
+
+
+# Generic Relation Lookup Test
+class GenericRelationLookupTest(TestCase):
+    """
+    - The tags and likes of a whole list of products come with one query each, whether the products are given as a queryset, instances or ids, and however many there are - in the product responses too (?expand=tags,likes_count).
+    """
+    @classmethod
+    def setUpTestData(cls):
+        collection = Collection.objects.create(title='Tagged')
+        cls.products = [Product.objects.create(title=f'Product {i}', slug=f'product-{i}', unit_price=10, inventory=1, collection=collection) for i in range(20)]
+        tags = [Tag.objects.create(label=label) for label in ('new', 'sale')]
+        content_type = ContentType.objects.get_for_model(Product)
+        cls.user = User.objects.create_user('liker')
+        for i, product in enumerate(cls.products):
+            for tag in tags[:i % 3]:
+                TaggedItem.objects.create(tag=tag, content_type=content_type, object_id=product.id)
+            if i % 2:
+                LikedItem.objects.create(user=cls.user, content_type=content_type, object_id=product.id)
+        apply_deltas({(content_type.id, product.id): 1 for product in cls.products[1::2]})
+
+    def test_one_query_each(self):
+        ContentType.objects.get_for_model(Product)
+        # A page (a sliced queryset) is read into ids first - MySQL can't run a LIMIT inside IN (...)
+        for products, queries in ((self.products[:3], 1), (self.products, 1), ([product.id for product in self.products], 1), (Product.objects.all(), 1), (Product.objects.order_by('id')[:5], 2)):
+            with self.assertNumQueries(queries):
+                labels = TaggedItem.objects.for_objects(products, model=Product).labels_by_object()
+            with self.assertNumQueries(queries):
+                likes = LikedItem.objects.for_objects(products, model=Product).values_list('object_id', flat=True)
+                self.assertTrue(set(likes) <= {product.id for product in self.products[1::2]})
+        self.assertEqual(labels[self.products[2].id], ['new', 'sale'])
+        self.assertNotIn(self.products[0].id, labels)
+
+        ids = [product.id for product in self.products]
+        with self.assertNumQueries(1):
+            counts = like_counts(Product, ids)
+        self.assertEqual(counts, {product.id: i % 2 for i, product in enumerate(self.products)})
+
+    def test_product_responses(self):
+        # ?expand=tags,likes_count costs one query each, however many products the page holds
+        expected = {product.id: (['new', 'sale'][:i % 3], i % 2) for i, product in enumerate(self.products)}
+        queries = []
+        for page_size in (5, 20):
+            get_backend().clear()
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(reverse('product-list'), {'expand': 'tags,likes_count', 'page_size': page_size})
+            queries.append(len(context))
+            self.assertEqual(len(response.data['results']), page_size)
+            self.assertEqual({item['id']: (item['tags'], item['likes_count']) for item in response.data['results']}, {item['id']: expected[item['id']] for item in response.data['results']})
+        self.assertEqual(queries[0], queries[1])
+
+        get_backend().clear()
+        product = self.products[5]
+        data = self.client.get(reverse('product-detail', args=[product.id]), {'fields': 'id,title', 'expand': 'tags,likes_count'}).json()
+        self.assertEqual(data, {'id': product.id, 'title': product.title, 'tags': ['new', 'sale'], 'likes_count': 1})
+        self.assertEqual(self.client.get(reverse('async-product-detail', args=[product.id]), {'fields': 'id,title', 'expand': 'tags,likes_count'}).json(), data)
+        self.assertNotIn('tags', self.client.get(reverse('product-detail', args=[product.id])).json())
+
+
+# Like Counter Test
+class LikeCounterTest(TestCase):
+    """
+    - Liking and unliking are idempotent - a second POST or DELETE changes neither the likes nor the count. A flush writes the pending deltas to LikeCount and skips the objects deleted in the meantime; a failed flush in the background thread is logged and its deltas kept.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        collection = Collection.objects.create(title='Liked')
+        cls.products = [Product.objects.create(title=f'Product {i}', slug=f'product-{i}', unit_price=10, inventory=1, collection=collection) for i in range(2)]
+        cls.content_type = ContentType.objects.get_for_model(Product)
+
+    def setUp(self):
+        # A counter of the test's own, flushed by hand
+        self.counter = ShardedCounter(interval=0)
+        for target in ('likes.counters.counters', 'likes.views.counters'):
+            patcher = mock.patch(target, self.counter)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def stored(self):
+        return dict(LikeCount.objects.values_list('object_id', 'count'))
+
+    def test_idempotent(self):
+        self.client.force_login(User.objects.create_user('liker'))
+        url = reverse('like', args=['store', 'product', self.products[0].id])
+        # The count moves once the request's transaction commits - read it back with a GET
+        for expected_status in (201, 200):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.client.post(url).status_code, expected_status)
+            self.assertEqual(self.client.get(url).data, {'object_id': self.products[0].id, 'liked': True, 'likes_count': 1})
+        self.assertEqual(self.counter.flush(), 1)
+        self.assertEqual(self.stored(), {self.products[0].id: 1})
+
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.client.delete(url).status_code, 200)
+            self.assertEqual(self.client.get(url).data, {'object_id': self.products[0].id, 'liked': False, 'likes_count': 0})
+        self.counter.flush()
+        self.assertEqual(self.stored(), {self.products[0].id: 0})
+        self.assertFalse(LikedItem.objects.exists())
+
+    def test_flush(self):
+        kept, deleted = self.products
+        self.counter.add(self.content_type.id, kept.id, 2)
+        self.counter.add(self.content_type.id, deleted.id, 1)
+        deleted.delete()
+        self.assertEqual(self.counter.flush(), 2)
+        self.assertEqual(self.stored(), {kept.id: 2})
+        self.assertEqual(self.counter.flush(), 0)
+
+    def test_failed_flush_is_logged(self):
+        self.counter.add(self.content_type.id, self.products[0].id, 1)
+        self.counter.interval = 0.001
+        def fail(deltas):
+            self.counter._stopped.set()
+            raise OperationalError('gone away')
+        # The thread closes its connection after each round - not the test's
+        with mock.patch('likes.counters.apply_deltas', fail), mock.patch('likes.counters.connection'):
+            with self.assertLogs('likes.counters', 'ERROR'):
+                self.counter._run()
+        self.assertEqual(self.counter.pending(self.content_type.id, [self.products[0].id]), {self.products[0].id: 1})
+
+
+# Review Summary Test
+class ReviewSummaryTest(TestCase):
+    """
+    - ReviewSummary follows every review added and removed - count and latest date - and the product responses read reviews_count from it. rebuild_review_summaries repairs a summary that has drifted anyway.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        collection = Collection.objects.create(title='Reviewed')
+        cls.product = Product.objects.create(title='Reviewed', slug='reviewed', unit_price=10, inventory=1, collection=collection)
+
+    def setUp(self):
+        get_backend().clear()
+
+    def summary(self):
+        return tuple(ReviewSummary.objects.filter(product=self.product).values_list('reviews_count', 'last_review_date').first() or ())
+
+    def reviews_count(self):
+        return self.client.get(reverse('product-detail', args=[self.product.id])).json()['reviews_count']
+
+    def test_follows_reviews(self):
+        self.assertEqual((self.summary(), self.reviews_count()), ((), 0))
+        url = reverse('product-reviews', args=[self.product.id])
+        for name in ('First', 'Second'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.client.post(url, {'name': name, 'description': 'Fine'}).status_code, 201)
+        # auto_now_add dates a review with date.today()
+        today = date.today()
+        self.assertEqual((self.summary(), self.reviews_count()), ((2, today), 2))
+
+        # Removing the latest review moves the date back to the one before it
+        first, second = Review.objects.filter(product=self.product).order_by('id')
+        Review.objects.filter(id=first.id).update(date=today - timedelta(days=3))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual((self.summary(), self.reviews_count()), ((1, today - timedelta(days=3)), 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual((self.summary(), self.reviews_count()), ((0, None), 0))
+
+    def test_rebuild(self):
+        for name in ('First', 'Second', 'Third'):
+            Review.objects.create(product=self.product, name=name, description='Fine')
+        ReviewSummary.objects.filter(product=self.product).update(reviews_count=7, last_review_date=None)
+        call_command('rebuild_review_summaries', stdout=StringIO())
+        self.assertEqual(self.summary(), (3, date.today()))
+        self.assertEqual(self.reviews_count(), 3)
+
+
+# Pricing Test
+class PricingTest(TestCase):
+    """
+    - The fixed-point path (quote_cents - NumPy, and plain ints without it) gives exactly the Decimal path's amounts over a seeded batch of random prices and discounts. A discount outside 0..1 is rejected by the model's validators, converted by migration 0012 when it is a legacy percentage, and ignored by pricing when one gets in anyway.
+    """
+    def test_paths_agree(self):
+        rng = random.Random(16)
+        size = 20000
+        # unit_price has 6 digits, 2 of them decimal places
+        unit_prices = [Decimal(rng.randint(0, 999999)).scaleb(-2) for _ in range(size)]
+        discounts = [rng.choice([0, 0.05, 0.15, 1 / 3, 0.999999, 1, rng.random()]) for _ in range(size)]
+        expected = [
+            [int(amount.scaleb(2)) for amount in column]
+            for column in zip(*((price.unit_price, price.discount, price.effective_price, price.tax, price.price_with_tax) for price in pricing.quote_many(unit_prices, discounts)))
+        ]
+        paths = [None]
+        if pricing.np is not None:
+            paths.append(pricing.np)
+        for np in paths:
+            with self.subTest(numpy=np is not None), mock.patch.object(pricing, 'np', np):
+                columns = pricing.quote_cents(unit_prices, discounts)
+                self.assertEqual([list(map(int, column)) for column in columns], expected)
+                self.assertEqual(pricing.quote_floats(unit_prices, discounts), [tuple(cents / 100 for cents in row) for row in zip(*expected[1:])])
+
+    def test_out_of_range_discount(self):
+        for discount in (-0.1, 1.5):
+            with self.subTest(discount=discount):
+                with self.assertRaises(ValidationError):
+                    Promotion(description='Broken', discount=discount).full_clean()
+                with self.assertLogs('store.pricing', 'WARNING'):
+                    self.assertEqual(pricing.quote_decimal(Decimal('10.00'), discount).discount, 0)
+                self.assertEqual([int(column[0]) for column in pricing.quote_cents([Decimal('10.00')], [discount])], [1000, 0, 1000, 100, 1100])
+
+        # A legacy row that skipped the validators neither takes the product responses down nor shadows a valid promotion
+        product = Product.objects.create(title='Priced', slug='priced', unit_price=10, inventory=1, collection=Collection.objects.create(title='Priced'))
+        product.promotions.add(Promotion.objects.create(description='Legacy', discount=15), Promotion.objects.create(description='Valid', discount=0.2))
+        for url in (reverse('product-list'), reverse('product-detail', args=[product.id])):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual((response.json().get('results') or [response.json()])[0]['effective_price'], 8.0)
+
+    def test_discount_migration(self):
+        migration = import_module('store.migrations.0012_normalize_promotion_discounts')
+        for discount in (15, 100, 0.3, -2, 250):
+            Promotion.objects.create(description=str(discount), discount=discount)
+        migration.normalize_discounts(django_apps, None)
+        self.assertEqual(dict(Promotion.objects.values_list('description', 'discount')), {'15': 0.15, '100': 1.0, '0.3': 0.3, '-2': 0, '250': 0})
+
+
+# Sales Rollup Test
+class SalesRollupTest(TestCase):
+    """
+    - The rollups kept up by the signals must always equal what rebuild() computes from the orders - through completing an order, moving one of its products to another collection, editing and adding items, and un-completing it. Sales stay with the collection the product was in when it was ordered.
+    """
+    def rollups(self):
+        return {
+            name: sorted(model.objects.values_list('day', field, 'quantity', 'revenue', 'orders_count'))
+            for name, (model, field, source) in analytics.ROLLUPS.items()
+        }
+
+    def assertRebuildAgrees(self):
+        maintained = self.rollups()
+        analytics.rebuild()
+        self.assertEqual(maintained, self.rollups())
+        return maintained
+
+    def test_rollups_match_rebuild(self):
+        shoes, bags = Collection.objects.create(title='Shoes'), Collection.objects.create(title='Bags')
+        boot = Product.objects.create(title='Boot', slug='boot', unit_price=50, inventory=10, collection=shoes)
+        tote = Product.objects.create(title='Tote', slug='tote', unit_price=20, inventory=10, collection=bags)
+        customer = Customer.objects.create(first_name='Roll', last_name='Up', email='rollup@test.com', phone='0')
+        order = Order.objects.create(customer=customer)
+        item = OrderItem.objects.create(order=order, product=boot, quantity=2, unit_price=boot.unit_price)
+        OrderItem.objects.create(order=order, product=tote, quantity=1, unit_price=tote.unit_price)
+        self.assertEqual(self.assertRebuildAgrees(), {'product': [], 'collection': []})
+
+        order.payment_status = Order.PAYMENT_STATUS_COMPLETE
+        order.save()
+        today = timezone.localdate(order.placed_at)
+        self.assertEqual(self.assertRebuildAgrees()['collection'], [(today, shoes.id, 2, Decimal('100.00'), 1), (today, bags.id, 1, Decimal('20.00'), 1)])
+
+        # The boot moves to bags - what it sold before stays in shoes, through an edit of its item too
+        boot.collection = bags
+        boot.save()
+        item.quantity = 3
+        item.save()
+        OrderItem.objects.create(order=order, product=boot, quantity=1, unit_price=boot.unit_price)
+        self.assertEqual(self.assertRebuildAgrees()['collection'], [(today, shoes.id, 3, Decimal('150.00'), 1), (today, bags.id, 2, Decimal('70.00'), 1)])
+
+        order.payment_status = Order.PAYMENT_STATUS_PENDING
+        order.save()
+        self.assertEqual(self.assertRebuildAgrees(), {'product': [], 'collection': []})
+
+
+# Admin Changelist Test
+class AdminChangelistTest(TestCase):
+    """
+    - A FastChangelistMixin changelist runs the same number of queries however many rows the table and the page hold - page_annotations for the page's ids in one query, foreign keys through select_related. A big unfiltered table is counted from the planner's estimate, a searched list exactly.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.collection = Collection.objects.create(title='Admin')
+        cls.staff = User.objects.create_superuser('admin', 'admin@test.com', 'admin')
+        cls.add_rows(0, 3)
+
+    @classmethod
+    def add_rows(cls, start, stop):
+        for i in range(start, stop):
+            Product.objects.create(title=f'Product {i}', slug=f'product-{i}', unit_price=10, inventory=i, collection=cls.collection)
+            customer = Customer.objects.create(first_name=f'First {i}', last_name='Last', email=f'customer{i}@test.com', phone='0')
+            for _ in range(i % 3):
+                Order.objects.create(customer=customer)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in context.captured_queries]
+
+    def test_queries_dont_grow_with_rows(self):
+        urls = [reverse('admin:store_product_changelist'), reverse('admin:store_customer_changelist')]
+        before = [len(self.queries(url)[1]) for url in urls]
+        # Past a full page (list_per_page = 10)
+        self.add_rows(3, 25)
+        self.assertEqual([len(self.queries(url)[1]) for url in urls], before)
+
+        response, _ = self.queries(urls[1])
+        orders = dict(Customer.objects.annotate(count=Count('order')).values_list('id', 'count'))
+        self.assertEqual({customer.id: customer.orders_count for customer in response.context['cl'].result_list}, {customer.id: orders[customer.id] for customer in response.context['cl'].result_list})
+
+    def test_estimated_count(self):
+        url = reverse('admin:store_product_changelist')
+        table = connection.ops.quote_name(Product._meta.db_table)
+        with mock.patch('store.admin_mixins.estimated_row_count', return_value=50000):
+            response, queries = self.queries(url)
+            self.assertEqual(response.context['cl'].result_count, 50000)
+            self.assertFalse([sql for sql in queries if sql.startswith('SELECT COUNT(*)') and table in sql])
+
+            response, queries = self.queries(url + '?q=Product')
+            self.assertEqual(response.context['cl'].result_count, 3)
+
+
+# Admin Job Test
+class AdminJobTest(TestCase):
+    """
+    - A job is queued until its transaction commits, then runs chunk by chunk to done. A failing chunk rolls back alone and fails the job with its traceback. Jobs left queued or running by a worker that went away (a restart) are failed when a ThreadPoolWorker starts or by the fail_stale_jobs command - not by opening the changelist - and a job that was only slow finishes anyway.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        collection = Collection.objects.create(title='Jobs')
+        cls.products = [Product.objects.create(title=f'Product {i}', slug=f'product-{i}', unit_price=10, inventory=5, collection=collection) for i in range(5)]
+
+    def setUp(self):
+        patcher = mock.patch('store.jobs._worker', jobs.ImmediateWorker())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def inventories(self):
+        return list(Product.objects.order_by('id').values_list('inventory', flat=True))
+
+    def test_done(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            job = jobs.enqueue('store.bulk.clear_inventory', Product.objects.all(), 'Clear inventory', chunk_size=2)
+            self.assertEqual(AdminJob.objects.get(id=job.id).status, AdminJob.STATUS_QUEUED)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.total, job.processed, job.error), (AdminJob.STATUS_DONE, 5, 5, ''))
+        self.assertTrue(job.started_at <= job.heartbeat_at <= job.finished_at)
+        self.assertEqual(self.inventories(), [0] * 5)
+
+    def test_failed(self):
+        clear_inventory = bulk.clear_inventory
+        def second_chunk_fails(ids):
+            clear_inventory(ids)
+            if ids[0] != self.products[0].id:
+                raise OperationalError('gone away')
+        with mock.patch('store.bulk.clear_inventory', second_chunk_fails), self.assertRaises(OperationalError):
+            with self.captureOnCommitCallbacks(execute=True):
+                job = jobs.enqueue('store.bulk.clear_inventory', Product.objects.all(), 'Clear inventory', chunk_size=2)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed), (AdminJob.STATUS_FAILED, 2))
+        self.assertIn('gone away', job.error)
+        self.assertEqual(self.inventories(), [0, 0, 5, 5, 5])
+
+    def test_stale_jobs_fail(self):
+        long_ago = timezone.now() - timedelta(hours=1)
+        running, queued, alive, done = [AdminJob.objects.create(description=name, handler='store.bulk.clear_inventory') for name in ('running', 'queued', 'alive', 'done')]
+        AdminJob.objects.filter(id=running.id).update(status=AdminJob.STATUS_RUNNING, heartbeat_at=long_ago)
+        AdminJob.objects.filter(id=queued.id).update(created_at=long_ago)
+        AdminJob.objects.filter(id=alive.id).update(status=AdminJob.STATUS_RUNNING, heartbeat_at=timezone.now())
+        AdminJob.objects.filter(id=done.id).update(status=AdminJob.STATUS_DONE, heartbeat_at=long_ago)
+
+        worker = jobs.ThreadPoolWorker(max_workers=1)
+        worker.executor.shutdown()
+        statuses = dict(AdminJob.objects.values_list('description', 'status'))
+        self.assertEqual(statuses, {'running': AdminJob.STATUS_FAILED, 'queued': AdminJob.STATUS_FAILED, 'alive': AdminJob.STATUS_RUNNING, 'done': AdminJob.STATUS_DONE})
+        self.assertIn('restarted', AdminJob.objects.get(id=queued.id).error)
+
+        # The queued job was only waiting behind others - it runs after all
+        jobs.run_job(queued.id, Product.objects.all())
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.processed, queued.error), (AdminJob.STATUS_DONE, 5, ''))
+
+    def test_stale_jobs_command(self):
+        stale = AdminJob.objects.create(description='stale', handler='store.bulk.clear_inventory')
+        AdminJob.objects.filter(id=stale.id).update(status=AdminJob.STATUS_RUNNING, heartbeat_at=timezone.now() - timedelta(hours=1))
+
+        # Reading the changelist leaves the jobs alone
+        self.client.force_login(User.objects.create_superuser('jobs', 'jobs@test.com', 'jobs'))
+        self.assertEqual(self.client.get(reverse('admin:store_adminjob_changelist')).status_code, 200)
+        self.assertEqual(AdminJob.objects.get(id=stale.id).status, AdminJob.STATUS_RUNNING)
+
+        output = StringIO()
+        call_command('fail_stale_jobs', stdout=output)
+        self.assertIn('Marked 1 stale jobs', output.getvalue())
+        self.assertEqual(AdminJob.objects.get(id=stale.id).status, AdminJob.STATUS_FAILED)
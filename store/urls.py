@@ -1,12 +1,41 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 
 urlpatterns = [
     # Products Urls
     path('products/', views.product_list, name='product-list'),
+    path('products/bulk/', views.product_bulk, name='product-bulk'),
+    path('products/search/', views.product_search, name='product-search'),
     path('product/<int:id>/', views.product_detail, name='product-detail'),
+    path('product/<int:id>/reviews/', views.product_reviews, name='product-reviews'),
 
     # Collection Urls
     path('collections/', views.collection_list, name='collection-list'),
     path('collection/<int:pk>/', views.collection_detail, name='collection-detail'),
+
+    # Async Read Urls - for ASGI deployments, see store/async_views.py
+    path('async/products/', async_views.product_list, name='async-product-list'),
+    path('async/product/<int:id>/', async_views.product_detail, name='async-product-detail'),
+    path('async/collections/', async_views.collection_list, name='async-collection-list'),
+    path('async/collection/<int:pk>/', async_views.collection_detail, name='async-collection-detail'),
+
+    # Cart Urls
+    path('carts/', views.cart_create, name='cart-create'),
+    path('carts/<uuid:pk>/', views.cart_detail, name='cart-detail'),
+    path('carts/<uuid:pk>/items/', views.cart_items, name='cart-items'),
+    path('carts/<uuid:pk>/items/<int:product_id>/', views.cart_item_detail, name='cart-item-detail'),
+    path('carts/<uuid:pk>/checkout/', views.cart_checkout, name='cart-checkout'),
+
+    # Customer Urls
+    path('customers/<int:pk>/orders/', views.customer_orders, name='customer-orders'),
+
+    # Analytics Urls
+    path('analytics/sales/', views.sales_report, name='sales-report'),
+    path('analytics/sales/export/', views.sales_export, name='sales-export'),
+
+    # Export Urls
+    path('exports/<str:name>/', views.export, name='export'),
+
+    # Stats Urls
+    path('stats/', views.request_stats, name='request-stats'),
 ]
\ No newline at end of file
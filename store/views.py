@@ -1,21 +1,113 @@
+from datetime import date, timedelta
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Count
+from django.utils import timezone
+from django.db.models import Max
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework import status
-from .models import Product, Collection
-from .serializers import ProductSerializer, CollectionSerializer
+from rest_framework.exceptions import ValidationError
+from .models import Product, Collection, Cart, Order, Review
+from .serializers import ProductSerializer, CollectionSerializer, CompiledProductSerializer, CompiledOrderSerializer, ProductBatchSerializer, ReviewSerializer, AddCartItemSerializer, UpdateCartItemSerializer, CheckoutSerializer
+from . import analytics
+from .exports import EXPORTS, FILE_TYPES, export_response
+from .bulk import apply_product_batch
+from .search import product_index
+from .filters import ProductFilter
+from .facets import get_facets
+from .carts import describe_cart, get_cart_store
+from .checkout import CheckoutError, checkout
+from .middleware import metrics
+from .pagination import KeysetPagination
+from .streaming import DEFAULT_CHUNK_SIZE, stream_json_array
+from .cache import cached_response
+
+# Reads a positive integer query parameter, falling back to the default on bad input
+def _int_param(request, name, default):
+    try:
+        return max(1, int(request.query_params[name]))
+    except (KeyError, ValueError):
+        return default
+
+# Reads a YYYY-MM-DD query parameter, falling back to the default when it is missing
+def _date_param(request, name, default):
+    value = request.query_params.get(name)
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({name: ['Enter a date as YYYY-MM-DD.']})
+
+# Reads a comma separated list of ids, e.g. ?product=1,2,3
+def _ids_param(request, name):
+    try:
+        return [int(value) for value in request.query_params.get(name, '').split(',') if value.strip()]
+    except ValueError:
+        raise ValidationError({name: ['Enter a comma separated list of ids.']})
+
+# Reads a query parameter that must be one of choices
+def _choice_param(request, name, choices, default):
+    value = request.query_params.get(name, default)
+    if value not in choices:
+        raise ValidationError({name: [f"Choose one of {', '.join(choices)}."]})
+    return value
+
+def _report_range(request):
+    end = _date_param(request, 'end', timezone.localdate())
+    start = _date_param(request, 'start', end - timedelta(days=29))
+    if start > end:
+        raise ValidationError({'start': ['start is after end.']})
+    return start, end
+
+# Last-Modified sources for the cached views - only run when a response is actually built
+def _products_last_update(request, **kwargs):
+    return Product.objects.aggregate(last_update=Max('last_update'))['last_update']
+
+def _product_last_update(request, id):
+    return Product.objects.filter(id=id).values_list('last_update', flat=True).first()
+
+def _collection_last_update(request, pk):
+    return Product.objects.filter(collection_id=pk).aggregate(last_update=Max('last_update'))['last_update']
 
 # Product List View
+@cached_response(depends_on=('product', 'collection', 'promotion', 'tag', 'review'), last_modified=_products_last_update)
 @api_view(['GET', 'POST'])
 def product_list(request):
     if request.method == "GET":
-        # When we wants to GET a list of products - We fetch all products from the database, and also include related collections.
-        queryset = Product.objects.select_related('collection').all()
-        # We create a serializer to convert this data into a format that can be sent as a response - We pass in the request object so that the serializer knows about the request details - When you have a queryset or a list of objects, you need to specify (many=True) to tell the serializer that you are dealing with multiple objects.
-        serializer = ProductSerializer(queryset, many=True, context={'request': request})
-        # Finally, we send back the serialized data as a response.
-        return Response(serializer.data)
+        # When we wants to GET a list of products - The list is read-only, so it goes through the compiled fast path: plain .values() rows in, the exact ProductSerializer output out - no model instances and no per-field DRF dispatch.
+        # Optional filters (collection, price, inventory, promotion, tag) - see store/filters.py
+        filterset = ProductFilter(request.query_params, queryset=Product.objects.all())
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+        # Sparse fieldsets (?fields=id,title,price_with_tax) and expansions (?expand=collection) - only the columns the selected fields need are read, see SparseFieldsMixin in store/serializers.py
+        # ?expand=tags,likes_count adds them with one query each for the whole page (ProductQuerySet.with_tags() / with_like_counts())
+        selection = ProductSerializer.fieldset(request.query_params)
+        serializer = CompiledProductSerializer.select(**selection)
+        queryset = ProductSerializer.prefetch(filterset.qs, selection['expand']).values(*serializer.columns('title', 'id'))
+
+        # Opt-in streaming mode (?stream=true) - the whole catalog is written out as a JSON array, one keyset chunk on (title, id) at a time, so memory stays flat however large the catalog grows.
+        if request.query_params.get('stream') in ('1', 'true'):
+            chunk_size = _int_param(request, 'chunk_size', DEFAULT_CHUNK_SIZE)
+            return stream_json_array(queryset, serializer.serialize, chunk_size, ordering=('title', 'id'))
+
+        # Default mode - one keyset page ordered by (title, id); the opaque 'next' cursor points at the following page.
+        paginator = KeysetPagination(ordering=('title', 'id'))
+        page = paginator.paginate_queryset(queryset, request)
+        # Finally, we send back the serialized page along with the next cursor, and the sidebar facet counts read from the precomputed FacetCount table.
+        response = paginator.get_paginated_response(serializer.serialize(page))
+        response.data['facets'] = get_facets()
+        return response
+
+        """
+        - Code - The same page through the regular serializer (same output, slower) :
+
+            queryset = Product.objects.select_related('collection').all()
+            page = paginator.paginate_queryset(queryset, request)
+            serializer = ProductSerializer(page, many=True, context={'request': request})
+            return paginator.get_paginated_response(serializer.data)
+        """
 
     elif request.method == "POST":
         # When someone wants to POST (create) a new product - We create a serializer using the data that they sent in the request.
@@ -36,15 +128,56 @@ def product_list(request):
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         """
 
+# Product Bulk View
+@api_view(['POST'])
+def product_bulk(request):
+    """
+    - Body: {"upsert": [{...product...}, ...], "delete": [id, ...]}. Items with an "id" update that product, items without one are created.
+
+    - The valid items are written in one transaction; the response counts what was done and lists the rejected items by their position in "upsert" (or their id for "delete").
+    """
+    serializer = ProductBatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    result = apply_product_batch(serializer.validated_data['upsert'], serializer.validated_data['delete'])
+    return Response(result, status=status.HTTP_200_OK)
+
+# Product Search View
+@api_view(['GET'])
+def product_search(request):
+    """
+    - ?q=<words>&limit=<n> - products ranked by BM25 over title, description, collection title and tags. The last letters of a word may be missing ("lap" matches "laptop").
+
+    - Ranking runs entirely on the in-memory index (store/search.py); the database is only asked for the rows of the returned page.
+    """
+    query = request.query_params.get('q', '')
+    limit = min(_int_param(request, 'limit', 20), 100)
+    selection = ProductSerializer.fieldset(request.query_params)
+    serializer = CompiledProductSerializer.select(**selection)
+    ranked = product_index.search(query, limit)
+
+    rows = ProductSerializer.prefetch(Product.objects, selection['expand']).filter(id__in=[product_id for product_id, score in ranked]).values(*serializer.columns('id'))
+    by_id = {row['id']: row for row in serializer.prepare(rows)}
+    results = []
+    for product_id, score in ranked:
+        if product_id in by_id:
+            item = serializer.to_representation(by_id[product_id])
+            item['score'] = round(score, 4)
+            results.append(item)
+    return Response({'query': query, 'results': results})
+
 # Product Detail View
+@cached_response(depends_on=('product', 'collection', 'promotion', 'tag', 'review'), last_modified=_product_last_update)
 @api_view(['GET', 'PUT', 'DELETE'])
 def product_detail(request, id):
-    product = get_object_or_404(Product, id=id)
     if request.method == "GET":
-        serializer = ProductSerializer(product)
+        # ?fields= / ?expand=collection - .only() the columns of the selected fields, with the expanded relations select_related
+        selection = ProductSerializer.fieldset(request.query_params)
+        product = get_object_or_404(CompiledProductSerializer.select(**selection).only(ProductSerializer.prefetch(Product.objects.all(), selection['expand'])), id=id)
+        serializer = ProductSerializer(product, **selection)
         return Response(serializer.data)
-    
-    elif request.method == "PUT":
+
+    product = get_object_or_404(Product, id=id)
+    if request.method == "PUT":
         serializer = ProductSerializer(product, data=request.data)
         serializer.is_valid(raise_exception=True)
         serializer.save()
@@ -72,11 +205,37 @@ def product_detail(request, id):
             return Response(status=status.HTTP_404_NOT_FOUND)
     """
 
+# Product Reviews View
+@cached_response(depends_on=('product', 'review'))
+@api_view(['GET', 'POST'])
+def product_reviews(request, id):
+    """
+    - GET lists the product's reviews newest first, one keyset page at a time on (date, id) - follow the 'next' cursor for older reviews. POST adds a review.
+
+    - The product's review count and latest review date live in ReviewSummary, which the Review signals keep current.
+    """
+    if not Product.objects.filter(id=id).exists():
+        return Response({'error': 'No product with the given ID was found.'}, status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == "GET":
+        paginator = KeysetPagination(ordering=('-date', '-id'))
+        page = paginator.paginate_queryset(Review.objects.filter(product_id=id), request)
+        serializer = ReviewSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    elif request.method == "POST":
+        serializer = ReviewSerializer(data=request.data, context={'product_id': id})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
 # Collection List View
+@cached_response(depends_on=('collection', 'product'), last_modified=_products_last_update)
 @api_view(['GET', 'POST'])
 def collection_list(request):
     if request.method == "GET":
-        queryset = Collection.objects.annotate(products_count=Count('products'))
+        # products_count is a stored column now - no JOIN and GROUP BY over products
+        queryset = Collection.objects.all()
         serializer = CollectionSerializer(queryset, many=True)
         return Response(serializer.data)
     elif request.method == "POST":
@@ -86,9 +245,10 @@ def collection_list(request):
         return Response(status=status.HTTP_201_CREATED)
     
 # Collection Detail View
+@cached_response(depends_on=('collection', 'product'), last_modified=_collection_last_update)
 @api_view(['GET', 'PUT', 'DELETE'])
 def collection_detail(request, pk):
-    collection = get_object_or_404(Collection.objects.annotate(products_count=Count('products')), id=pk)
+    collection = get_object_or_404(Collection, id=pk)
     if request.method == "GET":
         serializer = CollectionSerializer(collection)
         return Response(serializer.data)
@@ -100,7 +260,166 @@ def collection_detail(request, pk):
         return Response(status=status.HTTP_201_CREATED)
     
     elif request.method == "DELETE":
-        if collection.products.count() > 0:
+        if collection.products_count > 0:
             return Response({'error': 'Collection Cannot be allowed because it includes one or more products.'},status=status.HTTP_405_METHOD_NOT_ALLOWED)
         collection.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+# Cart Create View
+@api_view(['POST'])
+def cart_create(request):
+    cart = Cart.objects.create()
+    return Response(describe_cart(cart.id, {}), status=status.HTTP_201_CREATED)
+
+# Cart Detail View
+@api_view(['GET', 'DELETE'])
+def cart_detail(request, pk):
+    cart = get_object_or_404(Cart, id=pk)
+    store = get_cart_store()
+    if request.method == "GET":
+        return Response(describe_cart(cart.id, store.get_items(cart.id)))
+
+    elif request.method == "DELETE":
+        store.discard(cart.id)
+        cart.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+# Cart Items View
+@api_view(['POST'])
+def cart_items(request, pk):
+    """
+    - Adding a product that is already in the cart adds to its quantity (see DatabaseCartStore.add_item / HotCartStore.add_item) - no read-modify-write, so concurrent adds never lose an increment.
+    """
+    cart = get_object_or_404(Cart, id=pk)
+    serializer = AddCartItemSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    store = get_cart_store()
+    store.add_item(cart.id, serializer.validated_data['product_id'], serializer.validated_data['quantity'])
+    return Response(describe_cart(cart.id, store.get_items(cart.id)), status=status.HTTP_201_CREATED)
+
+# Cart Item Detail View
+@api_view(['PATCH', 'DELETE'])
+def cart_item_detail(request, pk, product_id):
+    cart = get_object_or_404(Cart, id=pk)
+    store = get_cart_store()
+    if request.method == "PATCH":
+        serializer = UpdateCartItemSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if not store.set_item(cart.id, product_id, serializer.validated_data['quantity']):
+            return Response({'error': 'This product is not in the cart.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(describe_cart(cart.id, store.get_items(cart.id)))
+
+    elif request.method == "DELETE":
+        if not store.remove_item(cart.id, product_id):
+            return Response({'error': 'This product is not in the cart.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+# Cart Checkout View
+@api_view(['POST'])
+def cart_checkout(request, pk):
+    """
+    - Body: {"customer_id": <id>}. Turns the cart into an order and deletes the cart; see store/checkout.py for how stock is reserved.
+    """
+    cart = get_object_or_404(Cart, id=pk)
+    serializer = CheckoutSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    try:
+        order = checkout(cart.id, serializer.validated_data['customer_id'])
+    except CheckoutError as error:
+        return Response({'error': error.message, 'details': error.details}, status=status.HTTP_409_CONFLICT)
+    return Response({'order_id': order.id}, status=status.HTTP_201_CREATED)
+
+# Customer Orders View
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def customer_orders(request, pk):
+    """
+    - Staff only. The customer's orders newest first, one keyset page at a time on (placed_at, id) - follow the 'next' cursor for older orders. Every order comes with its stored total and item count, so no order items are read.
+
+    - The page is a single query over the (customer, placed_at, id) index, however many orders the customer has. A customer without orders (or an unknown id) gets an empty page.
+    """
+    paginator = KeysetPagination(ordering=('-placed_at', '-id'))
+    queryset = Order.objects.filter(customer_id=pk).values(*CompiledOrderSerializer.columns('placed_at', 'id'))
+    page = paginator.paginate_queryset(queryset, request)
+    return paginator.get_paginated_response(CompiledOrderSerializer.serialize(page))
+
+# Sales Report View
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def sales_report(request):
+    """
+    - Staff only. ?start=&end= (YYYY-MM-DD, inclusive - the last 30 days by default), ?group=product|collection|day, ?order_by=revenue|quantity|orders_count, ?limit=, ?product=1,2 / ?collection=3 to narrow it down.
+
+    - Answered from the daily rollups (store/analytics.py) with two queries, however many orders the range holds. Only orders with a complete payment count.
+    """
+    start, end = _report_range(request)
+    return Response(analytics.report(
+        start, end,
+        group=_choice_param(request, 'group', analytics.GROUPS, 'product'),
+        product_ids=_ids_param(request, 'product'),
+        collection_ids=_ids_param(request, 'collection'),
+        order_by=_choice_param(request, 'order_by', analytics.ORDERINGS, 'revenue'),
+        limit=min(_int_param(request, 'limit', 50), 1000),
+    ))
+
+# Sales Export View
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def sales_export(request):
+    """
+    - Staff only. The raw daily rollup rows of ?start=&end= for ?group=product|collection as columns: day, id, quantity, revenue_cents, orders_count.
+
+    - ?type=npz (default) sends a NumPy .npz file - numpy.load() gives the columns back as arrays; ?type=json sends the same columns as JSON lists.
+    """
+    start, end = _report_range(request)
+    group = _choice_param(request, 'group', ('product', 'collection'), 'product')
+    export_type = _choice_param(request, 'type', ('npz', 'json'), 'npz')
+    if export_type == 'npz' and analytics.np is None:
+        return Response({'error': 'NumPy is not installed on the server - use ?type=json.'}, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+    data = analytics.columns(start, end, group)
+    if export_type == 'json':
+        if analytics.np is not None:
+            data = {name: column.astype(str).tolist() if name == 'day' else column.tolist() for name, column in data.items()}
+        return Response({'start': start, 'end': end, 'group': group, 'columns': data})
+
+    response = HttpResponse(analytics.to_npz(data), content_type='application/octet-stream')
+    response['Content-Disposition'] = f'attachment; filename="sales-{group}-{start}-{end}.npz"'
+    return response
+
+# Export View
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export(request, name):
+    """
+    - Staff only. Streams every product, customer or order (with its items) as ?type=csv (default) or ?type=ndjson, narrowed down by the filters of the list (ProductFilter, CustomerFilter, OrderFilter in store/filters.py). ?gzip=true sends a .gz file; clients that accept gzip get the transfer compressed either way.
+
+    - Read chunk_size rows at a time (?chunk_size=, 1000 by default) with a few queries per chunk - see store/exports.py.
+    """
+    if name not in EXPORTS:
+        return Response({'error': f"Unknown export - choose one of {', '.join(EXPORTS)}."}, status=status.HTTP_404_NOT_FOUND)
+    exporter = EXPORTS[name]
+    queryset, errors = exporter.filter(request.query_params)
+    if errors is not None:
+        return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+    return export_response(
+        exporter, queryset,
+        file_type=_choice_param(request, 'type', tuple(FILE_TYPES), 'csv'),
+        gzip=request.query_params.get('gzip') in ('1', 'true'),
+        accepts_gzip='gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''),
+        chunk_size=min(_int_param(request, 'chunk_size', 1000), 10000),
+    )
+
+# Request Stats View
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def request_stats(request):
+    """
+    - Staff only. GET summarises the recent requests recorded by RequestMetricsMiddleware per URL name (queries, DB time, serialization time, latency percentiles); DELETE empties the buffer.
+    """
+    if request.method == "GET":
+        return Response(metrics.summary())
+
+    elif request.method == "DELETE":
+        metrics.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
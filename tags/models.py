@@ -2,7 +2,8 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
-    
+from trikha_store.querysets import GenericObjectQuerySet
+
 # Tag Model Here...
 class Tag(models.Model):
     label = models.CharField(max_length=255)
@@ -10,9 +11,22 @@ class Tag(models.Model):
     def __str__(self):
         return self.label
 
+# Tagged Item QuerySet Here...
+class TaggedItemQuerySet(GenericObjectQuerySet):
+    def labels_by_object(self):
+        labels = {}
+        for object_id, label in self.values_list('object_id', 'tag__label').order_by('object_id', 'tag__label'):
+            labels.setdefault(object_id, []).append(label)
+        return labels
+
 # Tagged Item Model Here...
 class TaggedItem(models.Model):
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
-    content_object = GenericForeignKey()
\ No newline at end of file
+    content_object = GenericForeignKey()
+
+    objects = TaggedItemQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['content_type', 'object_id'])]
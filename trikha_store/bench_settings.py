@@ -0,0 +1,20 @@
+"""
+Settings for benchmarks (manage.py benchmark_endpoints / benchmark_concurrency --settings=trikha_store.bench_settings).
+
+Same as the main settings, on a local SQLite database so the benchmark needs no MySQL server.
+"""
+
+from .settings import *
+
+DEBUG = False
+
+ALLOWED_HOSTS = ['testserver']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'store.db.sqlite3',
+        'NAME': BASE_DIR / 'bench.sqlite3',
+        'CONN_MAX_AGE': 0,
+        'POOL': {'MAX_SIZE': 20, 'MAX_IDLE': 300},
+    }
+}
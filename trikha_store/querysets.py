@@ -0,0 +1,26 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+
+# Generic Object QuerySet Here...
+class GenericObjectQuerySet(models.QuerySet):
+    """
+    - For models that point at any object through a GenericForeignKey (content_type, object_id) - TaggedItem and LikedItem share it.
+    """
+    def for_objects(self, objects, model=None):
+        """
+        - The rows of many objects in one query. objects is a queryset, a list of model instances, or a list of primary keys (then model is required).
+
+        - The ContentType id comes from ContentType.objects.get_for_model(), which is cached per process, so no lookup query runs per call.
+        """
+        if isinstance(objects, models.QuerySet):
+            model = model or objects.model
+            # MySQL can't run a LIMIT inside IN (...) - a sliced queryset (one page) is evaluated into ids first
+            object_ids = list(objects.values_list('pk', flat=True)) if objects.query.is_sliced else objects.values('pk')
+        else:
+            objects = list(objects)
+            if model is None and objects:
+                model = type(objects[0])
+            object_ids = [getattr(obj, 'pk', obj) for obj in objects]
+        if model is None:
+            return self.none()
+        return self.filter(content_type_id=ContentType.objects.get_for_model(model).id, object_id__in=object_ids)
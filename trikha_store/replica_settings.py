@@ -0,0 +1,22 @@
+"""
+Settings for the read replica routing on one machine (manage.py test store --settings=trikha_store.replica_settings).
+
+Same as the main settings, with two local SQLite databases standing in for the MySQL primary and a read replica. Nothing replicates between them - the replica routing tests fill each one themselves, so a read shows which database answered it.
+"""
+
+from .settings import *
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'primary.sqlite3',
+        'TEST': {'NAME': BASE_DIR / 'test_primary.sqlite3'},
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica.sqlite3',
+        'TEST': {'NAME': BASE_DIR / 'test_replica.sqlite3'},
+    },
+}
+
+STORE_READ_REPLICAS = {**STORE_READ_REPLICAS, 'DATABASES': ['replica']}
@@ -46,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'store.middleware.RequestMetricsMiddleware',
+    'store.db.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,14 +83,27 @@ WSGI_APPLICATION = 'trikha_store.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        # The stock MySQL backend plus a connection pool shared by the sync and async (ASGI) views - see store/db/__init__.py
+        'ENGINE': 'store.db.mysql',
         'NAME': 'trikha_store',
         'HOST': 'localhost',
         'USER': 'root',
         'PASSWORD': 'password',
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': True,
+        'POOL': {'MAX_SIZE': 20, 'MAX_IDLE': 300},
     }
 }
 
+# Catalog reads of GET requests go to the read replicas listed here (aliases in DATABASES) - see store/db/replicas.py. None yet, so everything reads from 'default'.
+DATABASE_ROUTERS = ['store.db.replicas.ReplicaRouter']
+
+STORE_READ_REPLICAS = {
+    'DATABASES': [],
+    'STRATEGY': 'round_robin',  # or 'least_latency'
+    'STICKY_SECONDS': 5,        # a client that wrote reads from the primary for this long
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -141,4 +156,22 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'COERCE_DECIMAL_TO_STRING': False
+}
+
+# Request metrics (store.middleware.RequestMetricsMiddleware)
+STORE_SERVER_TIMING = DEBUG
+
+# Maximum SQL queries per request, by URL name - enforced in the test suite
+STORE_QUERY_BUDGETS = {
+    'product-list': 4,
+    'product-detail': 3,
+    'product-search': 4,
+    'product-reviews': 2,
+    'collection-list': 2,
+    'collection-detail': 2,
+    'cart-detail': 4,
+    'customer-orders': 3,  # session and user lookups (staff only) + the page
+    'sales-report': 4,
+    'async-product-detail': 2,
+    'async-collection-detail': 1,
 }
\ No newline at end of file